@@ -13,6 +13,8 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY or OPENAI_API_KEY == "your-openai-api-key-here":
     raise ValueError("OPENAI_API_KEY não está definido ou está usando valor placeholder. Configure com sua chave real da OpenAI.")
 
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE") or None  # URL alternativa da API (proxy ou servidor local de testes)
+
 # Caminhos
 UPLOADS_DIR = "uploads"
 FAISS_INDEX_PATH = os.path.abspath("faiss_index")
@@ -22,6 +24,83 @@ EMBEDDINGS_MODEL = "text-embedding-3-small"
 CHAT_MODEL = "gpt-4o"
 TEMPERATURE = 0.7
 
+# Chamadas ao modelo de chat (por worker)
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", "8"))  # Completions em andamento ao mesmo tempo
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "60"))  # Limite de cada chamada (em streaming, entre trechos) em segundos
+ANSWER_MAP_CONCURRENCY = int(os.getenv("ANSWER_MAP_CONCURRENCY", "4"))  # Lotes de contexto respondidos ao mesmo tempo por pergunta
+ANSWER_REDUCE_FANIN = int(os.getenv("ANSWER_REDUCE_FANIN", "8"))  # Respostas parciais unidas por chamada de síntese
+
+# Configurações do índice FAISS
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()  # flat, ivf_flat, ivf_pq ou hnsw
+FAISS_VECTOR_STORAGE = os.getenv("FAISS_VECTOR_STORAGE", "float32").lower()  # float32, fp16, sq8 ou pq
+FAISS_RERANK_FACTOR = int(os.getenv("FAISS_RERANK_FACTOR", "4"))  # Candidatos por resultado na reordenação exata
+FAISS_INDEX_MMAP = os.getenv("FAISS_INDEX_MMAP", "false").lower() == "true"  # Mapeia o índice em memória (somente leitura)
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "1024"))  # Número de listas (centróides) do IVF
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "64"))  # Subquantizadores do PQ (deve dividir a dimensão)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))  # Bits por código do PQ
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))  # Vizinhos por nó do grafo HNSW
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))  # Listas IVF visitadas por consulta
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))  # Fila de candidatos do HNSW por consulta
+
+# Segmentos do índice e compactação
+FAISS_SEGMENT_MERGE_FACTOR = int(os.getenv("FAISS_SEGMENT_MERGE_FACTOR", "4"))  # Segmentos de mesmo tamanho unidos por vez
+FAISS_SEGMENT_MAX_COUNT = int(os.getenv("FAISS_SEGMENT_MAX_COUNT", "16"))  # Máximo de segmentos antes de forçar a união
+FAISS_SEGMENT_MAX_DELETED_RATIO = float(os.getenv("FAISS_SEGMENT_MAX_DELETED_RATIO", "0.3"))  # Fração removida que força reescrita
+FAISS_COMPACTION_ENABLED = os.getenv("FAISS_COMPACTION_ENABLED", "true").lower() == "true"  # Compactação em segundo plano
+
+# Recarga do índice entre workers
+FAISS_RELOAD_ENABLED = os.getenv("FAISS_RELOAD_ENABLED", "true").lower() == "true"  # Acompanha gerações gravadas por outros workers
+FAISS_RELOAD_CHANNEL = os.getenv("FAISS_RELOAD_CHANNEL", "faiss_index:generation")  # Canal Redis pub/sub das gerações
+FAISS_RELOAD_POLL_SECONDS = float(os.getenv("FAISS_RELOAD_POLL_SECONDS", "10"))  # Verificação do manifesto sem mensagens
+
+# Configurações de recuperação (busca vetorial)
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "5"))  # Janela de agrupamento de consultas
+RETRIEVAL_POOL_SIZE = int(os.getenv("RETRIEVAL_POOL_SIZE", "4"))  # Threads dedicadas às buscas FAISS
+RETRIEVAL_MAX_BATCH_SIZE = int(os.getenv("RETRIEVAL_MAX_BATCH_SIZE", "64"))  # Máximo de consultas por chamada
+
+# Cache de embeddings de perguntas
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))  # Entradas na camada local (LRU)
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))  # TTL local em segundos
+QUERY_EMBEDDING_REDIS_TTL = int(os.getenv("QUERY_EMBEDDING_REDIS_TTL", "86400"))  # TTL no Redis em segundos
+QUERY_EMBEDDING_CACHE_REDIS = os.getenv("QUERY_EMBEDDING_CACHE_REDIS", "true").lower() == "true"
+
+# Cache semântico de respostas (perguntas parecidas com o mesmo contexto recuperado)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Similaridade de cosseno mínima entre as perguntas
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # Tempo de vida das respostas em segundos
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))  # Conjuntos de contexto mantidos (LRU)
+ANSWER_CACHE_PER_CONTEXT = int(os.getenv("ANSWER_CACHE_PER_CONTEXT", "16"))  # Perguntas guardadas por conjunto de contexto
+
+# Cache de embeddings de chunks (endereçado por conteúdo, em disco)
+CHUNK_EMBEDDING_CACHE_PATH = os.path.abspath(os.getenv("CHUNK_EMBEDDING_CACHE_PATH", "embedding_cache/chunks.sqlite3"))
+CHUNK_EMBEDDING_CACHE_ENABLED = os.getenv("CHUNK_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+# Fila de ingestão de documentos em segundo plano
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))  # Documentos processados ao mesmo tempo
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "100"))  # Uploads aguardando processamento
+INGESTION_JOB_TTL = int(os.getenv("INGESTION_JOB_TTL", "86400"))  # Tempo de retenção do estado dos jobs em segundos
+INGESTION_PROGRESS_INTERVAL = float(os.getenv("INGESTION_PROGRESS_INTERVAL", "0.5"))  # Intervalo mínimo entre eventos de progresso
+
+# Uploads
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))  # Tamanho máximo de um arquivo enviado
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))  # Bloco lido e gravado por vez
+UPLOAD_REGISTRY_PATH = os.path.abspath(os.getenv("UPLOAD_REGISTRY_PATH", "faiss_index/uploads.sqlite3"))  # Hash SHA-256 dos arquivos indexados
+
+# Pipeline de embeddings da ingestão (limites por processo; 0 desativa o limite)
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # Requisições de embeddings em andamento ao mesmo tempo
+EMBEDDING_REQUEST_MAX_TOKENS = int(os.getenv("EMBEDDING_REQUEST_MAX_TOKENS", "100000"))  # Tokens por requisição (máximo da API: 300.000)
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))  # Orçamento de tokens por minuto
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))  # Orçamento de requisições por minuto
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))  # Novas tentativas após 429, erro 5xx ou falha de conexão
+EMBEDDING_BACKOFF_BASE = float(os.getenv("EMBEDDING_BACKOFF_BASE", "1"))  # Espera base do backoff exponencial em segundos
+EMBEDDING_BACKOFF_MAX = float(os.getenv("EMBEDDING_BACKOFF_MAX", "60"))  # Espera máxima entre tentativas em segundos
+
+# Extração de PDFs em um pool de processos
+PDF_EXTRACTION_POOL_SIZE = int(os.getenv("PDF_EXTRACTION_POOL_SIZE", "0"))  # Processos de extração (0 = número de CPUs)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))  # Páginas extraídas por tarefa do pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))  # PDFs menores são extraídos no próprio processo
+
 # Configuração de logs
 logging.basicConfig(
     level=logging.INFO,
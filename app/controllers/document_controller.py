@@ -2,63 +2,168 @@
 Controlador de documentos para manipulação de endpoints relacionados a documentos.
 """
 import os
+import asyncio
 import datetime
-from typing import List
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.models.schemas import DocumentInfo
-from app.services.document_service import upload_and_process_document
-from app.config.settings import UPLOADS_DIR, logger
+from typing import Any, AsyncGenerator, Callable, Coroutine, List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from app.models.schemas import DocumentInfo, DocumentDeleteResponse, IngestionJobInfo
+from app.services.document_service import (
+    UploadTooLargeError,
+    stream_upload,
+    find_duplicate,
+    commit_upload,
+    discard_upload,
+    delete_document
+)
+from app.services.ingestion_service import ingestion_queue
+from app.config.settings import UPLOADS_DIR, UPLOAD_MAX_BYTES, logger
 
-# Cria o router - sem prefixo para permitir rotas diretas
-router = APIRouter(tags=["documents"])
+# Margem para os delimitadores do multipart e o campo session_id, além do arquivo
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_REQUEST_MAX_BYTES = UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES
 
-@router.post("/upload", response_model=DocumentInfo)
-@router.post("/documents/upload", response_model=DocumentInfo)
-async def upload_document(file: UploadFile = File(...)) -> DocumentInfo:
+def _upload_too_large() -> HTTPException:
+    """Erro 413 do limite de tamanho dos uploads."""
+    return HTTPException(status_code=413, detail=f"Arquivo maior que o limite de {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+
+class SizeLimitedRequest(Request):
+    """Requisição cujo corpo é interrompido ao passar de ``UPLOAD_REQUEST_MAX_BYTES``."""
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        received = 0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if received > UPLOAD_REQUEST_MAX_BYTES:
+                logger.warning(f"Upload interrompido após {received} bytes: maior que {UPLOAD_MAX_BYTES} bytes")
+                raise _upload_too_large()
+            yield chunk
+
+class SizeLimitedRoute(APIRoute):
+    """
+    Rota que aplica o limite de upload antes de o FastAPI ler o formulário.
+
+    O FastAPI grava todo o multipart em arquivos temporários antes de chamar o
+    endpoint; aqui requisições com ``Content-Length`` acima do limite são
+    recusadas sem ler o corpo, e as sem tamanho declarado (chunked) são
+    interrompidas assim que o ultrapassam.
     """
-    Faz upload de um documento e o adiciona ao banco de dados vetorial.
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        route_handler = super().get_route_handler()
+
+        async def size_limited_handler(request: Request) -> Response:
+            content_length = request.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > UPLOAD_REQUEST_MAX_BYTES:
+                logger.warning(f"Upload recusado pelo Content-Length ({content_length} bytes): maior que {UPLOAD_MAX_BYTES} bytes")
+                raise _upload_too_large()
+            return await route_handler(SizeLimitedRequest(request.scope, request.receive))
+
+        return size_limited_handler
+
+# Cria o router - sem prefixo para permitir rotas diretas; o upload é a única rota com corpo
+router = APIRouter(tags=["documents"], route_class=SizeLimitedRoute)
+
+@router.post("/upload", response_model=IngestionJobInfo, status_code=202)
+@router.post("/documents/upload", response_model=IngestionJobInfo, status_code=202)
+async def upload_document(
+    response: Response,
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None)
+) -> IngestionJobInfo:
+    """
+    Recebe um documento e o enfileira para ser adicionado ao banco de dados vetorial.
+    
+    O arquivo é gravado em disco em blocos, com o SHA-256 calculado no caminho,
+    então a memória usada não depende do tamanho do arquivo. Um arquivo com o
+    mesmo conteúdo de um documento já indexado (ou em processamento) não é
+    processado de novo: a resposta é 200 com status ``duplicate``. Um arquivo
+    com o nome de um documento que ainda está sendo processado é recusado com 409.
+    
+    A resposta sai assim que o arquivo é gravado; o andamento é consultado em
+    ``GET /jobs/{job_id}`` ou recebido pelo WebSocket da sessão informada.
     
     Args:
+        response: Resposta HTTP (para ajustar o status de duplicatas)
         file: Arquivo enviado
+        session_id: Sessão WebSocket que recebe os eventos de progresso (opcional)
         
     Retorna:
-        Informações do documento
+        Estado inicial do job de ingestão
     """
+    tmp_path = None
     try:
         # Verificar se o arquivo foi enviado
-        if not file:
+        if not file or not file.filename:
             raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
         
-        # Ler o conteúdo do arquivo
-        file_content = await file.read()
+        # Recusar nomes com diretórios (o arquivo é gravado em uploads/<nome>)
+        file_name = os.path.basename(file.filename)
+        if file_name != file.filename or file_name.startswith("."):
+            raise HTTPException(status_code=400, detail="Nome de arquivo inválido")
+        
+        # Gravar o arquivo em blocos, calculando o hash do conteúdo
+        try:
+            tmp_path, content_hash, size = await stream_upload(file)
+        except UploadTooLargeError:
+            logger.warning(f"Upload de {file_name} recusado: maior que {UPLOAD_MAX_BYTES} bytes")
+            raise _upload_too_large()
         
         # Verificar se o arquivo está vazio
-        if len(file_content) == 0:
+        if size == 0:
             raise HTTPException(status_code=400, detail="Arquivo vazio")
         
-        # Upload e processamento do documento
-        file_path = await upload_and_process_document(file_content, file.filename)
+        # Conteúdo já indexado ou em processamento: nada a fazer
+        duplicate_of = await asyncio.to_thread(find_duplicate, content_hash)
+        duplicate_of = ingestion_queue.find_active(content_hash) or duplicate_of
+        if duplicate_of is not None:
+            job = await ingestion_queue.record_duplicate(file_name, content_hash, duplicate_of, session_id)
+            response.status_code = 200
+            return IngestionJobInfo(**job.to_dict())
         
-        # Obter informações do arquivo
-        file_size = os.path.getsize(file_path)
-        file_type = os.path.splitext(file.filename)[1].lower()
-        upload_time = datetime.datetime.now().isoformat()
+        # Substituir uploads/<nome> agora trocaria o arquivo sob o job que ainda o processa
+        active_job = ingestion_queue.find_active_job(file_name)
+        if active_job is not None:
+            logger.warning(f"Upload de {file_name} recusado: job {active_job} ainda processa a versão anterior")
+            raise HTTPException(
+                status_code=409,
+                detail=f"O documento {file_name} ainda está sendo processado (job {active_job}). Tente novamente quando terminar."
+            )
         
-        # Criar resposta
-        document_info = DocumentInfo(
-            filename=file.filename,
-            upload_time=upload_time,
-            file_path=file_path,
-            size=file_size,
-            type=file_type
-        )
+        file_path, upload_time = commit_upload(tmp_path, file_name)
+        tmp_path = None
+        job = await ingestion_queue.submit(file_path, file_name, upload_time, session_id, content_hash, size)
         
-        logger.info(f"Documento carregado com sucesso: {file.filename}")
-        return document_info
+        logger.info(f"Documento recebido: {file_name} ({size} bytes, sha256 {content_hash[:12]}, job {job.id})")
+        return IngestionJobInfo(**job.to_dict())
         
+    except HTTPException:
+        raise
+    except asyncio.QueueFull:
+        logger.warning(f"Fila de ingestão cheia: upload de {file.filename} recusado")
+        raise HTTPException(status_code=503, detail="Fila de processamento cheia. Tente novamente em instantes.")
     except Exception as e:
         logger.error(f"Erro ao fazer upload do documento: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar o documento: {str(e)}")
+    finally:
+        if tmp_path is not None:
+            discard_upload(tmp_path)
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobInfo)
+async def get_ingestion_job(job_id: str) -> IngestionJobInfo:
+    """
+    Retorna o andamento de um job de ingestão.
+    
+    Args:
+        job_id: ID retornado pelo upload
+        
+    Retorna:
+        Estado do job (etapa, páginas extraídas, chunks com embeddings e estimativa)
+    """
+    job = await ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return IngestionJobInfo(**job)
 
 @router.get("/documents", response_model=List[DocumentInfo])  # Rota principal que o frontend está usando
 @router.get("/documents/list", response_model=List[DocumentInfo])  # Rota com prefixo /documents
@@ -110,3 +215,33 @@ async def list_documents() -> List[DocumentInfo]:
     except Exception as e:
         logger.error(f"Erro ao listar documentos: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao listar documentos: {str(e)}")
+
+@router.delete("/documents/{filename}", response_model=DocumentDeleteResponse)
+async def delete_uploaded_document(filename: str) -> DocumentDeleteResponse:
+    """
+    Remove um documento enviado e seus chunks do banco de dados vetorial.
+    
+    Args:
+        filename: Nome do arquivo
+        
+    Retorna:
+        Resultado da remoção
+    """
+    # Impede caminhos fora do diretório de uploads
+    if os.path.basename(filename) != filename or filename in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Nome de arquivo inválido")
+    
+    try:
+        deleted_chunks, file_deleted = await delete_document(filename)
+    except Exception as e:
+        logger.error(f"Erro ao remover documento {filename}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao remover o documento: {str(e)}")
+    
+    if deleted_chunks == 0 and not file_deleted:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    
+    return DocumentDeleteResponse(
+        filename=filename,
+        deleted_chunks=deleted_chunks,
+        file_deleted=file_deleted
+    )
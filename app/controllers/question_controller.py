@@ -1,9 +1,16 @@
 """
 Controlador de perguntas para manipulação de endpoints relacionados a perguntas.
 """
-from fastapi import APIRouter, HTTPException
+import json
+import time
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from app.models.schemas import QuestionRequest, QuestionResponse
-from app.services.ai_service import generate_answer
+from app.services.ai_service import generate_answer, stream_answer_events
+from app.utils.chat_limiter import ChatTimeoutError
 from app.utils.vector_db import query_vector_db
 from app.config.settings import logger
 
@@ -47,6 +54,10 @@ async def ask_question(request: QuestionRequest) -> QuestionResponse:
         logger.info(f"Resposta gerada para a pergunta: {question[:50]}...")
         return response
         
+    except ChatTimeoutError as e:
+        logger.error(f"Tempo esgotado: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+        
     except ValueError as e:
         logger.error(f"Erro de valor: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -54,3 +65,108 @@ async def ask_question(request: QuestionRequest) -> QuestionResponse:
     except Exception as e:
         logger.error(f"Erro ao processar pergunta: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar pergunta: {str(e)}")
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    Formata um evento Server-Sent Events.
+    
+    Args:
+        event: Nome do evento
+        data: Conteúdo do evento, serializado como JSON
+        
+    Retorna:
+        Evento no formato ``text/event-stream``
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/ask/stream")
+@router.post("/questions/ask/stream")  # Rota com prefixo /questions
+async def ask_question_stream(request: QuestionRequest, http_request: Request) -> StreamingResponse:
+    """
+    Faz uma pergunta e transmite a resposta como Server-Sent Events.
+    
+    Eventos enviados, na ordem:
+    - ``sources``: documentos recuperados, antes da geração começar
+    - ``partial``: resposta de cada lote, quando o contexto não cabe em uma chamada
+    - ``delta``: trechos da resposta, à medida que o modelo os gera
+    - ``done``: resposta completa, fontes e tempos (primeiro trecho e total)
+    - ``error``: falha na recuperação ou na geração (encerra o stream)
+    
+    Se o cliente desconectar, a geração é cancelada e a requisição ao modelo
+    é encerrada, para que tokens deixem de ser gerados.
+    
+    Args:
+        request: Requisição de pergunta
+        http_request: Requisição HTTP (usada para detectar a desconexão do cliente)
+        
+    Retorna:
+        Resposta ``text/event-stream``
+    """
+    question = request.question
+    session_id = request.session_id
+    
+    if not question:
+        raise HTTPException(status_code=400, detail="Pergunta não fornecida")
+    
+    async def events() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        first_token = None
+        parts = []
+        
+        # Comentário SSE: o primeiro byte sai antes da recuperação e da geração
+        yield ": ok\n\n"
+        
+        try:
+            docs = await query_vector_db(question, request.top_k, request.file_paths)
+            sources = [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+            yield sse_event("sources", {"sources": sources, "session_id": session_id})
+            
+            # aclosing encerra a requisição ao modelo se o stream for interrompido
+            async with aclosing(stream_answer_events(question, docs)) as answer_events:
+                async for event in answer_events:
+                    if event.kind == "partial":
+                        yield sse_event("partial", {"batch": event.batch, "batches": event.batches, "answer": event.text})
+                    else:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(event.text)
+                        yield sse_event("delta", {"delta": event.text})
+                    if await http_request.is_disconnected():
+                        logger.info(f"Cliente desconectou durante a resposta da sessão {session_id}; geração cancelada")
+                        return
+            
+            total = time.perf_counter() - started
+            yield sse_event("done", {
+                "answer": "".join(parts),
+                "sources": sources,
+                "session_id": session_id,
+                "first_token_seconds": round(first_token, 3) if first_token is not None else None,
+                "total_seconds": round(total, 3)
+            })
+            logger.info(
+                f"Resposta transmitida para a pergunta: {question[:50]}... "
+                f"(primeiro trecho em {first_token or 0:.2f}s, total {total:.2f}s)"
+            )
+        
+        except asyncio.CancelledError:
+            logger.info(f"Cliente desconectou durante a resposta da sessão {session_id}; geração cancelada")
+            raise
+        
+        except ChatTimeoutError as e:
+            logger.error(f"Tempo esgotado: {str(e)}")
+            yield sse_event("error", {"status_code": 504, "detail": str(e)})
+        
+        except ValueError as e:
+            logger.error(f"Erro de valor: {str(e)}")
+            yield sse_event("error", {"status_code": 400, "detail": str(e)})
+        
+        except Exception as e:
+            logger.error(f"Erro ao processar pergunta: {str(e)}")
+            yield sse_event("error", {"status_code": 500, "detail": f"Erro ao processar pergunta: {str(e)}"})
+    
+    # X-Accel-Buffering desativa o buffer de proxies como o nginx, que atrasaria os eventos
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
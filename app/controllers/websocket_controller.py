@@ -3,10 +3,13 @@ Controlador WebSocket para manipulação de chat em tempo real.
 """
 import json
 import time
+from contextlib import aclosing
+from typing import Any, Dict
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.models.connection import ConnectionManager
-from app.services.ai_service import generate_answer
+from app.services.ai_service import stream_answer_events
 from app.utils.vector_db import query_vector_db
+from app.services.ingestion_service import ingestion_queue
 from app.config.settings import logger
 
 # Cria o router
@@ -15,6 +18,19 @@ router = APIRouter(tags=["websocket"])
 # Cria o gerenciador de conexões
 manager = ConnectionManager()
 
+async def send_job_event(session_id: str, job: Dict[str, Any]) -> None:
+    """
+    Envia o andamento de um job de ingestão à sessão que fez o upload.
+    
+    Args:
+        session_id: ID da sessão
+        job: Estado do job (formato de ``IngestionJobInfo``)
+    """
+    await manager.send_event({"type": "job", "job": job}, session_id)
+
+# Eventos de progresso dos uploads enviados pelo WebSocket
+ingestion_queue.notify = send_job_event
+
 @router.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """
@@ -74,11 +90,38 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                     )
                     
                     try:
+                        started = time.perf_counter()
                         docs = await query_vector_db(question, top_k, file_paths)
                         
                         chat_history = manager.get_chat_history(session_id)
                         
-                        answer = await generate_answer(question, docs, chat_history)
+                        # Cada trecho vai ao cliente assim que o modelo o gera; só a resposta completa entra no histórico
+                        parts = []
+                        first_token = None
+                        delivered = True
+                        # aclosing encerra a requisição ao modelo (e libera a vaga do limitador) se o envio falhar
+                        async with aclosing(stream_answer_events(question, docs, chat_history)) as answer_events:
+                            async for event in answer_events:
+                                if event.kind == "partial":
+                                    # Resposta de um lote de contexto grande, enviada assim que fica pronta
+                                    delivered = await manager.send_event(
+                                        {"type": "partial", "batch": event.batch, "batches": event.batches, "content": event.text},
+                                        session_id
+                                    )
+                                else:
+                                    if first_token is None:
+                                        first_token = time.perf_counter() - started
+                                        logger.info(f"Primeiro token para a sessão {session_id} em {first_token:.2f}s")
+                                    parts.append(event.text)
+                                    delivered = await manager.send_event({"role": "assistant", "delta": event.text}, session_id)
+                                if not delivered:
+                                    break
+                        
+                        if not delivered:
+                            logger.info(f"Cliente desconectou durante a resposta da sessão {session_id}; geração cancelada")
+                            manager.disconnect(session_id)
+                            return
+                        answer = "".join(parts)
                         
                         sources = [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
                         
@@ -87,6 +130,8 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                                 "role": "assistant",
                                 "content": answer,
                                 "sources": sources,
+                                "done": True,
+                                "first_token_seconds": round(first_token, 3) if first_token is not None else None,
                                 "timestamp": time.time()
                             },
                             session_id
@@ -52,6 +52,18 @@ class ConnectionManager:
         else:
             logger.warning(f"Tentativa de enviar mensagem para sessão inexistente: {session_id}")
 
+    async def send_event(self, event: Dict[str, Any], session_id: str) -> bool:
+        """Send an event (e.g. job progress) without storing it in chat history; returns False if it was not delivered."""
+        websocket = self.active_connections.get(session_id)
+        if websocket is None:
+            return False
+        try:
+            await websocket.send_text(json.dumps(event))
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enviar evento para sessão {session_id}: {str(e)}")
+            return False
+
     def get_chat_history(self, session_id: str) -> List[Dict[str, Any]]:
         """Get chat history for a specific session."""
         return self.chat_history.get(session_id, [])
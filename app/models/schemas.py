@@ -1,7 +1,7 @@
 """
 Modelos Pydantic para esquemas de requisição e resposta.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
 class QuestionRequest(BaseModel):
@@ -24,3 +24,27 @@ class DocumentInfo(BaseModel):
     file_path: str
     size: int
     type: str  # Tipo de documento (PDF, TXT, MD, etc.)
+
+class DocumentDeleteResponse(BaseModel):
+    """Modelo de resposta para remoção de documentos."""
+    filename: str
+    deleted_chunks: int
+    file_deleted: bool
+
+class IngestionJobInfo(BaseModel):
+    """Modelo para o estado de um job de ingestão de documento."""
+    job_id: str
+    filename: str
+    file_path: str
+    status: str  # queued, extracting, embedding, indexing, completed, failed ou duplicate
+    content_hash: Optional[str] = None  # SHA-256 do arquivo, calculado durante o upload
+    duplicate_of: Optional[str] = None  # Documento já indexado com o mesmo conteúdo
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    pages_total: Optional[int] = None
+    pages_extracted: int = 0
+    chunks_total: Optional[int] = None
+    chunks_embedded: int = 0
+    eta_seconds: Optional[float] = None  # Estimativa para terminar a etapa atual
+    error: Optional[str] = None
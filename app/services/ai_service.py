@@ -1,118 +1,116 @@
 """
 Serviço de IA para geração de respostas usando OpenAI.
 """
-from typing import List, Dict, Any, Tuple
+from typing import AsyncIterator, List, Dict, Any, NamedTuple, Optional, Tuple
 import random
+import openai
+import asyncio
+from contextlib import aclosing
 from langchain.docstore.document import Document
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
-import tiktoken
-from app.config.settings import OPENAI_API_KEY, CHAT_MODEL, TEMPERATURE, logger
+from app.utils.token_budget import count_document_tokens, pack_by_tokens
+from app.utils.chat_limiter import ChatTimeoutError, chat_limiter
+from app.utils.answer_cache import answer_cache, lookup_answer
+from app.config.settings import (
+    OPENAI_API_KEY,
+    OPENAI_API_BASE,
+    CHAT_MODEL,
+    TEMPERATURE,
+    ANSWER_MAP_CONCURRENCY,
+    ANSWER_REDUCE_FANIN,
+    logger
+)
 
 # Inicializa o modelo de chat OpenAI
 chat_model = ChatOpenAI(
     model_name=CHAT_MODEL,
     temperature=TEMPERATURE,
-    api_key=OPENAI_API_KEY
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_API_BASE
 )
 
-# Inicializa o tokenizador
-tokenizer = tiktoken.get_encoding("cl100k_base")
+# Cliente assíncrono da OpenAI para as respostas em streaming (ver ``stream_chat``)
+chat_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_API_BASE)
+
+HUMAN_REQUEST_KEYWORDS = [
+    "falar com humano", "falar com uma pessoa", "falar com atendente",
+    "quero falar com alguém", "preciso de um humano", "atendimento humano",
+    "pessoa real", "atendente real", "contato humano", "suporte humano"
+]
+
+HUMAN_SUPPORT_ANSWER = "Entendo que você prefere falar com um humano. Você pode entrar em contato com nossa equipe de suporte do AgiFinance pelo email support@agifinance.com.br ou pelo chat no site principal. Estamos disponíveis de segunda a sexta, das 9h às 18h. Posso ajudar com mais alguma coisa?"
+
+NO_CONTEXT_ANSWER = "Não encontrei informações relevantes para responder à sua pergunta. Por favor, tente reformular ou forneça mais detalhes."
+
+MAX_TOKENS_PER_REQUEST = 250000  # Limite seguro abaixo do máximo de 300.000
+
+class AnswerEvent(NamedTuple):
+    """Evento da geração de uma resposta em streaming."""
+    kind: str  # "partial" (resposta de um lote de contexto) ou "delta" (trecho da resposta final)
+    text: str
+    batch: Optional[int] = None  # Número do lote (1..batches), nos eventos "partial"
+    batches: Optional[int] = None
+
+def wants_human(question: str) -> bool:
+    """Indica se o usuário pediu para falar com um atendente humano."""
+    question_lower = question.lower()
+    return any(keyword in question_lower for keyword in HUMAN_REQUEST_KEYWORDS)
 
-def count_tokens(text: str) -> int:
+def format_history(chat_history: List[Dict[str, Any]]) -> str:
     """
-    Conta o número de tokens em um texto.
+    Formata as últimas mensagens do histórico para o prompt.
     
     Args:
-        text: Texto para contar tokens
+        chat_history: Histórico de chat
         
     Retorna:
-        Número de tokens
+        Histórico formatado, uma mensagem por linha
     """
-    tokens = tokenizer.encode(text)
-    return len(tokens)
+    recent_history = chat_history[-5:] if len(chat_history) > 5 else chat_history
+    
+    formatted_history = ""
+    for msg in recent_history:
+        role = msg.get("role", "")
+        content = msg.get("content", "")
+        if role and content:
+            formatted_history += f"\n{role.capitalize()}: {content}"
+    return formatted_history
 
-def split_context_by_tokens(context_docs: List[Document], max_tokens: int = 250000) -> List[List[Document]]:
+def build_synthesis_messages(question: str, answers: List[str]) -> List[Dict[str, str]]:
     """
-    Divide documentos de contexto em lotes que não excedam o limite de tokens.
+    Monta as mensagens que unem as respostas parciais de vários lotes.
     
     Args:
-        context_docs: Lista de objetos Document de contexto
-        max_tokens: Número máximo de tokens por lote
+        question: Pergunta do usuário
+        answers: Respostas parciais, uma por lote
         
     Retorna:
-        Lista de lotes de objetos Document
-    """
-    batches = []
-    current_batch = []
-    current_tokens = 0
-    
-    for doc in context_docs:
-        doc_tokens = count_tokens(doc.page_content)
-        
-        # If a single document exceeds the token limit, we need to split it
-        if doc_tokens > max_tokens:
-            # If we have documents in the current batch, add them as a batch
-            if current_batch:
-                batches.append(current_batch)
-                current_batch = []
-                current_tokens = 0
-            
-            # Split the large document into smaller chunks
-            text = doc.page_content
-            chunks = []
-            start = 0
-            
-            while start < len(text):
-                # Try with a chunk of 1000 characters first
-                end = start + 1000
-                if end > len(text):
-                    end = len(text)
-                
-                chunk = text[start:end]
-                chunk_tokens = count_tokens(chunk)
-                
-                # Adjust chunk size to fit within token limit
-                while chunk_tokens > max_tokens and end > start + 100:
-                    end = start + int((end - start) * 0.8)  # Reduce by 20%
-                    chunk = text[start:end]
-                    chunk_tokens = count_tokens(chunk)
-                
-                # Create a new document with the chunk
-                chunk_doc = Document(
-                    page_content=chunk,
-                    metadata=doc.metadata.copy()
-                )
-                chunks.append(chunk_doc)
-                
-                start = end
-            
-            # Add each chunk as its own batch
-            for chunk_doc in chunks:
-                batches.append([chunk_doc])
-        
-        # If adding this document would exceed the token limit, start a new batch
-        elif current_tokens + doc_tokens > max_tokens:
-            batches.append(current_batch)
-            current_batch = [doc]
-            current_tokens = doc_tokens
-        
-        # Otherwise, add the document to the current batch
-        else:
-            current_batch.append(doc)
-            current_tokens += doc_tokens
-    
-    # Add the last batch if it's not empty
-    if current_batch:
-        batches.append(current_batch)
+        Mensagens para o modelo de chat
+    """
+    synthesis_prompt = f"""Você é o assistente de IA do AgiFinance, uma plataforma moderna de gestão financeira pessoal.
+
+Você recebeu as seguintes respostas parciais para a pergunta: "{question}"
+
+Respostas parciais:
+{' '.join(answers)}
+
+Por favor, sintetize essas respostas em uma única resposta coerente e concisa. Remova qualquer redundância e organize as informações de forma lógica. Mantenha o foco em finanças pessoais e no uso da plataforma AgiFinance.
+"""
     
-    return batches
+    return [
+        {"role": "system", "content": synthesis_prompt}
+    ]
 
 async def generate_answer(question: str, context_docs: List[Document], chat_history: List[Dict[str, Any]] = []) -> str:
     """
     Gera uma resposta usando OpenAI com base na pergunta, documentos de contexto e histórico de chat.
     
+    Segue o mesmo caminho de ``stream_answer_events`` (recuperação do cache,
+    lotes, map/reduce e gravação no cache), com a resposta final obtida de uma
+    vez em vez de transmitida.
+    
     Args:
         question: Pergunta do usuário
         context_docs: Lista de objetos Document de contexto
@@ -127,73 +125,237 @@ async def generate_answer(question: str, context_docs: List[Document], chat_hist
     except ImportError as e:
         logger.error(f"Erro ao importar prompts do AgiFinance: {str(e)}")
     
-    question_lower = question.lower()
-    human_request_keywords = [
-        "falar com humano", "falar com uma pessoa", "falar com atendente",
-        "quero falar com alguém", "preciso de um humano", "atendimento humano",
-        "pessoa real", "atendente real", "contato humano", "suporte humano"
-    ]
+    parts = []
+    async with aclosing(stream_answer_events(question, context_docs, chat_history, stream=False)) as events:
+        async for event in events:
+            if event.kind == "delta":
+                parts.append(event.text)
+    return "".join(parts)
+
+async def map_batches(question: str, batches: List[List[Document]], formatted_history: str) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Responde a pergunta com cada lote de contexto, até ``ANSWER_MAP_CONCURRENCY`` lotes ao mesmo tempo.
     
-    if any(keyword in question_lower for keyword in human_request_keywords):
-        return "Entendo que você prefere falar com um humano. Você pode entrar em contato com nossa equipe de suporte do AgiFinance pelo email support@agifinance.com.br ou pelo chat no site principal. Estamos disponíveis de segunda a sexta, das 9h às 18h. Posso ajudar com mais alguma coisa?"
+    As respostas são entregues na ordem em que ficam prontas. Se um lote
+    falhar ou o consumo for interrompido, os lotes restantes são cancelados.
     
-    try:
-        recent_history = chat_history[-5:] if len(chat_history) > 5 else chat_history
+    Args:
+        question: Pergunta do usuário
+        batches: Lotes de documentos de contexto
+        formatted_history: Histórico de chat formatado
         
-        formatted_history = ""
-        for msg in recent_history:
-            role = msg.get("role", "")
-            content = msg.get("content", "")
-            if role and content:
-                formatted_history += f"\n{role.capitalize()}: {content}"
+    Retorna:
+        Gerador assíncrono de tuplas (posição do lote, resposta)
+    """
+    semaphore = asyncio.Semaphore(max(ANSWER_MAP_CONCURRENCY, 1))
+    
+    async def answer_batch(i: int, batch: List[Document]) -> Tuple[int, str]:
+        async with semaphore:
+            logger.info(f"Processando lote {i+1} de {len(batches)}")
+            return i, await process_single_batch(question, batch, formatted_history)
+    
+    tasks = [asyncio.create_task(answer_batch(i, batch)) for i, batch in enumerate(batches)]
+    try:
+        for next_answer in asyncio.as_completed(tasks):
+            yield await next_answer
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def reduce_answers(question: str, answers: List[str]) -> List[str]:
+    """
+    Une respostas parciais em níveis até que caibam em uma única síntese.
+    
+    Enquanto houver mais de ``ANSWER_REDUCE_FANIN`` respostas, cada grupo de
+    ``ANSWER_REDUCE_FANIN`` é sintetizado em uma resposta, com os grupos do
+    mesmo nível em paralelo. A ordem dos lotes é mantida.
+    
+    Args:
+        question: Pergunta do usuário
+        answers: Respostas parciais, na ordem dos lotes
         
-        MAX_TOKENS_PER_REQUEST = 250000  # Limite seguro abaixo do máximo de 300.000
-        batches = split_context_by_tokens(context_docs, MAX_TOKENS_PER_REQUEST)
+    Retorna:
+        No máximo ``ANSWER_REDUCE_FANIN`` respostas para a síntese final
+    """
+    fanin = max(ANSWER_REDUCE_FANIN, 2)
+    semaphore = asyncio.Semaphore(max(ANSWER_MAP_CONCURRENCY, 1))
+    
+    async def reduce_group(group: List[str]) -> str:
+        if len(group) == 1:
+            return group[0]
+        async with semaphore:
+            return await complete_chat(build_synthesis_messages(question, group))
+    
+    while len(answers) > fanin:
+        groups = [answers[i:i + fanin] for i in range(0, len(answers), fanin)]
+        logger.info(f"Sintetizando {len(answers)} respostas parciais em {len(groups)} grupos")
+        answers = list(await asyncio.gather(*(reduce_group(group) for group in groups)))
+    return answers
+
+async def complete_chat(messages: List[Dict[str, str]]) -> str:
+    """
+    Obtém uma resposta completa do modelo de chat, sem bloquear o event loop.
+    
+    A chamada ocupa uma vaga do limitador de completions e respeita o prazo ``CHAT_TIMEOUT``.
+    
+    Args:
+        messages: Mensagens para o modelo de chat
         
-        if not batches:
-            logger.warning("Nenhum documento de contexto disponível para a pergunta.")
-            return "Não encontrei informações relevantes para responder à sua pergunta. Por favor, tente reformular ou forneça mais detalhes."
+    Retorna:
+        Texto da resposta
+    
+    Levanta:
+        ChatTimeoutError: Se o modelo não responder dentro do prazo
+    """
+    response = await chat_limiter.run(chat_model.ainvoke, messages)
+    return response.content
+
+async def stream_chat(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """
+    Transmite a resposta do modelo de chat em trechos.
+    
+    Usa ``chat_client``, criado a partir das mesmas configurações do
+    ``chat_model``: ao contrário de ``chat_model.astream``, a conexão é
+    encerrada quando o consumo é interrompido (cancelamento ou ``aclose``), e o
+    modelo para de gerar tokens.
+    A vaga do limitador fica ocupada até o fim do stream, e o prazo
+    ``CHAT_TIMEOUT`` vale para o primeiro trecho e para o intervalo entre trechos.
+    
+    Args:
+        messages: Mensagens para o modelo de chat
         
-        if len(batches) == 1:
-            return await process_single_batch(question, batches[0], formatted_history)
+    Retorna:
+        Gerador assíncrono de trechos da resposta
+    
+    Levanta:
+        ChatTimeoutError: Se o modelo não responder dentro do prazo
+    """
+    async with chat_limiter.slot():
+        stream = await chat_limiter.wait(
+            chat_client.chat.completions.create(model=CHAT_MODEL, temperature=TEMPERATURE, messages=messages, stream=True)
+        )
+        try:
+            while True:
+                try:
+                    chunk = await chat_limiter.wait(stream.__anext__())
+                except StopAsyncIteration:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Protegido do cancelamento: a conexão precisa ser fechada mesmo se a tarefa foi cancelada
+            await asyncio.shield(stream.close())
+
+async def stream_answer_events(
+    question: str,
+    context_docs: List[Document],
+    chat_history: List[Dict[str, Any]] = [],
+    stream: bool = True
+) -> AsyncIterator[AnswerEvent]:
+    """
+    Gera uma resposta, entregando eventos à medida que ficam prontos.
+    
+    Com um único lote de contexto, o primeiro trecho chega assim que o modelo
+    gera o primeiro token. Com vários lotes, cada resposta parcial é entregue
+    (evento ``partial``) assim que seu lote termina, e a síntese final é
+    transmitida em trechos (eventos ``delta``). Uma resposta do cache de
+    respostas sai em um único evento ``delta``.
+    
+    Uma pergunta parecida com outra já respondida sobre os mesmos chunks
+    recebe a resposta do cache de respostas (ver ``app.utils.answer_cache``),
+    exceto quando o histórico muda o sentido da pergunta.
+    
+    Args:
+        question: Pergunta do usuário
+        context_docs: Lista de objetos Document de contexto
+        chat_history: Histórico de chat
+        stream: Se a resposta final é transmitida em trechos (False: um único
+            evento ``delta``, usado por ``generate_answer``)
         
-        logger.info(f"Dividindo contexto em {len(batches)} lotes devido ao tamanho do documento")
+    Retorna:
+        Gerador assíncrono de eventos da resposta
+    
+    Levanta:
+        ValueError: Se a geração falhar
+    """
+    if wants_human(question):
+        yield AnswerEvent("delta", HUMAN_SUPPORT_ANSWER)
+        return
+    
+    try:
+        formatted_history = format_history(chat_history)
         
-        all_answers = []
-        for i, batch in enumerate(batches):
-            logger.info(f"Processando lote {i+1} de {len(batches)}")
-            batch_answer = await process_single_batch(question, batch, formatted_history)
-            all_answers.append(batch_answer)
+        batches = [batch.documents for batch in pack_by_tokens(context_docs, MAX_TOKENS_PER_REQUEST)]
         
-        combined_answer = ""
+        if not batches:
+            logger.warning("Nenhum documento de contexto disponível para a pergunta.")
+            yield AnswerEvent("delta", NO_CONTEXT_ANSWER)
+            return
         
-        synthesis_prompt = f"""Você é o assistente de IA do AgiFinance, uma plataforma moderna de gestão financeira pessoal.
-
-Você recebeu as seguintes respostas parciais para a pergunta: "{question}"
-
-Respostas parciais:
-{' '.join(all_answers)}
-
-Por favor, sintetize essas respostas em uma única resposta coerente e concisa. Remova qualquer redundância e organize as informações de forma lógica. Mantenha o foco em finanças pessoais e no uso da plataforma AgiFinance.
-"""
+        # Acerto no cache: a resposta inteira sai em um único trecho, sem chamar o modelo
+        cached = await lookup_answer(question, context_docs, chat_history)
+        if cached is not None and cached.answer is not None:
+            logger.info(f"Resposta reutilizada do cache (similaridade {cached.similarity:.3f}) para a pergunta: {question[:50]}...")
+            yield AnswerEvent("delta", cached.answer)
+            return
         
-        synthesis_messages = [
-            {"role": "system", "content": synthesis_prompt}
-        ]
+        if len(batches) == 1:
+            messages = build_batch_messages(question, batches[0], formatted_history)
+        else:
+            logger.info(f"Dividindo contexto em {len(batches)} lotes devido ao tamanho do documento")
+            all_answers = [""] * len(batches)
+            async with aclosing(map_batches(question, batches, formatted_history)) as results:
+                async for i, batch_answer in results:
+                    all_answers[i] = batch_answer
+                    yield AnswerEvent("partial", batch_answer, i + 1, len(batches))
+            messages = build_synthesis_messages(question, await reduce_answers(question, all_answers))
+            logger.info(f"Sintetizando resposta final para a pergunta: {question[:50]}...")
         
-        synthesis_response = chat_model.invoke(synthesis_messages)
-        final_answer = synthesis_response.content
+        parts = []
+        if stream:
+            async with aclosing(stream_chat(messages)) as deltas:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield AnswerEvent("delta", delta)
+        else:
+            parts.append(await complete_chat(messages))
+            yield AnswerEvent("delta", parts[0])
         
-        logger.info(f"Resposta final sintetizada para a pergunta: {question[:50]}...")
-        return final_answer
+        # Só respostas geradas até o fim entram no cache
+        if cached is not None:
+            await answer_cache.store(cached, question, "".join(parts))
         
+    except ChatTimeoutError as e:
+        logger.error(f"Erro ao gerar resposta: {str(e)}")
+        raise
     except Exception as e:
         logger.error(f"Erro ao gerar resposta: {str(e)}")
         raise ValueError(f"Erro ao gerar resposta: {str(e)}")
 
-async def process_single_batch(question: str, batch_docs: List[Document], formatted_history: str) -> str:
+async def stream_answer(question: str, context_docs: List[Document], chat_history: List[Dict[str, Any]] = []) -> AsyncIterator[str]:
     """
-    Processa um único lote de documentos para gerar uma resposta.
+    Gera uma resposta como ``generate_answer``, entregando apenas os trechos da resposta final.
+    
+    Args:
+        question: Pergunta do usuário
+        context_docs: Lista de objetos Document de contexto
+        chat_history: Histórico de chat
+        
+    Retorna:
+        Gerador assíncrono de trechos da resposta
+    
+    Levanta:
+        ValueError: Se a geração falhar
+    """
+    async with aclosing(stream_answer_events(question, context_docs, chat_history)) as events:
+        async for event in events:
+            if event.kind == "delta":
+                yield event.text
+
+def build_batch_messages(question: str, batch_docs: List[Document], formatted_history: str) -> List[Dict[str, str]]:
+    """
+    Monta as mensagens da pergunta com um lote de documentos de contexto.
     
     Args:
         question: Pergunta do usuário
@@ -201,7 +363,7 @@ async def process_single_batch(question: str, batch_docs: List[Document], format
         formatted_history: Histórico de chat formatado
         
     Retorna:
-        Resposta gerada para este lote
+        Mensagens para o modelo de chat
     """
     context_text = ""
     for i, doc in enumerate(batch_docs):
@@ -209,7 +371,7 @@ async def process_single_batch(question: str, batch_docs: List[Document], format
         page = doc.metadata.get("page", "N/A")
         context_text += f"\n\nDocumento {i+1} (Fonte: {source}, Página: {page}):\n{doc.page_content}"
     
-    context_tokens = count_tokens(context_text)
+    context_tokens = sum(count_document_tokens(batch_docs))
     logger.info(f"Tamanho do contexto: {context_tokens} tokens")
     
     try:
@@ -229,13 +391,24 @@ Contexto dos documentos:
     
     user_prompt = f"Pergunta: {question}"
     
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
+
+async def process_single_batch(question: str, batch_docs: List[Document], formatted_history: str) -> str:
+    """
+    Processa um único lote de documentos para gerar uma resposta.
     
-    # Gerar resposta
-    response = chat_model.invoke(messages)
-    answer = response.content
+    Args:
+        question: Pergunta do usuário
+        batch_docs: Lote de objetos Document
+        formatted_history: Histórico de chat formatado
+        
+    Retorna:
+        Resposta gerada para este lote
+    """
+    messages = build_batch_messages(question, batch_docs, formatted_history)
     
-    return answer
+    # Gerar resposta
+    return await complete_chat(messages)
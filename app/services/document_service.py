@@ -2,33 +2,60 @@
 Serviço de processamento de documentos.
 """
 import os
+import uuid
+import asyncio
+import hashlib
 import datetime
-from typing import List
+from typing import Any, Callable, List, Optional, Tuple
 from langchain.docstore.document import Document
-from app.utils.text_processing import extract_text, split_text
-from app.utils.vector_db import add_documents_to_vector_db
-from app.config.settings import UPLOADS_DIR, logger
+from app.utils.text_processing import iter_pages, iter_chunks
+from app.utils.vector_db import add_documents_to_vector_db, delete_documents_from_vector_db
+from app.utils.upload_registry import upload_registry
+from app.config.settings import UPLOADS_DIR, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES, logger
 
-async def process_document(file_path: str, file_name: str, upload_time: str) -> List[Document]:
+# Arquivos em recebimento ficam fora da listagem de documentos até serem confirmados
+INCOMING_DIR = os.path.join(UPLOADS_DIR, ".incoming")
+
+class UploadTooLargeError(Exception):
+    """O arquivo enviado excede o tamanho máximo permitido."""
+
+async def process_document(
+    file_path: str,
+    file_name: str,
+    upload_time: str,
+    on_progress: Optional[Callable[..., None]] = None
+) -> List[Document]:
     """
     Processa um documento e o divide em pedaços (chunks).
     
+    A extração e a divisão rodam juntas, página a página, fora do event loop:
+    o texto completo do documento nunca fica em memória, e cada chunk guarda a
+    página e a posição em que começa.
+    
     Args:
         file_path: Caminho para o documento
         file_name: Nome do documento
         upload_time: Timestamp de upload
+        on_progress: Função chamada com os campos de progresso (status, pages_extracted...)
         
     Retorna:
         Lista de objetos Document
     """
-    try:
-        text = extract_text(file_path)
-        chunks = split_text(text)
-        
-        for chunk in chunks:
+    progress = on_progress or (lambda **fields: None)
+    
+    def extract_chunks() -> List[Document]:
+        pages = iter_pages(file_path, lambda done, total: progress(pages_extracted=done, pages_total=total))
+        chunks = []
+        for chunk in iter_chunks(pages):
             chunk.metadata["source"] = file_path
             chunk.metadata["filename"] = file_name
             chunk.metadata["upload_time"] = upload_time
+            chunks.append(chunk)
+        return chunks
+    
+    try:
+        progress(status="extracting")
+        chunks = await asyncio.to_thread(extract_chunks)
         
         logger.info(f"Documento processado: {file_name} - {len(chunks)} chunks criados")
         return chunks
@@ -37,30 +64,139 @@ async def process_document(file_path: str, file_name: str, upload_time: str) ->
         logger.error(f"Erro ao processar documento {file_name}: {str(e)}")
         raise ValueError(f"Erro ao processar documento: {str(e)}")
 
-async def upload_and_process_document(file_content: bytes, file_name: str) -> str:
+async def stream_upload(
+    upload: Any,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    chunk_bytes: int = UPLOAD_CHUNK_BYTES
+) -> Tuple[str, str, int]:
     """
-    Salva um arquivo enviado e o processa.
+    Grava um upload em um arquivo temporário, bloco a bloco, calculando o SHA-256 no caminho.
+    
+    A memória usada não depende do tamanho do arquivo: apenas um bloco de
+    ``chunk_bytes`` fica em memória por vez.
     
     Args:
-        file_content: Bytes do conteúdo do arquivo
-        file_name: Nome do arquivo
+        upload: Arquivo enviado (qualquer objeto com ``async read(size)``, como ``UploadFile``)
+        max_bytes: Tamanho máximo aceito em bytes
+        chunk_bytes: Tamanho de cada bloco lido e gravado
         
     Retorna:
-        Caminho para o arquivo salvo
+        Tupla (caminho do arquivo temporário, hash SHA-256 em hexadecimal, tamanho em bytes)
+        
+    Levanta:
+        UploadTooLargeError: Se o arquivo exceder ``max_bytes``
     """
-    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    tmp_path = os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
     
-    upload_time = datetime.datetime.now().isoformat()
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_bytes)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"Arquivo excede o limite de {max_bytes} bytes")
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        discard_upload(tmp_path)
+        raise
+    await asyncio.to_thread(f.close)
     
-    file_path = os.path.join(UPLOADS_DIR, file_name)
+    return tmp_path, digest.hexdigest(), size
+
+def find_duplicate(content_hash: str) -> Optional[str]:
+    """
+    Procura um documento já indexado com o mesmo conteúdo.
     
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    Args:
+        content_hash: Hash SHA-256 do conteúdo
+        
+    Retorna:
+        Nome do documento existente ou None
+    """
+    file_name = upload_registry.find(content_hash)
+    if file_name is None or not os.path.isfile(os.path.join(UPLOADS_DIR, file_name)):
+        return None
+    return file_name
+
+def commit_upload(tmp_path: str, file_name: str) -> Tuple[str, str]:
+    """
+    Move um upload recebido por ``stream_upload`` para o diretório de uploads.
+    
+    Args:
+        tmp_path: Caminho do arquivo temporário
+        file_name: Nome final do arquivo
+        
+    Retorna:
+        Tupla (caminho do arquivo salvo, timestamp do upload)
+    """
+    upload_time = datetime.datetime.now().isoformat()
+    file_path = os.path.join(UPLOADS_DIR, file_name)
+    os.replace(tmp_path, file_path)
     
     logger.info(f"Arquivo salvo: {file_path}")
+    return file_path, upload_time
+
+def discard_upload(tmp_path: str) -> None:
+    """
+    Remove um arquivo temporário de upload, se existir.
+    
+    Args:
+        tmp_path: Caminho do arquivo temporário
+    """
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+async def index_document(
+    file_path: str,
+    file_name: str,
+    upload_time: str,
+    on_progress: Optional[Callable[..., None]] = None
+) -> int:
+    """
+    Processa um arquivo já gravado e adiciona seus chunks ao banco de dados vetorial.
+    
+    Se o arquivo já tinha sido indexado, os chunks da versão anterior são
+    substituídos pelos da nova versão.
+    
+    Args:
+        file_path: Caminho do arquivo
+        file_name: Nome do arquivo
+        upload_time: Timestamp do upload
+        on_progress: Função chamada com os campos de progresso (status, chunks_embedded...)
+        
+    Retorna:
+        Número de chunks indexados
+    """
+    chunks = await process_document(file_path, file_name, upload_time, on_progress)
+    await add_documents_to_vector_db(chunks, replace=True, on_progress=on_progress)
+    return len(chunks)
+
+async def delete_document(file_name: str) -> Tuple[int, bool]:
+    """
+    Remove um documento enviado e todos os seus chunks do banco de dados vetorial.
     
-    chunks = await process_document(file_path, file_name, upload_time)
+    Args:
+        file_name: Nome do arquivo
+        
+    Retorna:
+        Tupla (número de chunks removidos, se o arquivo existia em disco)
+    """
+    file_path = os.path.join(UPLOADS_DIR, file_name)
+    removed_chunks = await delete_documents_from_vector_db(file_path)
     
-    add_documents_to_vector_db(chunks)
+    file_deleted = os.path.isfile(file_path)
+    if file_deleted:
+        os.remove(file_path)
+    await asyncio.to_thread(upload_registry.remove, file_name)
     
-    return file_path
+    logger.info(f"Documento removido: {file_name} - {removed_chunks} chunks removidos")
+    return removed_chunks, file_deleted
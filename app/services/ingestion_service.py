@@ -0,0 +1,412 @@
+"""
+Fila de ingestão de documentos em segundo plano.
+
+O upload só grava o arquivo e cria um job; a extração, a divisão em chunks,
+os embeddings e a gravação no índice rodam em um conjunto limitado de workers.
+O estado de cada job (etapa, páginas extraídas, chunks com embeddings e
+estimativa de término) fica na memória do processo e no Redis, para que
+``GET /jobs/{id}`` funcione em qualquer worker, e pode ser enviado ao cliente
+pelo WebSocket da sessão que fez o upload.
+"""
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config.settings import (
+    INGESTION_WORKERS,
+    INGESTION_QUEUE_SIZE,
+    INGESTION_JOB_TTL,
+    INGESTION_PROGRESS_INTERVAL,
+    logger
+)
+from app.services.document_service import index_document
+from app.utils.upload_registry import upload_registry
+
+FINISHED_STATUSES = ("completed", "failed", "duplicate")
+
+class IngestionJob:
+    """Estado de um documento na fila de ingestão."""
+
+    def __init__(
+        self,
+        file_path: str,
+        filename: str,
+        upload_time: str,
+        session_id: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        size: Optional[int] = None
+    ):
+        """
+        Cria um job na etapa ``queued``.
+
+        Args:
+            file_path: Caminho do arquivo já gravado em disco
+            filename: Nome do arquivo enviado
+            upload_time: Timestamp do upload
+            session_id: Sessão WebSocket que recebe os eventos de progresso
+            content_hash: Hash SHA-256 do conteúdo, calculado durante o upload
+            size: Tamanho do arquivo em bytes
+        """
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.filename = filename
+        self.upload_time = upload_time
+        self.session_id = session_id
+        self.content_hash = content_hash
+        self.size = size
+        self.duplicate_of: Optional[str] = None
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stage_started_at = self.created_at
+        self.pages_total: Optional[int] = None
+        self.pages_extracted = 0
+        self.chunks_total: Optional[int] = None
+        self.chunks_embedded = 0
+        self.error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def eta_seconds(self) -> Optional[float]:
+        """
+        Estima o tempo restante da etapa atual pelo ritmo observado até agora.
+
+        Retorna:
+            Segundos restantes ou None se a etapa não tiver progresso mensurável
+        """
+        if self.status == "extracting":
+            done, total = self.pages_extracted, self.pages_total
+        elif self.status == "embedding":
+            done, total = self.chunks_embedded, self.chunks_total
+        else:
+            return None
+        if not total or not done:
+            return None
+        elapsed = time.time() - self.stage_started_at
+        return round(elapsed / done * (total - done), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serializa o estado do job.
+
+        Retorna:
+            Dicionário no formato de ``IngestionJobInfo``
+        """
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "file_path": self.file_path,
+            "status": self.status,
+            "content_hash": self.content_hash,
+            "duplicate_of": self.duplicate_of,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "pages_total": self.pages_total,
+            "pages_extracted": self.pages_extracted,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "eta_seconds": self.eta_seconds(),
+            "error": self.error
+        }
+
+class IngestionQueue:
+    """Fila limitada de jobs de ingestão atendida por um número fixo de workers."""
+
+    def __init__(self, workers: int, queue_size: int, job_ttl: int, progress_interval: float):
+        """
+        Inicializa a fila.
+
+        Args:
+            workers: Número de documentos processados ao mesmo tempo
+            queue_size: Número máximo de jobs aguardando processamento
+            job_ttl: Tempo de retenção do estado dos jobs em segundos
+            progress_interval: Intervalo mínimo entre eventos de progresso de um job
+        """
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.job_ttl = job_ttl
+        self.progress_interval = progress_interval
+        self.jobs: Dict[str, IngestionJob] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Envia o estado do job à sessão que fez o upload (registrado pelo controlador WebSocket)
+        self.notify: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+        self.key_prefix = "ingestion_job:"
+        self._last_event: Dict[str, float] = {}
+        self._last_payload: Dict[str, Dict[str, Any]] = {}
+        self._publish_lock = asyncio.Lock()
+
+    def start(self) -> None:
+        """Inicia os workers no event loop atual (chamadas repetidas são ignoradas)."""
+        if self.tasks:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Fila de ingestão iniciada com {self.workers} workers (capacidade {self.queue_size})")
+
+    async def stop(self) -> None:
+        """Cancela os workers; jobs em andamento ficam com o último estado publicado."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(
+        self,
+        file_path: str,
+        filename: str,
+        upload_time: str,
+        session_id: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        size: Optional[int] = None
+    ) -> IngestionJob:
+        """
+        Enfileira um documento já gravado em disco.
+
+        Args:
+            file_path: Caminho do arquivo
+            filename: Nome do arquivo enviado
+            upload_time: Timestamp do upload
+            session_id: Sessão WebSocket que recebe os eventos de progresso (opcional)
+            content_hash: Hash SHA-256 do conteúdo (opcional)
+            size: Tamanho do arquivo em bytes (opcional)
+
+        Retorna:
+            Job criado
+
+        Levanta:
+            asyncio.QueueFull: Se a fila estiver cheia
+        """
+        self.start()
+        job = IngestionJob(file_path, filename, upload_time, session_id, content_hash, size)
+        self.queue.put_nowait(job)
+        self._prune()
+        self.jobs[job.id] = job
+        logger.info(f"Job de ingestão {job.id} criado para {filename} ({self.queue.qsize()} na fila)")
+        await self._publish(job)
+        return job
+
+    def find_active(self, content_hash: str) -> Optional[str]:
+        """
+        Procura um job ainda em andamento com o mesmo conteúdo.
+
+        Args:
+            content_hash: Hash SHA-256 do conteúdo
+
+        Retorna:
+            Nome do arquivo do job em andamento ou None
+        """
+        for job in self.jobs.values():
+            if job.content_hash == content_hash and not job.finished:
+                return job.filename
+        return None
+
+    def find_active_job(self, filename: str) -> Optional[str]:
+        """
+        Procura um job ainda em andamento para o mesmo nome de arquivo.
+
+        Args:
+            filename: Nome do arquivo enviado
+
+        Retorna:
+            ID do job em andamento ou None
+        """
+        for job in self.jobs.values():
+            if job.filename == filename and not job.finished:
+                return job.id
+        return None
+
+    async def record_duplicate(
+        self,
+        filename: str,
+        content_hash: str,
+        duplicate_of: str,
+        session_id: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        Registra um upload descartado por ter o mesmo conteúdo de um documento existente.
+
+        O job já nasce concluído com status ``duplicate``, para que o cliente
+        acompanhe todos os uploads da mesma forma.
+
+        Args:
+            filename: Nome do arquivo enviado
+            content_hash: Hash SHA-256 do conteúdo
+            duplicate_of: Nome do documento com o mesmo conteúdo
+            session_id: Sessão WebSocket que recebe o evento (opcional)
+
+        Retorna:
+            Job criado
+        """
+        job = IngestionJob("", filename, "", session_id, content_hash)
+        job.duplicate_of = duplicate_of
+        job.status = "duplicate"
+        job.finished_at = job.created_at
+        self._prune()
+        self.jobs[job.id] = job
+        logger.info(f"Upload de {filename} ignorado: mesmo conteúdo de {duplicate_of}")
+        await self._publish(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna o estado de um job deste ou de outro worker.
+
+        Args:
+            job_id: ID do job
+
+        Retorna:
+            Estado do job ou None se não for encontrado
+        """
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return await asyncio.to_thread(self._get_redis, job_id)
+
+    def update(self, job: IngestionJob, **fields: Any) -> None:
+        """
+        Atualiza o estado de um job e agenda o evento de progresso.
+
+        Pode ser chamado das threads de extração e de embeddings. Mudanças de
+        etapa são sempre publicadas; contadores, no máximo a cada
+        ``progress_interval`` segundos.
+
+        Args:
+            job: Job a atualizar
+            **fields: Atributos do job (status, pages_extracted, chunks_total...)
+        """
+        now = time.time()
+        status = fields.get("status")
+        if status is not None and status != job.status:
+            job.stage_started_at = now
+            if status in FINISHED_STATUSES:
+                job.finished_at = now
+        for name, value in fields.items():
+            setattr(job, name, value)
+
+        if status is None and now - self._last_event.get(job.id, 0) < self.progress_interval:
+            return
+        self._last_event[job.id] = now
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            asyncio.ensure_future(self._publish(job))
+        elif self.loop is not None:
+            self.loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._publish(job)))
+
+    async def _worker(self) -> None:
+        """Processa jobs da fila, um de cada vez."""
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._process(job)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job: IngestionJob) -> None:
+        """Executa a ingestão de um job, registrando o resultado."""
+        job.started_at = time.time()
+        logger.info(f"Job de ingestão {job.id} iniciado: {job.filename} (aguardou {job.started_at - job.created_at:.1f}s)")
+        try:
+            chunks = await index_document(
+                job.file_path,
+                job.filename,
+                job.upload_time,
+                on_progress=lambda **fields: self.update(job, **fields)
+            )
+            if job.content_hash:
+                await asyncio.to_thread(upload_registry.record, job.filename, job.content_hash, job.size or 0)
+            self.update(job, status="completed", chunks_total=chunks, chunks_embedded=chunks)
+            logger.info(f"Job de ingestão {job.id} concluído em {job.finished_at - job.started_at:.1f}s: {chunks} chunks")
+        except Exception as e:
+            logger.error(f"Job de ingestão {job.id} falhou ({job.filename}): {str(e)}", exc_info=True)
+            if job.content_hash:
+                # O arquivo em disco já foi substituído: o hash anterior deixa de valer
+                await asyncio.to_thread(upload_registry.remove, job.filename)
+            self.update(job, status="failed", error=str(e))
+
+    async def _publish(self, job: IngestionJob) -> None:
+        """Grava o estado atual do job no Redis e o envia à sessão WebSocket."""
+        # Serializado para que um evento antigo nunca sobrescreva um mais novo
+        async with self._publish_lock:
+            payload = job.to_dict()
+            # Eventos agendados juntos publicam o mesmo estado mais recente uma única vez
+            if payload == self._last_payload.get(job.id):
+                return
+            self._last_payload[job.id] = payload
+            await asyncio.to_thread(self._set_redis, job.id, payload)
+            if self.notify is not None and job.session_id:
+                try:
+                    await self.notify(job.session_id, payload)
+                except Exception as e:
+                    logger.warning(f"Erro ao enviar progresso do job {job.id}: {str(e)}")
+
+    def _prune(self) -> None:
+        """Descarta da memória jobs concluídos há mais de ``job_ttl`` segundos."""
+        limit = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < limit]:
+            del self.jobs[job_id]
+            self._last_event.pop(job_id, None)
+            self._last_payload.pop(job_id, None)
+
+    def _redis_client(self):
+        """Retorna o cliente Redis compartilhado ou None se indisponível."""
+        from app.config.redis_config import get_redis_session_manager
+        redis_manager = get_redis_session_manager()
+        if not redis_manager.redis_available:
+            return None
+        return redis_manager.redis_client
+
+    def _set_redis(self, job_id: str, payload: Dict[str, Any]) -> None:
+        """Armazena o estado de um job no Redis com TTL."""
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.setex(f"{self.key_prefix}{job_id}", self.job_ttl, json.dumps(payload))
+        except Exception as e:
+            logger.warning(f"Erro ao gravar job de ingestão no Redis: {str(e)}")
+
+    def _get_redis(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Busca o estado de um job no Redis."""
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            payload = client.get(f"{self.key_prefix}{job_id}")
+            return json.loads(payload) if payload else None
+        except Exception as e:
+            logger.warning(f"Erro ao ler job de ingestão do Redis: {str(e)}")
+            return None
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Retorna a ocupação da fila.
+
+        Retorna:
+            Dicionário com jobs aguardando, em andamento e retidos na memória
+        """
+        running = sum(1 for job in self.jobs.values() if job.started_at is not None and not job.finished)
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "running": running,
+            "tracked": len(self.jobs)
+        }
+
+# Instância global da fila de ingestão
+ingestion_queue = IngestionQueue(
+    INGESTION_WORKERS,
+    INGESTION_QUEUE_SIZE,
+    INGESTION_JOB_TTL,
+    INGESTION_PROGRESS_INTERVAL
+)
@@ -0,0 +1,3 @@
+"""
+Ferramentas de linha de comando para manutenção do Assistente AgiFinance.
+"""
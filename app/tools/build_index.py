@@ -0,0 +1,288 @@
+"""
+Constrói o diretório ``faiss_index`` a partir de uma árvore de documentos, sem o servidor.
+
+Usado na construção da imagem, para que o contêiner já comece com o índice
+pronto. Cada documento passa pelo mesmo caminho de um upload: é copiado
+para ``uploads``, dividido por ``process_document``, enviado ao pipeline de
+embeddings e gravado pelo escritor do índice; vários documentos são
+processados ao mesmo tempo.
+
+A construção pode ser retomada: o manifesto de construção
+(``build_manifest.json``, no diretório do índice) é regravado após cada
+documento concluído, e uma nova execução só processa arquivos novos ou
+alterados (pelo hash SHA-256). Documentos que saíram da árvore são removidos
+do índice. Ao final, todos os segmentos são unidos em um único segmento do
+tipo configurado e o índice é carregado uma vez no modo mapeado, o que
+também grava o arquivo de vetores usado pela carga mapeada de índices planos.
+
+Uso:
+    python -m app.tools.build_index docs/
+    python -m app.tools.build_index docs/ --workers 4 --index-type hnsw
+    python -m app.tools.build_index docs/ --fresh
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.settings import (
+    FAISS_INDEX_PATH,
+    FAISS_INDEX_TYPE,
+    FAISS_VECTOR_STORAGE,
+    EMBEDDINGS_MODEL,
+    INGESTION_WORKERS,
+    UPLOADS_DIR,
+    UPLOAD_CHUNK_BYTES,
+    logger
+)
+from app.services.document_service import index_document, delete_document
+from app.utils.index_factory import INDEX_TYPES, STORAGE_TYPES, describe_index
+from app.utils.index_writer import index_writer
+from app.utils.pdf_extractor import pdf_extractor
+from app.utils.segments import SegmentedIndex, segment_compactor
+from app.utils.upload_registry import upload_registry
+from app.utils.vector_db import get_vector_db
+
+BUILD_MANIFEST_FILE = "build_manifest.json"
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+
+def find_documents(root: str) -> List[str]:
+    """
+    Lista os documentos suportados de uma árvore de diretórios, em ordem.
+
+    Arquivos e diretórios ocultos são ignorados.
+
+    Args:
+        root: Diretório de origem
+
+    Retorna:
+        Caminhos dos documentos
+    """
+    paths = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith("."))
+        for file_name in sorted(file_names):
+            if not file_name.startswith(".") and os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.join(dir_path, file_name))
+    return paths
+
+def hash_file(file_path: str, chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> Tuple[str, int]:
+    """
+    Calcula o hash SHA-256 de um arquivo, bloco a bloco.
+
+    Args:
+        file_path: Caminho do arquivo
+        chunk_bytes: Tamanho de cada bloco lido
+
+    Retorna:
+        Tupla (hash em hexadecimal, tamanho em bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def read_build_manifest(folder_path: str) -> Optional[Dict[str, Any]]:
+    """Lê o manifesto de construção do diretório do índice, se existir."""
+    path = os.path.join(folder_path, BUILD_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_build_manifest(folder_path: str, manifest: Dict[str, Any]) -> None:
+    """Escreve o manifesto de construção de forma atômica (arquivo temporário + ``os.replace``)."""
+    os.makedirs(folder_path, exist_ok=True)
+    path = os.path.join(folder_path, BUILD_MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _finalize_index(index_type: str, storage: str) -> Dict[str, Any]:
+    """
+    Une todos os segmentos em um só e verifica a carga mapeada; executado apenas pelo escritor do índice.
+
+    Retorna:
+        Resumo do índice final (geração, vetores, segmentos e tipo)
+    """
+    store = get_vector_db()
+    if store is not None and store.segments:
+        store.merge(store.segments, index_type, storage)
+        # Nenhuma busca usa os segmentos antigos: não há prazo de carência na construção
+        store.collect_garbage(grace_seconds=0)
+
+    loaded = SegmentedIndex.load(FAISS_INDEX_PATH, mmap=True)
+    if loaded is None or not loaded.segments:
+        return {"generation": loaded.generation if loaded else 0, "vectors": 0, "segments": 0, "index": None}
+    return {
+        "generation": loaded.generation,
+        "vectors": sum(segment.live for segment in loaded.segments),
+        "segments": len(loaded.segments),
+        "index": describe_index(loaded.segments[0].index)
+    }
+
+async def build_index_dir(
+    source_dir: str,
+    workers: int = INGESTION_WORKERS,
+    index_type: str = FAISS_INDEX_TYPE,
+    storage: str = FAISS_VECTOR_STORAGE,
+    fresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Indexa todos os documentos de uma árvore de diretórios em ``FAISS_INDEX_PATH``.
+
+    Os documentos são copiados para ``UPLOADS_DIR`` (que não tem
+    subdiretórios: nomes repetidos em pastas diferentes são ignorados com
+    um aviso) e arquivos com o mesmo conteúdo são indexados uma única vez,
+    como nos uploads.
+
+    Args:
+        source_dir: Diretório com os documentos
+        workers: Número de documentos processados ao mesmo tempo
+        index_type: Tipo do índice final
+        storage: Formato de armazenamento dos vetores do índice final
+        fresh: Se o índice existente deve ser apagado em vez de retomado
+
+    Retorna:
+        Manifesto de construção
+
+    Levanta:
+        FileNotFoundError: Se o diretório de origem não existir
+        ValueError: Se o índice existente foi construído com outro modelo de embeddings
+        RuntimeError: Se algum documento falhar (os demais ficam no checkpoint)
+    """
+    if not os.path.isdir(source_dir):
+        raise FileNotFoundError(f"Diretório de documentos não encontrado: {source_dir}")
+
+    start = time.perf_counter()
+    if fresh:
+        shutil.rmtree(FAISS_INDEX_PATH, ignore_errors=True)
+
+    manifest = read_build_manifest(FAISS_INDEX_PATH)
+    if manifest is None:
+        manifest = {"embeddings_model": EMBEDDINGS_MODEL, "complete": False, "documents": {}}
+    elif manifest["embeddings_model"] != EMBEDDINGS_MODEL:
+        raise ValueError(
+            f"Índice existente construído com {manifest['embeddings_model']}, não {EMBEDDINGS_MODEL}; use --fresh"
+        )
+    documents: Dict[str, Dict[str, Any]] = manifest["documents"]
+
+    # Plano: nome em uploads -> (origem, hash, tamanho)
+    planned: Dict[str, Tuple[str, str, int]] = {}
+    by_hash: Dict[str, str] = {}
+    duplicates: Dict[str, str] = {}
+    for path in find_documents(source_dir):
+        name = os.path.basename(path)
+        if name in planned or name in duplicates:
+            logger.warning(f"Nome repetido ignorado: {path}")
+            continue
+        sha256, size = await asyncio.to_thread(hash_file, path)
+        owner = by_hash.get(sha256)
+        if owner is not None and owner != name:
+            duplicates[name] = owner
+            continue
+        by_hash[sha256] = name
+        planned[name] = (path, sha256, size)
+
+    pending = {
+        name: plan for name, plan in planned.items()
+        if documents.get(name, {}).get("sha256") != plan[1] or not os.path.isfile(os.path.join(UPLOADS_DIR, name))
+    }
+    removed = [name for name in documents if name not in planned]
+    if manifest["complete"] and not pending and not removed:
+        logger.info(f"Índice já atualizado: {len(documents)} documentos em {FAISS_INDEX_PATH}")
+        return manifest
+
+    logger.info(
+        f"Construindo índice: {len(planned)} documentos, {len(pending)} a indexar, "
+        f"{len(planned) - len(pending)} já no checkpoint, {len(removed)} a remover, {len(duplicates)} duplicados"
+    )
+    manifest["complete"] = False
+    manifest["duplicates"] = duplicates
+    write_build_manifest(FAISS_INDEX_PATH, manifest)
+
+    # A união final substitui a compactação automática durante a construção
+    segment_compactor.enabled = False
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+    for name in removed:
+        await delete_document(name)
+        documents.pop(name)
+    write_build_manifest(FAISS_INDEX_PATH, manifest)
+
+    semaphore = asyncio.Semaphore(max(workers, 1))
+    manifest_lock = asyncio.Lock()
+    failed: Dict[str, str] = {}
+
+    async def build(name: str, source_path: str, sha256: str, size: int) -> None:
+        async with semaphore:
+            file_path = os.path.join(UPLOADS_DIR, name)
+            try:
+                await asyncio.to_thread(shutil.copyfile, source_path, file_path)
+                upload_time = datetime.datetime.now().isoformat()
+                chunks = await index_document(file_path, name, upload_time)
+                await asyncio.to_thread(upload_registry.record, name, sha256, size)
+            except Exception as e:
+                logger.error(f"Erro ao indexar {source_path}: {str(e)}")
+                failed[name] = str(e)
+                return
+
+        async with manifest_lock:
+            documents[name] = {
+                "source": os.path.relpath(source_path, source_dir),
+                "sha256": sha256,
+                "size": size,
+                "chunks": chunks,
+                "indexed_at": upload_time
+            }
+            await asyncio.to_thread(write_build_manifest, FAISS_INDEX_PATH, manifest)
+        logger.info(f"Checkpoint: {len(documents)}/{len(planned)} documentos indexados")
+
+    await asyncio.gather(*(build(name, *plan) for name, plan in pending.items()))
+
+    if failed:
+        manifest["failed"] = failed
+        write_build_manifest(FAISS_INDEX_PATH, manifest)
+        raise RuntimeError(f"{len(failed)} documentos falharam; execute novamente para retomar: {sorted(failed)}")
+
+    manifest.pop("failed", None)
+    manifest["index"] = await index_writer.submit(_finalize_index, index_type, storage)
+    manifest["complete"] = True
+    manifest["built_at"] = datetime.datetime.now().isoformat()
+    write_build_manifest(FAISS_INDEX_PATH, manifest)
+
+    logger.info(
+        f"Índice construído em {time.perf_counter() - start:.1f}s: {len(documents)} documentos, "
+        f"{manifest['index']['vectors']} vetores ({manifest['index']['index']})"
+    )
+    return manifest
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Constrói o índice FAISS a partir de um diretório de documentos")
+    parser.add_argument("source_dir", help="Diretório com os documentos (.pdf, .txt, .md), percorrido recursivamente")
+    parser.add_argument("--workers", type=int, default=INGESTION_WORKERS, help="Documentos processados ao mesmo tempo")
+    parser.add_argument("--index-type", default=FAISS_INDEX_TYPE, choices=INDEX_TYPES, help="Tipo do índice final")
+    parser.add_argument("--storage", default=FAISS_VECTOR_STORAGE, choices=STORAGE_TYPES, help="Armazenamento dos vetores")
+    parser.add_argument("--fresh", action="store_true", help="Apaga o índice existente em vez de retomar a construção")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(build_index_dir(args.source_dir, args.workers, args.index_type, args.storage, fresh=args.fresh))
+    finally:
+        upload_registry.close()
+        pdf_extractor.shutdown()
+        index_writer.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Reconstrói um diretório ``faiss_index`` existente com outro tipo de índice.
+
+Todos os segmentos são unidos em um único segmento do novo tipo. Os vetores
+mantêm seus IDs globais, então o docstore e o índice de fontes continuam
+válidos sem chamar a API de embeddings. Quando existe o arquivo de vetores em
+precisão total de um segmento, ele é usado como origem.
+
+Uso:
+    python -m app.tools.rebuild_index --index-type hnsw
+    python -m app.tools.rebuild_index --index-type flat --storage fp16
+    python -m app.tools.rebuild_index --index-type ivf_pq --path /caminho/faiss_index
+"""
+import time
+import shutil
+import argparse
+from app.config.settings import FAISS_INDEX_PATH, FAISS_INDEX_TYPE, FAISS_VECTOR_STORAGE, logger
+from app.utils.index_factory import INDEX_TYPES, STORAGE_TYPES, describe_index
+from app.utils.segments import SegmentedIndex
+
+def rebuild_index_dir(path: str, index_type: str, storage: str = FAISS_VECTOR_STORAGE, keep_backup: bool = True) -> None:
+    """
+    Reconstrói os segmentos de um diretório de índice em um único segmento.
+
+    O novo segmento é escrito ao lado dos atuais e entra no manifesto com uma
+    troca atômica, para que uma falha no meio não corrompa o índice existente.
+
+    Args:
+        path: Diretório do índice vetorial
+        index_type: Tipo do novo índice
+        storage: Formato de armazenamento dos vetores do novo índice
+        keep_backup: Se uma cópia do diretório anterior deve ser mantida com sufixo ``.bak``
+
+    Levanta:
+        FileNotFoundError: Se o diretório não contiver um índice
+    """
+    start = time.perf_counter()
+    store = SegmentedIndex.load(path, mmap=False)
+    if store is None or not store.segments:
+        raise FileNotFoundError(f"Índice não encontrado em {path}")
+    logger.info(f"Índice atual: {len(store.segments)} segmentos, {store.ntotal} vetores")
+
+    if keep_backup:
+        backup_path = f"{path}.bak"
+        shutil.rmtree(backup_path, ignore_errors=True)
+        shutil.copytree(path, backup_path)
+
+    # Os segmentos antigos são removidos após o prazo de carência, na próxima carga ou compactação
+    merged = store.merge(store.segments, index_type, storage)
+
+    logger.info(f"Índice reconstruído em {time.perf_counter() - start:.1f}s: {describe_index(merged.index)}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconstrói o índice FAISS com outro tipo de índice")
+    parser.add_argument("--path", default=FAISS_INDEX_PATH, help="Diretório do índice (padrão: FAISS_INDEX_PATH)")
+    parser.add_argument("--index-type", default=FAISS_INDEX_TYPE, choices=INDEX_TYPES, help="Tipo do novo índice")
+    parser.add_argument("--storage", default=FAISS_VECTOR_STORAGE, choices=STORAGE_TYPES, help="Armazenamento dos vetores")
+    parser.add_argument("--no-backup", action="store_true", help="Não mantém cópia do diretório anterior")
+    args = parser.parse_args()
+
+    rebuild_index_dir(args.path, args.index_type, args.storage, keep_backup=not args.no_backup)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Cache semântico de respostas.
+
+Perguntas parecidas feitas sobre o mesmo contexto recebem a resposta já
+gerada, sem nova chamada ao modelo de chat. As respostas são agrupadas pelo
+contexto que as gerou: a geração do conteúdo do índice em que a busca foi
+feita e os IDs dos chunks recuperados (``metadata["index_generation"]`` e
+``metadata["chunk_id"]``, preenchidos pela busca). A compactação não muda a
+geração do conteúdo, então não esvazia o cache. Dentro de um contexto, a pergunta nova reutiliza
+a resposta de uma pergunta anterior quando a similaridade de cosseno entre os
+embeddings atinge o limiar configurado.
+
+As entradas ficam no Redis, compartilhadas entre os workers, com TTL e um
+número máximo de contextos (os usados há mais tempo são removidos). Sem
+Redis, o cache usa a memória do processo com os mesmos limites.
+"""
+import re
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from langchain.docstore.document import Document
+from app.config.settings import (
+    CHAT_MODEL,
+    EMBEDDINGS_MODEL,
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PER_CONTEXT,
+    logger
+)
+
+# Perguntas com estas expressões retomam a conversa e não fazem sentido sozinhas
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*e\s+(o|a|os|as|se|sobre|quanto)\b|"
+    r"\b(isso|isto|disso|disto|nisso|nisto|aquilo|daquilo|ele|ela|eles|elas|dele|dela|deles|delas|"
+    r"esse|essa|esses|essas|desse|dessa|nesse|nessa|acima|anterior|anteriormente|mencionad[oa]s?|"
+    r"mais detalhes|explique melhor|continue|continua)\b",
+    re.IGNORECASE
+)
+
+# Perguntas com até este número de palavras dependem do histórico quando há conversa anterior
+FOLLOW_UP_MAX_WORDS = 3
+
+def depends_on_history(question: str, chat_history: List[Dict[str, Any]]) -> bool:
+    """
+    Indica se o histórico de chat muda o sentido da pergunta.
+
+    Só há dependência quando o assistente já respondeu algo na conversa e a
+    pergunta retoma essa resposta (pronomes, "e sobre...", "mais detalhes")
+    ou é curta demais para ser entendida sozinha.
+
+    Args:
+        question: Pergunta do usuário
+        chat_history: Histórico de chat (pode já incluir a própria pergunta)
+
+    Retorna:
+        True se a resposta não deve vir do cache nem ir para ele
+    """
+    if not any(msg.get("role") == "assistant" and msg.get("content") for msg in chat_history):
+        return False
+    return len(question.split()) <= FOLLOW_UP_MAX_WORDS or FOLLOW_UP_PATTERN.search(question) is not None
+
+def normalize_vector(vector: np.ndarray) -> np.ndarray:
+    """Retorna o vetor como float32 com norma 1 (o produto interno vira similaridade de cosseno)."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+class AnswerLookup(NamedTuple):
+    """Resultado de uma consulta ao cache de respostas."""
+    scope: str  # Chave do contexto (modelo, geração do índice e chunks recuperados)
+    embedding: np.ndarray  # Embedding normalizado da pergunta
+    answer: Optional[str]  # Resposta reutilizada ou None se não houve acerto
+    similarity: float = 0.0
+
+class AnswerCache:
+    """Respostas agrupadas por contexto e encontradas por similaridade da pergunta."""
+
+    def __init__(self, enabled: bool, threshold: float, ttl_seconds: int, max_entries: int, per_context: int, model_name: str):
+        """
+        Inicializa o cache.
+
+        Args:
+            enabled: Se o cache deve ser usado
+            threshold: Similaridade de cosseno mínima para reutilizar uma resposta
+            ttl_seconds: Tempo de vida das respostas em segundos
+            max_entries: Número máximo de contextos mantidos (LRU)
+            per_context: Número máximo de perguntas guardadas por contexto
+            model_name: Modelos de chat e de embeddings (fazem parte da chave)
+        """
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.per_context = per_context
+        self.model_name = model_name
+        self.key_prefix = "answer_cache:"
+        self.lru_key = "answer_cache_lru"
+        self.entries: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "stored": 0, "skipped": 0, "evictions": 0}
+
+    def scope_for(self, docs: List[Document]) -> Optional[str]:
+        """
+        Gera a chave do contexto de uma resposta.
+
+        Args:
+            docs: Documentos recuperados para a pergunta (de uma mesma geração do índice)
+
+        Retorna:
+            Chave do contexto ou None se algum documento não tiver ``chunk_id``
+            e ``index_generation``
+        """
+        chunk_ids = [doc.metadata.get("chunk_id") for doc in docs]
+        generations = {doc.metadata.get("index_generation") for doc in docs}
+        if not chunk_ids or any(not isinstance(chunk_id, int) for chunk_id in chunk_ids):
+            return None
+        if len(generations) != 1 or not isinstance(next(iter(generations)), int):
+            return None
+        generation = generations.pop()
+        key = f"{self.model_name}:{generation}:{','.join(str(chunk_id) for chunk_id in sorted(chunk_ids))}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _redis_client(self):
+        """Retorna o cliente Redis compartilhado ou None se indisponível."""
+        from app.config.redis_config import get_redis_session_manager
+        redis_manager = get_redis_session_manager()
+        if not redis_manager.redis_available:
+            return None
+        return redis_manager.redis_client
+
+    def _get_entries(self, scope: str) -> List[Dict[str, Any]]:
+        """Lê as perguntas guardadas de um contexto (Redis ou memória) e renova sua posição no LRU."""
+        client = self._redis_client()
+        if client is None:
+            entries = self.entries.get(scope, [])
+            if entries:
+                self.entries.move_to_end(scope)
+            return entries
+
+        try:
+            payloads = client.lrange(f"{self.key_prefix}{scope}", 0, -1)
+            if payloads:
+                client.zadd(self.lru_key, {scope: time.time()})
+            entries = []
+            for payload in payloads:
+                entry = json.loads(payload)
+                entry["embedding"] = np.frombuffer(base64.b64decode(entry["embedding"]), dtype=np.float32)
+                entries.append(entry)
+            return entries
+        except Exception as e:
+            logger.warning(f"Erro ao ler respostas do Redis: {str(e)}")
+            return []
+
+    def _add_entry(self, scope: str, entry: Dict[str, Any]) -> None:
+        """Guarda uma pergunta em um contexto, removendo os contextos usados há mais tempo."""
+        client = self._redis_client()
+        if client is None:
+            entries = self.entries.setdefault(scope, [])
+            entries.insert(0, entry)
+            del entries[self.per_context:]
+            self.entries.move_to_end(scope)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            return
+
+        try:
+            key = f"{self.key_prefix}{scope}"
+            payload = json.dumps({
+                **entry,
+                "embedding": base64.b64encode(entry["embedding"].tobytes()).decode("ascii")
+            }, ensure_ascii=False)
+            now = time.time()
+            pipe = client.pipeline()
+            pipe.lpush(key, payload)
+            pipe.ltrim(key, 0, self.per_context - 1)
+            pipe.expire(key, self.ttl)
+            pipe.zadd(self.lru_key, {scope: now})
+            # Contextos sem uso há mais de um TTL já expiraram no Redis
+            pipe.zremrangebyscore(self.lru_key, "-inf", now - self.ttl)
+            pipe.zcard(self.lru_key)
+            count = pipe.execute()[-1]
+            if count > self.max_entries:
+                evicted = client.zpopmin(self.lru_key, count - self.max_entries)
+                if evicted:
+                    client.delete(*(f"{self.key_prefix}{member}" for member, _ in evicted))
+                    self.stats["evictions"] += len(evicted)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar resposta no Redis: {str(e)}")
+
+    def _best_match(self, embedding: np.ndarray, entries: List[Dict[str, Any]]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Retorna a pergunta guardada mais parecida, se atingir o limiar e não tiver expirado."""
+        oldest = time.time() - self.ttl
+        best = None
+        for entry in entries:
+            if entry["created"] < oldest or entry["embedding"].shape != embedding.shape:
+                continue
+            similarity = float(np.dot(embedding, entry["embedding"]))
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, entry)
+        return best
+
+    async def lookup(self, embedding: np.ndarray, docs: List[Document]) -> Optional[AnswerLookup]:
+        """
+        Procura uma resposta para uma pergunta parecida feita sobre o mesmo contexto.
+
+        Args:
+            embedding: Embedding da pergunta
+            docs: Documentos recuperados para a pergunta
+
+        Retorna:
+            Resultado da consulta (``answer`` é None sem acerto) ou None se o
+            cache estiver desativado ou o contexto não tiver IDs de chunks
+        """
+        if not self.enabled:
+            return None
+        scope = self.scope_for(docs)
+        if scope is None:
+            return None
+
+        vector = normalize_vector(embedding)
+        # A camada Redis usa o cliente síncrono, então roda fora do event loop
+        match = self._best_match(vector, await asyncio.to_thread(self._get_entries, scope))
+        if match is None:
+            self.stats["misses"] += 1
+            return AnswerLookup(scope, vector, None)
+
+        self.stats["hits"] += 1
+        similarity, entry = match
+        return AnswerLookup(scope, vector, entry["answer"], similarity)
+
+    async def store(self, lookup: AnswerLookup, question: str, answer: str) -> None:
+        """
+        Guarda a resposta gerada para uma pergunta.
+
+        Args:
+            lookup: Resultado da consulta feita antes da geração
+            question: Pergunta do usuário
+            answer: Resposta completa
+        """
+        if not answer:
+            return
+        entry = {"question": question, "answer": answer, "embedding": lookup.embedding, "created": time.time()}
+        await asyncio.to_thread(self._add_entry, lookup.scope, entry)
+        self.stats["stored"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores de acertos e falhas do cache.
+
+        Retorna:
+            Dicionário com estatísticas do cache
+        """
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "local_contexts": len(self.entries),
+            "hit_ratio": round(self.stats["hits"] / total, 4) if total else 0.0
+        }
+
+    def clear(self) -> None:
+        """Limpa a camada local e zera os contadores."""
+        self.entries.clear()
+        for name in self.stats:
+            self.stats[name] = 0
+
+# Instância global do cache de respostas
+answer_cache = AnswerCache(
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PER_CONTEXT,
+    f"{CHAT_MODEL}:{EMBEDDINGS_MODEL}"
+)
+
+async def lookup_answer(question: str, docs: List[Document], chat_history: List[Dict[str, Any]] = []) -> Optional[AnswerLookup]:
+    """
+    Consulta o cache de respostas para uma pergunta e seus documentos recuperados.
+
+    O embedding da pergunta vem do cache de embeddings (a recuperação acabou
+    de calculá-lo). Falhas no cache nunca impedem a geração da resposta.
+
+    Args:
+        question: Pergunta do usuário
+        docs: Documentos recuperados para a pergunta
+        chat_history: Histórico de chat
+
+    Retorna:
+        Resultado da consulta ou None se o cache não se aplica à pergunta
+    """
+    if not answer_cache.enabled or not docs or any("chunk_id" not in doc.metadata for doc in docs):
+        return None
+    if depends_on_history(question, chat_history):
+        answer_cache.stats["skipped"] += 1
+        return None
+
+    from app.utils.vector_db import embed_question
+    try:
+        return await answer_cache.lookup(await embed_question(question), docs)
+    except Exception as e:
+        logger.warning(f"Erro ao consultar o cache de respostas: {str(e)}")
+        return None
@@ -0,0 +1,106 @@
+"""
+Limite de chamadas ao modelo de chat em andamento em cada worker.
+
+Todas as completions (respostas, lotes e síntese, com ou sem streaming)
+passam por um semáforo, para que um pico de perguntas não abra conexões
+sem limite com a API, e cada chamada tem um prazo máximo.
+"""
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, TypeVar
+from app.config.settings import CHAT_CONCURRENCY, CHAT_TIMEOUT, logger
+
+T = TypeVar("T")
+
+class ChatTimeoutError(asyncio.TimeoutError):
+    """O modelo de chat não respondeu dentro do prazo."""
+
+class ChatLimiter:
+    """Semáforo de completions com prazo por chamada e estatísticas de uso."""
+
+    def __init__(self, concurrency: int, timeout: float):
+        """
+        Inicializa o limitador.
+
+        Args:
+            concurrency: Número máximo de completions em andamento
+            timeout: Prazo de cada chamada em segundos (0 = sem prazo)
+        """
+        self.concurrency = max(concurrency, 1)
+        self.timeout = timeout if timeout > 0 else None
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.in_flight = 0
+        self.stats: Dict[str, float] = {"completed": 0, "failed": 0, "timeouts": 0, "max_in_flight": 0, "max_wait_seconds": 0.0}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Ocupa uma vaga durante uma completion (inclusive todo o streaming da resposta).
+
+        Espera enquanto ``concurrency`` completions estiverem em andamento.
+        """
+        queued_at = time.perf_counter()
+        async with self.semaphore:
+            wait = time.perf_counter() - queued_at
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], round(wait, 3))
+            if wait > 1:
+                logger.info(f"Chamada ao modelo de chat aguardou {wait:.1f}s por uma vaga ({self.concurrency} em andamento)")
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+            try:
+                yield
+            except BaseException:
+                self.stats["failed"] += 1
+                raise
+            else:
+                self.stats["completed"] += 1
+            finally:
+                self.in_flight -= 1
+
+    async def wait(self, awaitable: Awaitable[T]) -> T:
+        """
+        Aguarda uma etapa da chamada (resposta completa ou próximo trecho) dentro do prazo.
+
+        Args:
+            awaitable: Chamada ao cliente do modelo
+
+        Retorna:
+            Resultado da chamada
+
+        Levanta:
+            ChatTimeoutError: Se o prazo se esgotar (a chamada é cancelada)
+        """
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise ChatTimeoutError(f"O modelo de chat não respondeu em {self.timeout:.0f}s")
+
+    async def run(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """
+        Executa uma completion sem streaming: ocupa uma vaga e aplica o prazo.
+
+        Args:
+            fn: Função assíncrona do cliente do modelo (por exemplo, ``chat_model.ainvoke``)
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Retorna:
+            Resultado da chamada
+        """
+        async with self.slot():
+            return await self.wait(fn(*args, **kwargs))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas do limitador.
+
+        Retorna:
+            Dicionário com limite, completions em andamento, concluídas, com erro,
+            estouros de prazo, pico de concorrência e maior espera por vaga
+        """
+        return {"concurrency": self.concurrency, "in_flight": self.in_flight, **self.stats}
+
+# Instância global do limitador de chamadas ao modelo de chat
+chat_limiter = ChatLimiter(CHAT_CONCURRENCY, CHAT_TIMEOUT)
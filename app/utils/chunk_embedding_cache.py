@@ -0,0 +1,169 @@
+"""
+Cache de embeddings de chunks endereçado por conteúdo, persistido em SQLite.
+
+A chave é o hash SHA-256 do modelo de embeddings mais o texto do chunk, então
+reindexar ou reenviar um documento só envia à API os chunks que mudaram. O
+pipeline de embeddings (``EmbeddingPipeline.embed``) consulta o cache antes de
+cada lote e grava o que calculou.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from app.config.settings import (
+    EMBEDDINGS_MODEL,
+    CHUNK_EMBEDDING_CACHE_PATH,
+    CHUNK_EMBEDDING_CACHE_ENABLED,
+    logger
+)
+
+# Limite de parâmetros por consulta do SQLite em versões antigas
+SQLITE_MAX_VARIABLES = 900
+
+class ChunkEmbeddingCache:
+    """Armazena embeddings de chunks em disco, indexados pelo hash do conteúdo."""
+
+    def __init__(self, path: str, model_name: str, enabled: bool = True):
+        """
+        Inicializa o cache.
+
+        Args:
+            path: Caminho do arquivo SQLite
+            model_name: Nome do modelo de embeddings (faz parte da chave)
+            enabled: Se o cache deve ser usado
+        """
+        self.path = path
+        self.model_name = model_name
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.connection: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre (e cria, se necessário) o banco SQLite na primeira utilização."""
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+                "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+        return self.connection
+
+    def _make_key(self, text: str) -> str:
+        """Gera a chave de cache para o texto de um chunk."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Busca vários embeddings pelas chaves, em consultas de tamanho limitado."""
+        found: Dict[str, List[float]] = {}
+        connection = self._connect()
+        for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _set_many(self, entries: Dict[str, List[float]]) -> None:
+        """Grava vários embeddings em uma única transação."""
+        now = time.time()
+        rows = [
+            (key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in entries.items()
+        ]
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (key, dim, vector, created_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def lookup(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Busca os embeddings dos textos no cache.
+
+        Args:
+            texts: Textos dos chunks
+
+        Retorna:
+            Embedding de cada texto, ou None para os ausentes do cache
+        """
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+
+        keys = [self._make_key(text) for text in texts]
+        try:
+            with self.lock:
+                cached = self._get_many(list(set(keys)))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Cache de embeddings de chunks indisponível: {str(e)}")
+            return [None] * len(texts)
+        return [cached.get(key) for key in keys]
+
+    def store(self, texts: List[str], embeddings: List[List[float]]) -> None:
+        """
+        Grava os embeddings calculados para os textos.
+
+        Args:
+            texts: Textos dos chunks
+            embeddings: Embeddings, na ordem dos textos
+        """
+        if not self.enabled or not texts:
+            return
+        try:
+            with self.lock:
+                self._set_many({self._make_key(text): embedding for text, embedding in zip(texts, embeddings)})
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Erro ao gravar embeddings de chunks no cache: {str(e)}")
+
+    def record(self, total: int, computed: int) -> None:
+        """
+        Contabiliza acertos e faltas de um lote.
+
+        Args:
+            total: Número de textos do lote
+            computed: Número de textos enviados à API
+        """
+        if not self.enabled or not total:
+            return
+        hits = total - computed
+        self.stats["hits"] += hits
+        self.stats["misses"] += computed
+        logger.info(
+            f"Embeddings de chunks: {hits} do cache, {computed} calculados "
+            f"(taxa de acerto {hits / total:.1%})"
+        )
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Retorna as estatísticas acumuladas do cache.
+
+        Retorna:
+            Dicionário com acertos, falhas e taxa de acerto
+        """
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / total, 4) if total else 0.0
+        }
+
+    def close(self) -> None:
+        """Fecha a conexão com o banco SQLite."""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+# Instância global do cache de embeddings de chunks
+chunk_embedding_cache = ChunkEmbeddingCache(
+    CHUNK_EMBEDDING_CACHE_PATH,
+    EMBEDDINGS_MODEL,
+    CHUNK_EMBEDDING_CACHE_ENABLED
+)
@@ -0,0 +1,139 @@
+"""
+Armazenamento em disco do texto e dos metadados dos chunks de um segmento.
+
+Substitui o ``InMemoryDocstore`` do LangChain: os registros ficam em um arquivo
+JSON Lines (``chunks.jsonl``) e um arquivo de offsets (``chunks.idx.npy``),
+ambos mapeados em memória. Só os ``top_k`` documentos de cada consulta são
+lidos e convertidos em ``Document``; a memória do processo cresce apenas com
+os offsets, não com o texto.
+"""
+import os
+import json
+import mmap
+import pickle
+import numpy as np
+from typing import Any, Iterable, Optional, Tuple
+from langchain.docstore.document import Document
+
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunks.idx.npy"
+
+class ChunkStore:
+    """Registros imutáveis (ID no docstore, texto e metadados) indexados pela posição do vetor."""
+
+    def __init__(self, folder_path: str):
+        """
+        Abre o armazenamento de chunks de um diretório.
+
+        Args:
+            folder_path: Diretório do segmento
+        """
+        self.path = os.path.join(folder_path, CHUNKS_FILE)
+        self.offsets = np.load(os.path.join(folder_path, OFFSETS_FILE), mmap_mode="r")
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # Arquivos vazios não podem ser mapeados
+        self._data: Any = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def open(cls, folder_path: str) -> Optional["ChunkStore"]:
+        """
+        Abre o armazenamento de chunks, se existir.
+
+        Args:
+            folder_path: Diretório do segmento
+
+        Retorna:
+            ChunkStore ou None se o diretório não tiver os arquivos de chunks
+        """
+        if not os.path.exists(os.path.join(folder_path, OFFSETS_FILE)):
+            return None
+        return cls(folder_path)
+
+    @staticmethod
+    def write(folder_path: str, records: Iterable[Tuple[str, Document]]) -> int:
+        """
+        Grava os registros de um segmento, na ordem das posições dos vetores.
+
+        Args:
+            folder_path: Diretório do segmento
+            records: Pares (ID no docstore, documento)
+
+        Retorna:
+            Número de registros gravados
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        offsets = [0]
+        with open(os.path.join(folder_path, CHUNKS_FILE), "wb") as f:
+            for docstore_id, doc in records:
+                line = json.dumps(
+                    {"id": docstore_id, "page_content": doc.page_content, "metadata": doc.metadata},
+                    ensure_ascii=False,
+                    default=str
+                ).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(os.path.join(folder_path, OFFSETS_FILE), np.array(offsets, dtype=np.int64))
+        return len(offsets) - 1
+
+    @classmethod
+    def from_pickle(cls, folder_path: str, pickle_path: str) -> "ChunkStore":
+        """
+        Converte um ``index.pkl`` do LangChain (docstore em memória) em um ChunkStore.
+
+        Args:
+            folder_path: Diretório do segmento
+            pickle_path: Caminho do ``index.pkl``
+
+        Retorna:
+            ChunkStore gravado no diretório
+        """
+        with open(pickle_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+        def records() -> Iterable[Tuple[str, Document]]:
+            for position in range(len(index_to_docstore_id)):
+                docstore_id = index_to_docstore_id[position]
+                doc = docstore.search(docstore_id)
+                if isinstance(doc, str):
+                    # O docstore retorna uma mensagem de erro quando o ID não existe
+                    doc = Document(page_content="", metadata={})
+                yield docstore_id, doc
+
+        cls.write(folder_path, records())
+        return cls(folder_path)
+
+    def record(self, position: int) -> Tuple[str, Document]:
+        """
+        Lê o registro de uma posição.
+
+        Args:
+            position: Posição local do vetor
+
+        Retorna:
+            Tupla (ID no docstore, documento)
+        """
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        data = json.loads(self._data[start:end])
+        return data["id"], Document(page_content=data["page_content"], metadata=data["metadata"])
+
+    def get(self, position: int) -> Document:
+        """
+        Lê o documento de uma posição.
+
+        Args:
+            position: Posição local do vetor
+
+        Retorna:
+            Documento com texto e metadados
+        """
+        return self.record(position)[1]
+
+    def close(self) -> None:
+        """Libera o mapeamento e o arquivo."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
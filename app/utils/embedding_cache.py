@@ -0,0 +1,181 @@
+"""
+Cache de embeddings de perguntas com camada local (LRU/TTL) e camada compartilhada no Redis.
+"""
+import re
+import time
+import base64
+import asyncio
+import hashlib
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config.settings import (
+    EMBEDDINGS_MODEL,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    QUERY_EMBEDDING_REDIS_TTL,
+    QUERY_EMBEDDING_CACHE_REDIS,
+    logger
+)
+
+def normalize_question(question: str) -> str:
+    """
+    Normaliza uma pergunta para uso como chave de cache.
+
+    Args:
+        question: Pergunta do usuário
+
+    Retorna:
+        Pergunta normalizada (Unicode NFC, minúsculas, espaços colapsados)
+    """
+    normalized = unicodedata.normalize("NFC", question).lower().strip()
+    return re.sub(r"\s+", " ", normalized)
+
+class QueryEmbeddingCache:
+    """Cache de embeddings de perguntas em dois níveis: memória do processo e Redis."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, redis_ttl_seconds: int, use_redis: bool, model_name: str):
+        """
+        Inicializa o cache.
+
+        Args:
+            max_entries: Número máximo de entradas na camada local
+            ttl_seconds: Tempo de vida das entradas locais em segundos
+            redis_ttl_seconds: Tempo de vida das entradas no Redis em segundos
+            use_redis: Se a camada compartilhada no Redis deve ser usada
+            model_name: Nome do modelo de embeddings (faz parte da chave)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.redis_ttl = redis_ttl_seconds
+        self.use_redis = use_redis
+        self.model_name = model_name
+        self.key_prefix = "query_embedding:"
+        self.entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"local_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0}
+
+    def _make_key(self, question: str) -> str:
+        """Gera a chave de cache para uma pergunta."""
+        digest = hashlib.sha256(f"{self.model_name}:{normalize_question(question)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get_local(self, key: str) -> Optional[np.ndarray]:
+        """Busca uma entrada na camada local, removendo-a se expirada."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, vector = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return vector
+
+    def _set_local(self, key: str, vector: np.ndarray) -> None:
+        """Armazena uma entrada na camada local, removendo as menos usadas recentemente."""
+        self.entries[key] = (time.monotonic() + self.ttl, vector)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _redis_client(self):
+        """Retorna o cliente Redis compartilhado ou None se indisponível."""
+        if not self.use_redis:
+            return None
+
+        from app.config.redis_config import get_redis_session_manager
+        redis_manager = get_redis_session_manager()
+        if not redis_manager.redis_available:
+            return None
+        return redis_manager.redis_client
+
+    def _get_redis(self, key: str) -> Optional[np.ndarray]:
+        """Busca uma entrada na camada Redis."""
+        client = self._redis_client()
+        if client is None:
+            return None
+
+        try:
+            payload = client.get(f"{self.key_prefix}{key}")
+            if payload:
+                return np.frombuffer(base64.b64decode(payload), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Erro ao ler embedding do Redis: {str(e)}")
+        return None
+
+    def _set_redis(self, key: str, vector: np.ndarray) -> None:
+        """Armazena uma entrada na camada Redis com TTL."""
+        client = self._redis_client()
+        if client is None:
+            return
+
+        try:
+            payload = base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+            client.setex(f"{self.key_prefix}{key}", self.redis_ttl, payload)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar embedding no Redis: {str(e)}")
+
+    async def get_or_embed(self, question: str, embed: Callable[[str], Awaitable[List[float]]]) -> np.ndarray:
+        """
+        Retorna o embedding de uma pergunta, consultando o cache antes da API.
+
+        Args:
+            question: Pergunta do usuário
+            embed: Função assíncrona que gera o embedding em caso de falha no cache
+
+        Retorna:
+            Embedding da pergunta como array float32
+        """
+        key = self._make_key(question)
+
+        vector = self._get_local(key)
+        if vector is not None:
+            self.stats["local_hits"] += 1
+            return vector
+
+        # A camada Redis usa o cliente síncrono, então roda fora do event loop
+        vector = await asyncio.to_thread(self._get_redis, key)
+        if vector is not None:
+            self.stats["redis_hits"] += 1
+            self._set_local(key, vector)
+            return vector
+
+        self.stats["misses"] += 1
+        vector = np.array(await embed(question), dtype=np.float32)
+        self._set_local(key, vector)
+        await asyncio.to_thread(self._set_redis, key, vector)
+        return vector
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Retorna os contadores de acertos e falhas do cache.
+
+        Retorna:
+            Dicionário com estatísticas do cache
+        """
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "hit_ratio": round(hits / total, 4) if total else 0.0
+        }
+
+    def clear(self) -> None:
+        """Limpa a camada local e zera os contadores."""
+        self.entries.clear()
+        for name in self.stats:
+            self.stats[name] = 0
+
+# Instância global do cache de embeddings de perguntas
+query_embedding_cache = QueryEmbeddingCache(
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    QUERY_EMBEDDING_REDIS_TTL,
+    QUERY_EMBEDDING_CACHE_REDIS,
+    EMBEDDINGS_MODEL
+)
@@ -0,0 +1,259 @@
+"""
+Pipeline de embeddings da ingestão.
+
+Mantém várias requisições de embeddings em andamento ao mesmo tempo, dentro
+dos orçamentos de tokens e de requisições por minuto da conta. Respostas 429,
+erros 5xx e falhas de conexão são repetidos com backoff exponencial com
+jitter. Cada lote é entregue assim que fica pronto, para que a gravação no
+índice aconteça enquanto os lotes seguintes ainda estão na API.
+"""
+import time
+import random
+import asyncio
+import openai
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.config.settings import (
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_BACKOFF_BASE,
+    EMBEDDING_BACKOFF_MAX,
+    logger
+)
+from app.utils.chunk_embedding_cache import ChunkEmbeddingCache, chunk_embedding_cache
+from app.utils.token_budget import TokenBatch, count_document_tokens
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Indica se uma falha da API de embeddings é temporária.
+
+    Args:
+        error: Exceção levantada pelo cliente
+
+    Retorna:
+        True para 429, erros 5xx e falhas de conexão ou timeout
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, openai.APIConnectionError)
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Lê o cabeçalho ``Retry-After`` (em segundos) da resposta de erro, se houver."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """Baldes de tokens e de requisições por minuto, reabastecidos continuamente."""
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int):
+        """
+        Inicializa os baldes, cheios.
+
+        Args:
+            tokens_per_minute: Tokens por minuto (0 = sem limite)
+            requests_per_minute: Requisições por minuto (0 = sem limite)
+        """
+        self.limits = {"tokens": max(tokens_per_minute, 0), "requests": max(requests_per_minute, 0)}
+        self.available = {name: float(limit) for name, limit in self.limits.items()}
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Reabastece os baldes pelo tempo decorrido."""
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        for name, limit in self.limits.items():
+            if limit:
+                self.available[name] = min(limit, self.available[name] + elapsed * limit / 60)
+
+    async def acquire(self, tokens: int, requests: int = 1) -> float:
+        """
+        Aguarda até haver orçamento para uma requisição e o consome.
+
+        As chamadas são atendidas na ordem de chegada. Pedidos maiores que o
+        orçamento de um minuto esperam o balde encher.
+
+        Args:
+            tokens: Tokens da requisição
+            requests: Número de requisições
+
+        Retorna:
+            Segundos de espera
+        """
+        needed = {"tokens": tokens, "requests": requests}
+        waited = 0.0
+        async with self.lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                for name, limit in self.limits.items():
+                    if limit:
+                        deficit = min(needed[name], limit) - self.available[name]
+                        wait = max(wait, deficit * 60 / limit)
+                if wait <= 0:
+                    for name, limit in self.limits.items():
+                        if limit:
+                            self.available[name] -= min(needed[name], limit)
+                    return waited
+                await asyncio.sleep(wait)
+                waited += wait
+
+class EmbeddingPipeline:
+    """Calcula embeddings de vários lotes em paralelo, respeitando os limites da API."""
+
+    def __init__(
+        self,
+        concurrency: int,
+        tokens_per_minute: int,
+        requests_per_minute: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        cache: Optional[ChunkEmbeddingCache] = None
+    ):
+        """
+        Inicializa o pipeline.
+
+        Args:
+            concurrency: Número máximo de requisições em andamento
+            tokens_per_minute: Orçamento de tokens por minuto (0 = sem limite)
+            requests_per_minute: Orçamento de requisições por minuto (0 = sem limite)
+            max_retries: Novas tentativas por requisição após falhas temporárias
+            backoff_base: Espera base do backoff exponencial em segundos
+            backoff_max: Espera máxima entre tentativas em segundos
+            cache: Cache de embeddings de chunks (textos em cache não vão à API)
+        """
+        self.concurrency = max(concurrency, 1)
+        self.limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.stats: Dict[str, float] = {"requests": 0, "tokens": 0, "retries": 0, "rate_limited": 0, "throttled_seconds": 0.0}
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Espera antes da próxima tentativa: jitter completo, nunca menor que o ``Retry-After``."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after(error) or 0.0)
+
+    async def _request(self, texts: List[str], tokens: int, embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Envia uma requisição à API, repetindo falhas temporárias."""
+        attempt = 0
+        while True:
+            self.stats["throttled_seconds"] += await self.limiter.acquire(tokens)
+            try:
+                embeddings = await asyncio.to_thread(embed, texts)
+                self.stats["requests"] += 1
+                self.stats["tokens"] += tokens
+                return embeddings
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                if getattr(e, "status_code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(f"Embeddings: falha temporária ({str(e)[:80]}), tentativa {attempt} em {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def embed(self, batch: TokenBatch, embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        Calcula os embeddings de um lote; só os textos ausentes do cache vão à API.
+
+        Args:
+            batch: Lote de documentos com o total de tokens
+            embed: Função síncrona que calcula embeddings (por exemplo, ``embed_documents``)
+
+        Retorna:
+            Embeddings, na ordem dos documentos do lote
+        """
+        texts = [doc.page_content for doc in batch.documents]
+        if self.cache is None:
+            found: List[Optional[List[float]]] = [None] * len(texts)
+        else:
+            found = await asyncio.to_thread(self.cache.lookup, texts)
+
+        # Um documento por texto ausente, preservando a ordem de chegada
+        missing = {}
+        for doc, embedding in zip(batch.documents, found):
+            if embedding is None and doc.page_content not in missing:
+                missing[doc.page_content] = doc
+
+        if missing:
+            tokens = sum(count_document_tokens(list(missing.values())))
+            computed = dict(zip(missing, await self._request(list(missing), tokens, embed)))
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.store, list(computed), list(computed.values()))
+            found = [embedding if embedding is not None else computed[text] for text, embedding in zip(texts, found)]
+
+        if self.cache is not None:
+            self.cache.record(len(texts), len(missing))
+        return found
+
+    async def run(
+        self,
+        batches: List[TokenBatch],
+        embed: Callable[[List[str]], List[List[float]]],
+        on_result: Callable[[TokenBatch, List[List[float]]], Awaitable[None]]
+    ) -> None:
+        """
+        Calcula os embeddings de todos os lotes, com até ``concurrency`` requisições em andamento.
+
+        ``on_result`` é chamado para cada lote assim que seus embeddings ficam
+        prontos (não necessariamente na ordem), fora do limite de concorrência:
+        a gravação de um lote não impede o envio do próximo. Se um lote falhar,
+        os demais são cancelados e o erro é propagado.
+
+        Args:
+            batches: Lotes de documentos (ver ``pack_by_tokens``)
+            embed: Função síncrona que calcula embeddings
+            on_result: Corrotina chamada com (lote, embeddings)
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(batch: TokenBatch) -> None:
+            async with semaphore:
+                embeddings = await self.embed(batch, embed)
+            await on_result(batch, embeddings)
+
+        tasks = [asyncio.create_task(process(batch)) for batch in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Retorna as estatísticas acumuladas.
+
+        Retorna:
+            Dicionário com requisições, tokens enviados, novas tentativas,
+            respostas 429 e tempo de espera pelos limites
+        """
+        stats = dict(self.stats)
+        stats["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+        return stats
+
+# Instância global do pipeline de embeddings
+embedding_pipeline = EmbeddingPipeline(
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_BACKOFF_BASE,
+    EMBEDDING_BACKOFF_MAX,
+    chunk_embedding_cache
+)
@@ -0,0 +1,320 @@
+"""
+Fábrica de índices FAISS configurável (Flat, IVF-Flat, IVF-PQ, HNSW).
+
+Centraliza a construção, o treinamento, a compressão dos vetores
+(float16, int8 ou PQ) e os parâmetros de busca (``nprobe``/``efSearch``)
+dos índices usados pelo banco de dados vetorial.
+"""
+import faiss
+import numpy as np
+from typing import Any, Optional
+from app.config.settings import (
+    FAISS_INDEX_TYPE,
+    FAISS_VECTOR_STORAGE,
+    FAISS_IVF_NLIST,
+    FAISS_PQ_M,
+    FAISS_PQ_NBITS,
+    FAISS_HNSW_M,
+    FAISS_HNSW_EF_CONSTRUCTION,
+    FAISS_NPROBE,
+    FAISS_EF_SEARCH,
+    logger
+)
+from app.utils.vector_file import MmapFlatIndex, FlatSearchParams, array_key
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+STORAGE_TYPES = ("float32", "fp16", "sq8", "pq")
+
+# O k-means do FAISS recomenda pelo menos 39 pontos de treino por centróide
+MIN_POINTS_PER_CENTROID = 39
+
+def min_training_vectors(index_type: str = FAISS_INDEX_TYPE, storage: str = FAISS_VECTOR_STORAGE) -> int:
+    """
+    Número de vetores necessário para treinar o índice com os parâmetros configurados.
+
+    Args:
+        index_type: Tipo do índice
+        storage: Formato de armazenamento dos vetores
+
+    Retorna:
+        Vetores de treino exigidos pelo IVF (``FAISS_IVF_NLIST`` listas) e pelo PQ,
+        ou 0 se o índice não precisa de treino
+    """
+    required = 0
+    if index_type in ("ivf_flat", "ivf_pq"):
+        required = FAISS_IVF_NLIST * MIN_POINTS_PER_CENTROID
+    if index_type == "ivf_pq" or storage == "pq":
+        required = max(required, 2 ** FAISS_PQ_NBITS * MIN_POINTS_PER_CENTROID)
+    return required
+
+def is_lossy(index_type: str = FAISS_INDEX_TYPE, storage: str = FAISS_VECTOR_STORAGE) -> bool:
+    """
+    Indica se a configuração armazena vetores comprimidos (com perda).
+
+    Args:
+        index_type: Tipo do índice
+        storage: Formato de armazenamento dos vetores
+
+    Retorna:
+        True se os candidatos precisam ser reordenados com os vetores originais
+    """
+    return index_type == "ivf_pq" or storage != "float32"
+
+def _encoding(storage: str, dim: int, hnsw: bool = False) -> str:
+    """Retorna o sufixo de codificação dos vetores na string de fábrica."""
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Armazenamento de vetores não suportado: {storage}. Use um de {STORAGE_TYPES}")
+
+    if storage == "float32":
+        return "Flat"
+    if storage == "fp16":
+        return "SQfp16"
+    if storage == "sq8":
+        return "SQ8"
+
+    if dim % FAISS_PQ_M != 0:
+        raise ValueError(f"FAISS_PQ_M ({FAISS_PQ_M}) precisa dividir a dimensão dos vetores ({dim})")
+    # O HNSW do FAISS só aceita códigos PQ de 8 bits
+    return f"PQ{FAISS_PQ_M}" if hnsw else f"PQ{FAISS_PQ_M}x{FAISS_PQ_NBITS}"
+
+def factory_string(index_type: str, dim: int, n_train: int, storage: str = FAISS_VECTOR_STORAGE) -> str:
+    """
+    Monta a string do ``faiss.index_factory`` para o tipo de índice configurado.
+
+    Com menos vetores do que ``min_training_vectors`` (os lotes pequenos de
+    cada upload), o índice é plano: nada é treinado por lote, e o índice do
+    tipo configurado é treinado quando a compactação une segmentos suficientes.
+
+    Args:
+        index_type: Tipo do índice (flat, ivf_flat, ivf_pq, hnsw)
+        dim: Dimensão dos vetores
+        n_train: Número de vetores disponíveis para treino
+        storage: Formato de armazenamento dos vetores (float32, fp16, sq8, pq)
+
+    Retorna:
+        String de fábrica do FAISS
+
+    Levanta:
+        ValueError: Se o tipo de índice ou o armazenamento não forem suportados
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice FAISS não suportado: {index_type}. Use um de {INDEX_TYPES}")
+
+    if index_type == "ivf_pq":
+        storage = "pq"
+
+    if n_train < min_training_vectors(index_type, storage):
+        # Segmento pequeno: índice plano, sem treino (o PQ, que exige treino, vira float32)
+        return _encoding("float32" if storage == "pq" else storage, dim)
+
+    if index_type == "hnsw":
+        encoding = _encoding(storage, dim, hnsw=True)
+        return f"HNSW{FAISS_HNSW_M}" if encoding == "Flat" else f"HNSW{FAISS_HNSW_M}_{encoding}"
+
+    encoding = _encoding(storage, dim)
+
+    if index_type == "flat":
+        # IndexPQ não aceita SearchParameters (IDSelector) nesta versão do FAISS;
+        # um IVF com uma única lista é equivalente e aceita
+        return f"IVF1,{encoding}" if encoding.startswith("PQ") else encoding
+
+    return f"IVF{FAISS_IVF_NLIST},{encoding}"
+
+def build_index(train_vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE, storage: str = FAISS_VECTOR_STORAGE) -> faiss.Index:
+    """
+    Cria um índice vazio do tipo configurado, treinando-o quando necessário.
+
+    Args:
+        train_vectors: Vetores usados para treinar o índice (e definir a dimensão)
+        index_type: Tipo do índice (flat, ivf_flat, ivf_pq, hnsw)
+        storage: Formato de armazenamento dos vetores (float32, fp16, sq8, pq)
+
+    Retorna:
+        Índice FAISS pronto para receber vetores
+    """
+    train_vectors = np.ascontiguousarray(train_vectors, dtype=np.float32)
+    n_train, dim = train_vectors.shape
+    spec = factory_string(index_type, dim, n_train, storage)
+    index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+
+    if not index.is_trained:
+        logger.info(f"Treinando índice FAISS {spec} com {n_train} vetores")
+        index.train(train_vectors)
+
+    apply_search_defaults(index)
+    logger.info(f"Índice FAISS criado: {spec} (dimensão {dim})")
+    return index
+
+def _ivf(index: faiss.Index) -> Optional[Any]:
+    """Retorna o IndexIVF contido no índice ou None se não for IVF."""
+    if not isinstance(index, faiss.Index):
+        return None
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+def apply_search_defaults(index: faiss.Index) -> None:
+    """
+    Aplica ``nprobe``/``efSearch`` configurados diretamente no índice.
+
+    Args:
+        index: Índice FAISS
+    """
+    ivf = _ivf(index)
+    if ivf is not None:
+        ivf.nprobe = FAISS_NPROBE
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = FAISS_EF_SEARCH
+
+def search_params(index: faiss.Index, ids: Optional[np.ndarray] = None, excluded: Optional[np.ndarray] = None) -> Optional[Any]:
+    """
+    Monta os parâmetros de busca adequados ao tipo do índice.
+
+    Args:
+        index: Índice FAISS
+        ids: IDs de vetores opcionais para restringir a busca
+        excluded: IDs de vetores removidos, ignorados quando ``ids`` não é informado
+
+    Retorna:
+        SearchParameters com nprobe/efSearch e seletor, ou None se não houver nada a aplicar
+    """
+    if excluded is not None and len(excluded) == 0:
+        excluded = None
+
+    if isinstance(index, MmapFlatIndex):
+        # O índice mapeado recebe as posições diretamente
+        if ids is None and excluded is None:
+            return None
+        return FlatSearchParams(ids=ids, excluded=excluded if ids is None else None)
+
+    selectors = []
+    if ids is not None:
+        selectors.append(faiss.IDSelectorBatch(ids))
+    elif excluded is not None:
+        selectors.append(faiss.IDSelectorBatch(excluded))
+        selectors.append(faiss.IDSelectorNot(selectors[0]))
+    selector = selectors[-1] if selectors else None
+
+    if _ivf(index) is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=FAISS_NPROBE)
+        setting = ("nprobe", FAISS_NPROBE)
+    elif isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=FAISS_EF_SEARCH)
+        setting = ("efSearch", FAISS_EF_SEARCH)
+    elif selector is not None:
+        params = faiss.SearchParameters(sel=selector)
+        setting = None
+    else:
+        return None
+
+    # O FAISS não guarda referência aos seletores: mantê-los vivos junto com os parâmetros
+    params.referenced_objects = selectors
+    # Os seletores não podem ser lidos de volta: a identidade por valor é calculada aqui
+    params.key = (type(params).__name__, setting, array_key(ids), array_key(excluded if ids is None else None))
+    return params
+
+def supports_mmap(index: Any) -> bool:
+    """
+    Indica se o índice pode ser lido com ``IO_FLAG_MMAP`` nesta versão do FAISS.
+
+    Apenas as listas invertidas dos índices IVF são mapeadas; os demais tipos
+    são copiados para a memória mesmo com a flag.
+
+    Args:
+        index: Índice FAISS
+
+    Retorna:
+        True para índices IVF
+    """
+    return _ivf(index) is not None
+
+def describe_index(index: faiss.Index) -> str:
+    """
+    Descreve o tipo de um índice para logs.
+
+    Args:
+        index: Índice FAISS
+
+    Retorna:
+        Nome da classe do índice e número de vetores
+    """
+    ivf = _ivf(index)
+    details = f", nlist={ivf.nlist}" if ivf is not None else ""
+    return f"{type(index).__name__.replace('faiss.', '')} ({index.ntotal} vetores{details})"
+
+def stores_exact_vectors(index: faiss.Index) -> bool:
+    """
+    Indica se o índice guarda os vetores em float32 sem compressão.
+
+    Args:
+        index: Índice FAISS
+
+    Retorna:
+        True para índices Flat, IVF-Flat, HNSW-Flat e o índice plano mapeado
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        return isinstance(faiss.downcast_index(index.storage), faiss.IndexFlat)
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat, MmapFlatIndex))
+
+def reconstruct_vectors(index: faiss.Index, start: int, count: int) -> np.ndarray:
+    """
+    Reconstrói vetores armazenados em um índice existente.
+
+    Para índices comprimidos (PQ) os vetores reconstruídos são aproximados.
+
+    Args:
+        index: Índice FAISS de origem
+        start: Primeira posição a reconstruir
+        count: Quantidade de vetores
+
+    Retorna:
+        Matriz float32 com os vetores
+    """
+    ivf = _ivf(index)
+    if ivf is not None and ivf.direct_map.no():
+        ivf.make_direct_map()
+    return index.reconstruct_n(start, count)
+
+def index_from_vectors(
+    vectors: np.ndarray,
+    index_type: str = FAISS_INDEX_TYPE,
+    storage: str = FAISS_VECTOR_STORAGE,
+    block_size: int = 65536,
+    max_train: int = 262144
+) -> faiss.Index:
+    """
+    Cria um índice do tipo informado com todos os vetores, na mesma ordem.
+
+    Os vetores podem estar mapeados em memória (``np.memmap``): o treino usa uma
+    amostra uniforme e a inserção é feita bloco a bloco.
+
+    Args:
+        vectors: Matriz (n, dim) com os vetores em precisão total
+        index_type: Tipo do novo índice
+        storage: Formato de armazenamento dos vetores do novo índice
+        block_size: Número de vetores inseridos por bloco
+        max_train: Número máximo de vetores usados no treino
+
+    Retorna:
+        Novo índice FAISS com todos os vetores
+    """
+    total = vectors.shape[0]
+    if total == 0:
+        raise ValueError("Nenhum vetor para indexar")
+
+    # Amostra de treino uniforme no corpus, sem carregar todos os vetores de uma vez
+    train_size = min(total, max_train)
+    train_ids = np.sort(np.random.default_rng(0).choice(total, size=train_size, replace=False))
+    target = build_index(np.asarray(vectors[train_ids], dtype=np.float32), index_type, storage)
+
+    for start in range(0, total, block_size):
+        count = min(block_size, total - start)
+        target.add(np.ascontiguousarray(vectors[start:start + count], dtype=np.float32))
+        if total > block_size:
+            logger.info(f"Construção do índice: {start + count}/{total} vetores inseridos")
+
+    return target
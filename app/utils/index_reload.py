@@ -0,0 +1,150 @@
+"""
+Recarga do índice vetorial entre workers.
+
+Cada troca de manifesto feita por um worker anuncia a nova geração em um canal
+Redis (pub/sub). Os demais workers recebem a mensagem e passam a servir a nova
+geração em segundo plano, sem bloquear as buscas. Sem Redis, ou se uma
+mensagem se perder, o manifesto é verificado periodicamente.
+"""
+import threading
+from typing import Callable, Dict, Optional
+from app.config.settings import (
+    FAISS_RELOAD_ENABLED,
+    FAISS_RELOAD_CHANNEL,
+    FAISS_RELOAD_POLL_SECONDS,
+    logger
+)
+
+class IndexReloader:
+    """Anuncia e acompanha as gerações do índice vetorial via Redis pub/sub."""
+
+    def __init__(self, channel: str, poll_seconds: float, enabled: bool = True):
+        """
+        Inicializa o recarregador.
+
+        Args:
+            channel: Canal Redis em que as gerações são publicadas
+            poll_seconds: Intervalo máximo entre verificações do manifesto
+            enabled: Se a recarga automática está ativa
+        """
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self.enabled = enabled
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.stats: Dict[str, int] = {"published": 0, "notifications": 0, "reloads": 0}
+
+    def _redis_client(self):
+        """Retorna o cliente Redis compartilhado ou None se indisponível."""
+        from app.config.redis_config import get_redis_session_manager
+        redis_manager = get_redis_session_manager()
+        if not redis_manager.redis_available:
+            return None
+        return redis_manager.redis_client
+
+    def publish(self, generation: int) -> None:
+        """
+        Anuncia aos outros workers uma nova geração do índice.
+
+        Args:
+            generation: Geração do manifesto recém-gravado
+        """
+        if not self.enabled:
+            return
+        client = self._redis_client()
+        if client is None:
+            return
+
+        try:
+            client.publish(self.channel, str(generation))
+            self.stats["published"] += 1
+        except Exception as e:
+            logger.warning(f"Erro ao publicar geração {generation} do índice no Redis: {str(e)}")
+
+    def start(self, reload: Callable[[], bool]) -> None:
+        """
+        Inicia a thread que acompanha as gerações publicadas.
+
+        Args:
+            reload: Função que carrega a geração mais nova do disco e retorna
+                True se o índice foi trocado
+        """
+        if not self.enabled or (self.thread is not None and self.thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(reload,), name="faiss-reloader", daemon=True)
+        self.thread.start()
+        logger.info(f"Recarga do índice ativa (canal {self.channel}, verificação a cada {self.poll_seconds:.0f}s)")
+
+    def _subscribe(self):
+        """Assina o canal das gerações, retornando None se o Redis estiver indisponível."""
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+            return pubsub
+        except Exception as e:
+            logger.warning(f"Erro ao assinar o canal {self.channel} no Redis: {str(e)}")
+            return None
+
+    def _wait(self, pubsub) -> None:
+        """Aguarda uma mensagem do canal ou o intervalo de verificação."""
+        if pubsub is None:
+            self.stop_event.wait(self.poll_seconds)
+        elif pubsub.get_message(timeout=self.poll_seconds) is not None:
+            self.stats["notifications"] += 1
+
+    def _run(self, reload: Callable[[], bool]) -> None:
+        """Recarrega o índice a cada notificação ou intervalo, até ``stop``."""
+        pubsub = self._subscribe()
+        while not self.stop_event.is_set():
+            try:
+                self._wait(pubsub)
+            except Exception as e:
+                logger.warning(f"Conexão de pub/sub do índice perdida: {str(e)}")
+                self.stop_event.wait(self.poll_seconds)
+                pubsub = self._subscribe()
+            if self.stop_event.is_set():
+                break
+
+            # A mensagem só acorda a thread: a geração vale a do manifesto no disco
+            try:
+                if reload():
+                    self.stats["reloads"] += 1
+            except Exception as e:
+                logger.error(f"Erro ao recarregar o índice vetorial: {str(e)}", exc_info=True)
+
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Encerra a thread de recarga.
+
+        Args:
+            timeout: Tempo máximo de espera pela thread
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Retorna as estatísticas acumuladas.
+
+        Retorna:
+            Dicionário com gerações publicadas, notificações recebidas e recargas
+        """
+        return dict(self.stats)
+
+# Instância global do recarregador do índice
+index_reloader = IndexReloader(
+    FAISS_RELOAD_CHANNEL,
+    FAISS_RELOAD_POLL_SECONDS,
+    FAISS_RELOAD_ENABLED
+)
@@ -0,0 +1,83 @@
+"""
+Escritor único do índice vetorial.
+
+Todas as alterações do índice (ingestão e remoção de documentos) passam por
+uma fila atendida por uma única thread, que monta a próxima geração do índice.
+As buscas nunca passam por aqui: leem a geração publicada (``snapshot``) sem lock.
+"""
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from app.config.settings import logger
+
+class IndexWriter:
+    """Serializa as escritas no índice vetorial em uma única thread (ator escritor)."""
+
+    def __init__(self):
+        """Inicializa a fila de escrita."""
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-writer")
+        self.pending = 0
+        self.stats: Dict[str, float] = {"completed": 0, "failed": 0, "max_wait_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _execute(self, fn: Callable[..., Any], queued_at: float) -> Any:
+        """Executa uma escrita na thread do escritor, registrando a espera na fila."""
+        wait = time.perf_counter() - queued_at
+        with self._stats_lock:
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], round(wait, 3))
+        try:
+            result = fn()
+        except Exception:
+            with self._stats_lock:
+                self.stats["failed"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.pending -= 1
+        with self._stats_lock:
+            self.stats["completed"] += 1
+        return result
+
+    async def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Enfileira uma escrita e aguarda o resultado sem bloquear o event loop.
+
+        As escritas são executadas uma de cada vez, na ordem de chegada.
+
+        Args:
+            fn: Função que altera o índice
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Retorna:
+            Valor retornado pela função
+        """
+        with self._stats_lock:
+            self.pending += 1
+            ahead = self.pending - 1
+        if ahead:
+            logger.info(f"Escrita no índice aguardando {ahead} escritas anteriores")
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        return await loop.run_in_executor(self.pool, self._execute, call, time.perf_counter())
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Retorna as estatísticas da fila de escrita.
+
+        Retorna:
+            Dicionário com escritas pendentes, concluídas, com erro e a maior espera
+        """
+        with self._stats_lock:
+            return {"pending": self.pending, **self.stats}
+
+    def shutdown(self) -> None:
+        """Aguarda as escritas enfileiradas e encerra a thread do escritor."""
+        self.pool.shutdown(wait=True)
+
+# Instância global do escritor do índice
+index_writer = IndexWriter()
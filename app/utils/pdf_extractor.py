@@ -0,0 +1,147 @@
+"""
+Extração de texto de PDFs em paralelo.
+
+A extração com ``pdfplumber`` é limitada pela CPU e roda uma página por vez.
+PDFs grandes são divididos em intervalos de páginas extraídos por um pool de
+processos; o texto é entregue página a página, na ordem, por um gerador.
+A função executada nos processos fica em ``app.utils.pdf_pages``, que não
+depende das configurações do servidor.
+"""
+import os
+import time
+import threading
+import multiprocessing
+import pdfplumber
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+from app.utils.pdf_pages import count_pages, extract_page_range
+from app.config.settings import (
+    PDF_EXTRACTION_POOL_SIZE,
+    PDF_PAGES_PER_TASK,
+    PDF_PARALLEL_MIN_PAGES,
+    logger
+)
+
+class PdfExtractor:
+    """Distribui a extração de PDFs grandes entre processos e mede páginas por segundo."""
+
+    def __init__(self, pool_size: int, pages_per_task: int, min_parallel_pages: int):
+        """
+        Inicializa o extrator.
+
+        Args:
+            pool_size: Número de processos de extração (0 usa o número de CPUs)
+            pages_per_task: Páginas extraídas por tarefa enviada ao pool
+            min_parallel_pages: PDFs com menos páginas são extraídos no próprio processo
+        """
+        self.pool_size = pool_size if pool_size > 0 else (os.cpu_count() or 1)
+        self.pages_per_task = max(pages_per_task, 1)
+        self.min_parallel_pages = min_parallel_pages
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.stats: Dict[str, float] = {"documents": 0, "pages": 0, "seconds": 0.0, "last_pages_per_second": 0.0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Cria o pool de processos na primeira extração paralela."""
+        with self.lock:
+            if self.pool is None:
+                # spawn: o processo do servidor tem threads (FAISS, escritor, recarga) e não deve ser copiado com fork
+                context = multiprocessing.get_context("spawn")
+                self.pool = ProcessPoolExecutor(max_workers=self.pool_size, mp_context=context)
+                logger.info(f"Pool de extração de PDF iniciado com {self.pool_size} processos")
+            return self.pool
+
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[int, int, str]]:
+        """
+        Extrai o texto de um PDF página a página, na ordem.
+
+        No máximo duas tarefas por processo ficam em andamento ao mesmo tempo,
+        então a memória usada não depende do número de páginas.
+
+        Args:
+            file_path: Caminho para o PDF
+
+        Retorna:
+            Gerador de tuplas (número da página a partir de 1, total de páginas, texto)
+        """
+        started = time.perf_counter()
+        total = count_pages(file_path)
+        if self.pool_size <= 1 or total < max(self.min_parallel_pages, 2):
+            pages = self._iter_local(file_path, total)
+        else:
+            pages = self._iter_pool(file_path, total)
+
+        extracted = 0
+        for number, text in pages:
+            extracted = number
+            yield number, total, text
+
+        elapsed = time.perf_counter() - started
+        self._record(extracted, elapsed)
+        logger.info(
+            f"PDF extraído: {os.path.basename(file_path)} - {extracted} páginas em {elapsed:.2f}s "
+            f"({self.stats['last_pages_per_second']:.1f} páginas/s)"
+        )
+
+    def _iter_local(self, file_path: str, total: int) -> Iterator[Tuple[int, str]]:
+        """Extrai as páginas no processo atual."""
+        with pdfplumber.open(file_path) as pdf:
+            for number, page in enumerate(pdf.pages, start=1):
+                yield number, page.extract_text() or ""
+                page.flush_cache()
+
+    def _iter_pool(self, file_path: str, total: int) -> Iterator[Tuple[int, str]]:
+        """Extrai intervalos de páginas no pool, entregando os resultados na ordem."""
+        pool = self._get_pool()
+        ranges = deque((start, min(start + self.pages_per_task, total)) for start in range(0, total, self.pages_per_task))
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < self.pool_size * 2:
+                    start, end = ranges.popleft()
+                    in_flight.append((start, pool.submit(extract_page_range, file_path, start, end)))
+                start, future = in_flight.popleft()
+                for offset, text in enumerate(future.result()):
+                    yield start + offset + 1, text
+        finally:
+            # Consumidor interrompido ou erro: descarta as tarefas que ainda não começaram
+            for _, future in in_flight:
+                future.cancel()
+
+    def _record(self, pages: int, elapsed: float) -> None:
+        """Acumula as estatísticas de uma extração."""
+        with self.lock:
+            self.stats["documents"] += 1
+            self.stats["pages"] += pages
+            self.stats["seconds"] += elapsed
+            self.stats["last_pages_per_second"] = round(pages / elapsed, 1) if elapsed > 0 else 0.0
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Retorna as estatísticas de extração.
+
+        Retorna:
+            Dicionário com documentos, páginas, tempo total e páginas por segundo
+            (média acumulada e da última extração)
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        stats["seconds"] = round(stats["seconds"], 3)
+        stats["pages_per_second"] = round(stats["pages"] / stats["seconds"], 1) if stats["seconds"] > 0 else 0.0
+        stats["pool_size"] = self.pool_size
+        return stats
+
+    def shutdown(self) -> None:
+        """Encerra o pool de processos, se tiver sido criado."""
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True, cancel_futures=True)
+                self.pool = None
+
+# Instância global do extrator de PDFs
+pdf_extractor = PdfExtractor(
+    PDF_EXTRACTION_POOL_SIZE,
+    PDF_PAGES_PER_TASK,
+    PDF_PARALLEL_MIN_PAGES
+)
@@ -0,0 +1,42 @@
+"""
+Leitura de páginas de PDFs, usada pelos processos do pool de extração.
+
+Este módulo não importa ``app.config.settings``: os processos do pool são
+criados com ``spawn`` e importam apenas o que a tarefa precisa, sem exigir
+as variáveis de ambiente do servidor nem abrir outro handler de log.
+"""
+from typing import List
+import pdfplumber
+
+def count_pages(file_path: str) -> int:
+    """
+    Conta as páginas de um PDF.
+
+    Args:
+        file_path: Caminho para o PDF
+
+    Retorna:
+        Número de páginas
+    """
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Extrai o texto de um intervalo de páginas (executada nos processos do pool).
+
+    Args:
+        file_path: Caminho para o PDF
+        start: Índice da primeira página (a partir de 0)
+        end: Índice final, exclusivo
+
+    Retorna:
+        Texto de cada página do intervalo
+    """
+    with pdfplumber.open(file_path) as pdf:
+        texts = []
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or "")
+            # Libera os objetos já interpretados da página
+            page.flush_cache()
+        return texts
@@ -0,0 +1,160 @@
+"""
+Executor de recuperação para buscas FAISS fora do event loop.
+
+As buscas rodam em um pool de threads limitado e as consultas que chegam
+dentro de uma janela curta são agrupadas em uma única chamada matricial
+``index.search``.
+"""
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config.settings import (
+    RETRIEVAL_BATCH_WINDOW_MS,
+    RETRIEVAL_POOL_SIZE,
+    RETRIEVAL_MAX_BATCH_SIZE,
+    logger
+)
+
+def params_key(params: Any) -> Any:
+    """
+    Retorna a identidade dos parâmetros de busca usada no agrupamento.
+
+    Parâmetros montados por ``search_params`` trazem ``key``, calculada a
+    partir dos valores (tipo, nprobe/efSearch e IDs do seletor); os demais
+    são comparados pela identidade do objeto.
+
+    Args:
+        params: SearchParameters do FAISS, FlatSearchParams ou None
+
+    Retorna:
+        Chave hashable (None sem parâmetros)
+    """
+    if params is None:
+        return None
+    key = getattr(params, "key", None)
+    return key if key is not None else ("object", id(params))
+
+class RetrievalExecutor:
+    """Agrupa consultas concorrentes e executa as buscas em um pool de threads."""
+
+    def __init__(self, window_ms: float, pool_size: int, max_batch_size: int):
+        """
+        Inicializa o executor.
+
+        Args:
+            window_ms: Janela de agrupamento em milissegundos (0 desativa o agrupamento)
+            pool_size: Número de threads do pool de busca
+            max_batch_size: Número máximo de consultas por chamada ao índice
+        """
+        self.window = max(window_ms, 0) / 1000
+        self.max_batch_size = max(max_batch_size, 1)
+        self.pool = ThreadPoolExecutor(max_workers=max(pool_size, 1), thread_name_prefix="faiss-search")
+        self.pending: Dict[Tuple[int, Any, Any], Tuple[Any, Any, List[Tuple[np.ndarray, int, asyncio.Future]]]] = {}
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def search(self, index: Any, vector: np.ndarray, k: int, params: Any = None, group: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca os k vizinhos mais próximos de um vetor de consulta.
+
+        Consultas só são agrupadas na mesma chamada quando usam o mesmo índice,
+        o mesmo grupo (por exemplo, o mesmo filtro de fontes) e parâmetros de
+        busca iguais (ver ``params_key``): o lote inteiro roda com os parâmetros
+        da primeira consulta.
+
+        Args:
+            index: Índice FAISS a ser consultado
+            vector: Vetor de consulta (dimensão do índice)
+            k: Número de vizinhos
+            params: SearchParameters do FAISS (seletor de IDs, nprobe, etc.)
+            group: Chave adicional de agrupamento (por exemplo, o filtro de fontes)
+
+        Retorna:
+            Tupla (distâncias, rótulos), ambos com k posições
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+
+        key = (id(index), group, params_key(params))
+        if key not in self.pending:
+            self.pending[key] = (index, params, [])
+        queries = self.pending[key][2]
+        queries.append((vector, k, future))
+
+        if len(queries) >= self.max_batch_size or self.window == 0:
+            self._dispatch(key)
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Despacha todas as consultas pendentes ao fim da janela."""
+        self.flush_handle = None
+        for key in list(self.pending):
+            self._dispatch(key)
+
+    def _dispatch(self, key: Tuple[int, Any, Any]) -> None:
+        """Envia o lote pendente de um índice para o pool de threads."""
+        index, params, queries = self.pending.pop(key, (None, None, []))
+        if not queries:
+            return
+        asyncio.ensure_future(self._run(index, params, queries))
+
+    async def _run(self, index: Any, params: Any, queries: List[Tuple[np.ndarray, int, asyncio.Future]]) -> None:
+        """Executa um lote no pool e distribui os resultados entre as consultas."""
+        loop = asyncio.get_running_loop()
+        matrix = np.vstack([vector for vector, _, _ in queries])
+        max_k = max(k for _, k, _ in queries)
+
+        try:
+            distances, labels = await loop.run_in_executor(self.pool, self._search, index, matrix, max_k, params)
+        except Exception as e:
+            logger.error(f"Erro na busca em lote ({len(queries)} consultas): {str(e)}")
+            for _, _, future in queries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(queries) > 1:
+            logger.info(f"Busca vetorial em lote: {len(queries)} consultas em uma chamada")
+
+        for row, (_, k, future) in enumerate(queries):
+            if not future.done():
+                future.set_result((distances[row, :k], labels[row, :k]))
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Executa uma função auxiliar de recuperação no pool de threads.
+
+        Args:
+            fn: Função síncrona (por exemplo, a reordenação exata dos candidatos)
+            *args: Argumentos da função
+
+        Retorna:
+            Resultado da função
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    @staticmethod
+    def _search(index: Any, matrix: np.ndarray, k: int, params: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Executa a busca matricial no índice (roda em uma thread do pool)."""
+        if params is None:
+            return index.search(matrix, k)
+        return index.search(matrix, k, params=params)
+
+    def shutdown(self) -> None:
+        """Encerra o pool de threads."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.pool.shutdown(wait=False)
+
+# Instância global do executor de recuperação
+retrieval_executor = RetrievalExecutor(
+    RETRIEVAL_BATCH_WINDOW_MS,
+    RETRIEVAL_POOL_SIZE,
+    RETRIEVAL_MAX_BATCH_SIZE
+)
@@ -0,0 +1,1047 @@
+"""
+Índice vetorial segmentado: cada lote ingerido vira um segmento imutável.
+
+Um manifesto (``manifest.json``) lista os segmentos ativos e é trocado de forma
+atômica (arquivo temporário + ``os.replace``). A ingestão escreve apenas o
+segmento novo, e um compactador em segundo plano une segmentos de tamanho
+parecido, de forma que o custo de um upload seja proporcional ao documento
+e não ao corpus.
+
+Remoções são registradas como tombstones (IDs globais) no manifesto: os
+vetores removidos são ignorados nas buscas e descartados na próxima
+compactação do segmento.
+
+Cada segmento é um diretório com ``index.faiss``, o armazenamento de chunks
+em disco (``chunks.jsonl`` e offsets), ``ids.npy``, com o ID global de cada
+vetor do segmento, e ``sources.json``, com os IDs de cada fonte do segmento.
+O mapa global de fontes é montado a partir desses mapas na carga.
+
+Vários workers podem compartilhar o diretório: as escritas são serializadas
+por um lock de arquivo e começam relendo o manifesto, e os leitores trocam
+para a geração mais nova com ``SegmentedIndex.refresh``.
+
+As buscas leem ``SegmentedIndex.snapshot``, uma geração imutável (segmentos,
+fontes e tombstones) substituída por inteiro a cada escrita, sem esperar
+por nenhum lock.
+"""
+import os
+import json
+import copy
+import math
+import time
+import uuid
+import fcntl
+import shutil
+import threading
+import faiss
+import numpy as np
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from langchain.docstore.document import Document
+from app.config.settings import (
+    FAISS_INDEX_TYPE,
+    FAISS_VECTOR_STORAGE,
+    FAISS_INDEX_MMAP,
+    FAISS_SEGMENT_MERGE_FACTOR,
+    FAISS_SEGMENT_MAX_COUNT,
+    FAISS_SEGMENT_MAX_DELETED_RATIO,
+    FAISS_COMPACTION_ENABLED,
+    logger
+)
+from app.utils.index_factory import (
+    build_index,
+    index_from_vectors,
+    apply_search_defaults,
+    describe_index,
+    is_lossy,
+    stores_exact_vectors,
+    supports_mmap,
+    reconstruct_vectors
+)
+from app.utils.source_index import SourceIndex, SOURCE_MAP_FILE, source_map, read_source_map, write_source_map
+from app.utils.chunk_store import ChunkStore
+from app.utils.vector_file import VectorFile, MmapFlatIndex
+
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+INDEX_FILE = "index.faiss"
+# Docstore do LangChain usado por segmentos antigos, convertido em ChunkStore na carga
+DOCSTORE_FILE = "index.pkl"
+IDS_FILE = "ids.npy"
+# Lock de arquivo que serializa as escritas de todos os processos no diretório
+LOCK_FILE = ".writer.lock"
+# Lock mantido dentro do diretório temporário enquanto o segmento é escrito
+SEGMENT_WRITING_LOCK = ".writing.lock"
+
+# Assinatura do IndexFlatL2 no formato de arquivo do FAISS
+FLAT_L2_FOURCC = b"IxF2"
+
+# Segmentos aposentados são apagados só depois deste prazo, para não
+# interromper buscas em andamento (ou outros workers) que ainda os usam
+SEGMENT_GC_GRACE_SECONDS = 600
+
+def _read_index_header(index_path: str) -> Tuple[bytes, int, int]:
+    """Lê a assinatura, a dimensão e o número de vetores do cabeçalho de um índice FAISS."""
+    with open(index_path, "rb") as f:
+        header = f.read(16)
+    fourcc = header[:4]
+    dim = int(np.frombuffer(header[4:8], dtype=np.int32)[0])
+    ntotal = int(np.frombuffer(header[8:16], dtype=np.int64)[0])
+    return fourcc, dim, ntotal
+
+def read_index(folder_path: str, mmap: bool = False) -> Any:
+    """
+    Lê o índice FAISS de um diretório.
+
+    No modo mapeado, índices IVF usam ``IO_FLAG_MMAP`` e índices planos L2 são
+    servidos a partir do arquivo de vetores mapeado, de forma que as páginas
+    fiquem no page cache e sejam compartilhadas entre os workers.
+
+    Args:
+        folder_path: Diretório com o arquivo ``index.faiss``
+        mmap: Se o índice deve ser mapeado em memória (somente leitura)
+
+    Retorna:
+        Índice FAISS (ou MmapFlatIndex)
+    """
+    index_path = os.path.join(folder_path, INDEX_FILE)
+    if not mmap:
+        return faiss.read_index(index_path)
+
+    fourcc, dim, ntotal = _read_index_header(index_path)
+    if fourcc == FLAT_L2_FOURCC:
+        flat_vectors = VectorFile.open(folder_path, dim)
+        if flat_vectors is None or len(flat_vectors) != ntotal:
+            # Migração única: extrai os vetores do índice plano para o arquivo mapeável
+            heap_index = faiss.read_index(index_path)
+            flat_vectors = VectorFile.create(folder_path, dim)
+            flat_vectors.append(heap_index.reconstruct_n(0, ntotal))
+            del heap_index
+            logger.info(f"Arquivo de vetores criado para carga mapeada ({ntotal} vetores)")
+        return MmapFlatIndex(flat_vectors)
+
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    if not supports_mmap(index):
+        logger.info(f"{describe_index(index)} não suporta mmap nesta versão do FAISS; carregado em memória")
+    return index
+
+def needs_vector_file(index_type: str = FAISS_INDEX_TYPE, storage: str = FAISS_VECTOR_STORAGE) -> bool:
+    """
+    Indica se os segmentos devem manter o arquivo de vetores em precisão total.
+
+    O arquivo serve a reordenação exata de índices comprimidos e a carga
+    mapeada de índices planos.
+
+    Args:
+        index_type: Tipo do índice
+        storage: Formato de armazenamento dos vetores
+
+    Retorna:
+        True se o arquivo ``vectors.f32`` deve ser escrito
+    """
+    return is_lossy(index_type, storage) or FAISS_INDEX_MMAP
+
+def select_segments_to_merge(sizes: List[int], merge_factor: int = FAISS_SEGMENT_MERGE_FACTOR, max_segments: int = FAISS_SEGMENT_MAX_COUNT) -> List[int]:
+    """
+    Escolhe os segmentos a unir segundo a política de tamanho/quantidade.
+
+    Os segmentos são agrupados em níveis de tamanho (potências de ``merge_factor``).
+    Quando um nível acumula ``merge_factor`` segmentos, eles são unidos em um
+    segmento do nível seguinte, o que mantém o custo amortizado de compactação
+    logarítmico no tamanho do corpus. Acima de ``max_segments`` os menores
+    segmentos são unidos mesmo em níveis diferentes.
+
+    Args:
+        sizes: Número de vetores de cada segmento, na ordem do manifesto
+        merge_factor: Segmentos de um mesmo nível que disparam a compactação (mínimo 2)
+        max_segments: Número máximo de segmentos antes de forçar a compactação
+
+    Retorna:
+        Posições dos segmentos a unir (vazio se nada precisar ser compactado)
+    """
+    merge_factor = max(merge_factor, 2)
+    tiers: Dict[int, List[int]] = {}
+    for position, size in enumerate(sizes):
+        tier = int(math.log(max(size, 1), merge_factor))
+        tiers.setdefault(tier, []).append(position)
+
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= merge_factor:
+            return tiers[tier][:merge_factor]
+
+    if len(sizes) > max_segments:
+        return sorted(sorted(range(len(sizes)), key=lambda position: sizes[position])[:merge_factor])
+    return []
+
+def read_manifest(folder_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Lê o manifesto do índice segmentado.
+
+    Args:
+        folder_path: Diretório do índice vetorial
+
+    Retorna:
+        Conteúdo do manifesto ou None se ele não existir
+    """
+    path = os.path.join(folder_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_manifest(folder_path: str, manifest: Dict[str, Any]) -> None:
+    """
+    Escreve o manifesto de forma atômica (arquivo temporário + ``os.replace``).
+
+    Args:
+        folder_path: Diretório do índice vetorial
+        manifest: Conteúdo do manifesto
+    """
+    path = os.path.join(folder_path, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+class Segment:
+    """Segmento imutável: índice FAISS, documentos e IDs globais dos vetores."""
+
+    def __init__(
+        self,
+        name: str,
+        index: Any,
+        chunks: ChunkStore,
+        ids: np.ndarray,
+        sources: Dict[str, np.ndarray],
+        vector_file: Optional[VectorFile] = None
+    ):
+        """
+        Inicializa o segmento.
+
+        Args:
+            name: Nome do diretório do segmento
+            index: Índice FAISS (posições locais 0..n-1)
+            chunks: Texto e metadados dos chunks, por posição local
+            ids: ID global de cada posição local
+            sources: Mapa de fonte para os IDs globais do segmento
+            vector_file: Vetores em precisão total (reordenação exata), se houver
+        """
+        self.name = name
+        self.index = index
+        self.chunks = chunks
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.sources = sources
+        self.vector_file = vector_file
+
+        # Posições locais removidas (tombstones); cada geração usa a sua cópia (with_deleted)
+        self.deleted = np.empty(0, dtype=np.int64)
+
+        # Ordenação dos IDs globais para traduzir filtros em posições locais
+        self._order = np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids[self._order]
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.ids)
+
+    @property
+    def live(self) -> int:
+        """Número de vetores não removidos."""
+        return self.ntotal - len(self.deleted)
+
+    @property
+    def rerank_file(self) -> Optional[VectorFile]:
+        """Arquivo usado para reordenar candidatos, ou None se o índice já é exato."""
+        if self.vector_file is None or stores_exact_vectors(self.index):
+            return None
+        return self.vector_file
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "Segment":
+        """
+        Carrega um segmento do disco.
+
+        Args:
+            path: Diretório do segmento
+            mmap: Se o índice deve ser mapeado em memória
+
+        Retorna:
+            Segmento carregado
+        """
+        index = read_index(path, mmap=mmap)
+        apply_search_defaults(index)
+        ids = np.load(os.path.join(path, IDS_FILE))
+
+        chunks = ChunkStore.open(path)
+        if chunks is None:
+            # Segmento com docstore em memória (index.pkl): conversão única para o armazenamento em disco
+            chunks = ChunkStore.from_pickle(path, os.path.join(path, DOCSTORE_FILE))
+            os.remove(os.path.join(path, DOCSTORE_FILE))
+            logger.info(f"Docstore do segmento {os.path.basename(path)} convertido para armazenamento em disco")
+
+        sources = read_source_map(path)
+        if sources is None:
+            # Segmento anterior aos mapas de fontes por segmento: reconstrução única a partir dos chunks
+            sources = source_map((chunks.record(position)[1] for position in range(len(ids))), ids)
+            write_source_map(path, sources)
+            logger.info(f"Mapa de fontes do segmento {os.path.basename(path)} reconstruído a partir dos chunks")
+
+        if isinstance(index, MmapFlatIndex):
+            vector_file = index.vector_file
+        else:
+            vector_file = VectorFile.open(path, index.d)
+        if vector_file is not None and len(vector_file) != index.ntotal:
+            logger.warning(
+                f"Arquivo de vetores com {len(vector_file)} linhas para {index.ntotal} vetores no segmento "
+                f"{os.path.basename(path)}. Reordenação exata desativada até a compactação."
+            )
+            vector_file = None
+
+        return cls(os.path.basename(path), index, chunks, ids, sources, vector_file)
+
+    @staticmethod
+    def write(path: str, index: faiss.Index, ids: np.ndarray, records: Iterable[Tuple[str, Document]]) -> None:
+        """
+        Escreve os arquivos de um segmento em um diretório.
+
+        O mapa de fontes do segmento é montado enquanto os registros são gravados.
+
+        Args:
+            path: Diretório do segmento (já contendo ``vectors.f32``, se houver)
+            index: Índice FAISS com os vetores dos documentos, na mesma ordem
+            ids: ID global de cada documento
+            records: Pares (ID no docstore, documento), na ordem dos vetores
+        """
+        os.makedirs(path, exist_ok=True)
+        ids = np.asarray(ids, dtype=np.int64)
+        sources: Dict[str, List[int]] = {}
+
+        def tracked() -> Iterator[Tuple[str, Document]]:
+            for vector_id, (docstore_id, doc) in zip(ids.tolist(), records):
+                sources.setdefault(doc.metadata.get("source", ""), []).append(vector_id)
+                yield docstore_id, doc
+
+        written = ChunkStore.write(path, tracked())
+        if written != index.ntotal or written != len(ids):
+            raise ValueError(f"Segmento com {written} chunks para {index.ntotal} vetores")
+        faiss.write_index(index, os.path.join(path, INDEX_FILE))
+        np.save(os.path.join(path, IDS_FILE), ids)
+        write_source_map(path, sources)
+
+    def with_deleted(self, deleted: np.ndarray) -> "Segment":
+        """
+        Retorna o mesmo segmento com outras posições removidas, sem alterar este.
+
+        O índice, os chunks e os IDs são compartilhados.
+
+        Args:
+            deleted: Posições locais removidas
+
+        Retorna:
+            Cópia rasa do segmento
+        """
+        view = copy.copy(self)
+        view.deleted = deleted
+        return view
+
+    def positions_for(self, global_ids: np.ndarray) -> np.ndarray:
+        """
+        Traduz IDs globais em posições locais deste segmento.
+
+        Args:
+            global_ids: IDs globais (ordenados ou não)
+
+        Retorna:
+            Array int64 ordenado com as posições locais presentes no segmento
+        """
+        if len(self._sorted_ids) == 0 or len(global_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        global_ids = np.asarray(global_ids, dtype=np.int64)
+        slots = np.searchsorted(self._sorted_ids, global_ids)
+        valid = slots < len(self._sorted_ids)
+        slots = slots[valid]
+        found = slots[self._sorted_ids[slots] == global_ids[valid]]
+        return np.sort(self._order[np.unique(found)])
+
+    def document(self, position: int) -> Optional[Document]:
+        """
+        Retorna o documento de uma posição local.
+
+        Args:
+            position: Posição local do vetor
+
+        Retorna:
+            Documento ou None se o registro estiver ilegível
+        """
+        try:
+            return self.chunks.get(int(position))
+        except (IndexError, ValueError) as e:
+            logger.warning(f"Documento não encontrado na posição {position} do segmento {self.name}: {str(e)}")
+            return None
+
+    def live_positions(self) -> np.ndarray:
+        """Retorna as posições locais que não foram removidas."""
+        return np.setdiff1d(np.arange(self.ntotal, dtype=np.int64), self.deleted, assume_unique=True)
+
+    def iter_documents(self) -> Iterator[Tuple[int, str, Document]]:
+        """Itera sobre (ID global, ID no docstore, documento) dos vetores não removidos."""
+        for position in self.live_positions():
+            docstore_id, doc = self.chunks.record(int(position))
+            yield int(self.ids[position]), docstore_id, doc
+
+    def iter_vectors(self, block_size: int = 65536) -> Iterator[np.ndarray]:
+        """
+        Itera sobre os vetores do segmento em blocos, na ordem das posições locais.
+
+        Vetores removidos são incluídos; o chamador filtra com ``deleted``.
+
+        Usa o arquivo de vetores em precisão total quando existe; caso contrário
+        reconstrói os vetores a partir do índice (aproximados se comprimidos).
+
+        Args:
+            block_size: Número de vetores por bloco
+
+        Retorna:
+            Iterador de matrizes float32
+        """
+        matrix = self.vector_file.matrix() if self.vector_file is not None else None
+        if matrix is None and not stores_exact_vectors(self.index):
+            logger.warning(f"Segmento {self.name} comprimido sem arquivo de vetores: usando vetores aproximados")
+        for start in range(0, self.ntotal, block_size):
+            count = min(block_size, self.ntotal - start)
+            if matrix is not None:
+                yield np.asarray(matrix[start:start + count], dtype=np.float32)
+            else:
+                yield reconstruct_vectors(self.index, start, count)
+
+class IndexSnapshot(NamedTuple):
+    """
+    Geração imutável do índice, lida pelas buscas sem nenhum lock.
+
+    Cada escrita monta uma geração nova e troca a referência de uma vez
+    (estilo RCU); quem já tinha a geração anterior continua nela até terminar.
+    """
+    generation: int
+    segments: Tuple[Segment, ...]
+    sources: SourceIndex
+    tombstones: np.ndarray
+    # Muda só quando vetores são adicionados ou removidos (a compactação preserva os chunks e seus IDs)
+    content_generation: int = 0
+
+    @property
+    def ntotal(self) -> int:
+        return sum(segment.live for segment in self.segments)
+
+def _with_tombstones(segments: Sequence[Segment], tombstones: np.ndarray) -> Tuple[Segment, ...]:
+    """Retorna os segmentos com as posições removidas atualizadas, sem alterar os originais."""
+    result = []
+    for segment in segments:
+        deleted = segment.positions_for(tombstones)
+        result.append(segment if np.array_equal(deleted, segment.deleted) else segment.with_deleted(deleted))
+    return tuple(result)
+
+class SegmentedIndex:
+    """Conjunto de segmentos ativos descrito por um manifesto."""
+
+    def __init__(
+        self,
+        folder_path: str,
+        segments: Sequence[Segment],
+        next_id: int = 0,
+        next_segment: int = 0,
+        generation: int = 0,
+        tombstones: Optional[np.ndarray] = None,
+        content_generation: Optional[int] = None
+    ):
+        """
+        Inicializa o índice segmentado.
+
+        Args:
+            folder_path: Diretório do índice vetorial
+            segments: Segmentos ativos
+            next_id: Próximo ID global de vetor
+            next_segment: Número do próximo segmento
+            generation: Geração do manifesto (incrementada a cada troca)
+            tombstones: IDs globais removidos ainda presentes em algum segmento
+            content_generation: Geração do conteúdo (a própria geração, se None)
+        """
+        self.folder_path = folder_path
+        self.next_id = next_id
+        self.next_segment = next_segment
+        tombstones = np.asarray(tombstones if tombstones is not None else [], dtype=np.int64)
+        # Geração servida às buscas; só é substituída, nunca alterada
+        self.snapshot = IndexSnapshot(
+            generation,
+            _with_tombstones(segments, tombstones),
+            SourceIndex.from_segments(segments, tombstones),
+            tombstones,
+            content_generation if content_generation is not None else generation
+        )
+        # Serializa as escritas (ingestão, compactador e recarga); as buscas não o usam
+        self.lock = threading.Lock()
+        # Chamado com a nova geração após cada troca de manifesto feita por este processo
+        self.on_commit: Optional[Callable[[int], None]] = None
+        # Diretórios temporários sendo escritos por este processo e seus locks
+        self._reservations: Dict[str, IO] = {}
+
+    @property
+    def segments(self) -> Tuple[Segment, ...]:
+        return self.snapshot.segments
+
+    @property
+    def sources(self) -> SourceIndex:
+        return self.snapshot.sources
+
+    @property
+    def tombstones(self) -> np.ndarray:
+        return self.snapshot.tombstones
+
+    @property
+    def generation(self) -> int:
+        return self.snapshot.generation
+
+    @property
+    def ntotal(self) -> int:
+        return self.snapshot.ntotal
+
+    @property
+    def segments_path(self) -> str:
+        return os.path.join(self.folder_path, SEGMENTS_DIR)
+
+    @classmethod
+    def load(cls, folder_path: str, mmap: bool = FAISS_INDEX_MMAP) -> Optional["SegmentedIndex"]:
+        """
+        Carrega o índice segmentado de um diretório.
+
+        Índices no formato antigo (``index.faiss`` na raiz) são convertidos em
+        um único segmento, sem recalcular embeddings.
+
+        Args:
+            folder_path: Diretório do índice vetorial
+            mmap: Se os segmentos devem ser mapeados em memória
+
+        Retorna:
+            SegmentedIndex ou None se não houver índice no diretório
+        """
+        migrate_legacy_index(folder_path)
+        manifest = read_manifest(folder_path)
+        if manifest is None:
+            return None
+
+        segments = [
+            Segment.load(os.path.join(folder_path, SEGMENTS_DIR, name), mmap=mmap)
+            for name in manifest["segments"]
+        ]
+        legacy_sources = os.path.join(folder_path, SOURCE_MAP_FILE)
+        if os.path.exists(legacy_sources):
+            # Mapa global de versões anteriores, substituído pelos mapas de cada segmento
+            os.remove(legacy_sources)
+        store = cls(
+            folder_path,
+            segments,
+            next_id=manifest["next_id"],
+            next_segment=manifest["next_segment"],
+            generation=manifest["generation"],
+            tombstones=manifest.get("tombstones", []),
+            content_generation=manifest.get("content_generation")
+        )
+        store.collect_garbage()
+        return store
+
+    def refresh(self, mmap: bool = FAISS_INDEX_MMAP) -> bool:
+        """
+        Passa a servir a geração do manifesto gravada por outro processo, se for mais nova.
+
+        Apenas os segmentos novos são lidos do disco; os demais são reaproveitados.
+        A nova geração é publicada com uma única troca de referência, sem
+        bloquear as buscas em andamento.
+
+        Args:
+            mmap: Se os segmentos novos devem ser mapeados em memória
+
+        Retorna:
+            True se uma geração nova foi carregada
+        """
+        with self.lock:
+            return self._refresh_locked(mmap)
+
+    def _refresh_locked(self, mmap: bool = FAISS_INDEX_MMAP) -> bool:
+        """Recarrega o manifesto; o chamador segura ``self.lock``."""
+        manifest = read_manifest(self.folder_path)
+        if manifest is None or manifest["generation"] <= self.generation:
+            return False
+
+        loaded = {segment.name: segment for segment in self.segments}
+        new_names = [name for name in manifest["segments"] if name not in loaded]
+        segments = [
+            loaded.get(name) or Segment.load(os.path.join(self.segments_path, name), mmap=mmap)
+            for name in manifest["segments"]
+        ]
+        tombstones = np.asarray(manifest.get("tombstones", []), dtype=np.int64)
+        segments = _with_tombstones(segments, tombstones)
+        # Só os mapas dos segmentos novos foram lidos; os demais são os já carregados
+        sources = SourceIndex.from_segments(segments, tombstones)
+
+        previous = self.generation
+        self.next_id = manifest["next_id"]
+        self.next_segment = manifest["next_segment"]
+        self.snapshot = IndexSnapshot(
+            manifest["generation"], segments, sources, tombstones,
+            manifest.get("content_generation", manifest["generation"])
+        )
+
+        logger.info(
+            f"Índice vetorial atualizado da geração {previous} para {self.generation} "
+            f"({len(segments)} segmentos, {len(new_names)} novos)"
+        )
+        return True
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """
+        Seção de escrita: exclusiva entre threads e entre processos.
+
+        Antes de alterar o índice, o manifesto é relido para que as escritas
+        de outros workers não sejam sobrescritas.
+        """
+        with self.lock:
+            os.makedirs(self.folder_path, exist_ok=True)
+            with open(os.path.join(self.folder_path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh_locked()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _new_segment_path(self) -> Tuple[str, str]:
+        """
+        Reserva o nome do próximo segmento e cria seu diretório temporário.
+
+        O diretório fica com um lock de arquivo até ser publicado ou descartado,
+        para que ``collect_garbage`` (deste ou de outro processo) não o apague
+        durante uma compactação longa.
+
+        Retorna:
+            Tupla (nome, caminho temporário)
+        """
+        os.makedirs(self.segments_path, exist_ok=True)
+        while True:
+            name = f"seg_{self.next_segment:06d}"
+            self.next_segment += 1
+            tmp_path = os.path.join(self.segments_path, f"{name}.tmp")
+            # Nomes reservados por uniões em andamento (talvez de outro worker) ainda não estão no manifesto
+            if os.path.exists(os.path.join(self.segments_path, name)):
+                continue
+            try:
+                os.makedirs(tmp_path)
+            except FileExistsError:
+                continue
+            lock_file = open(os.path.join(tmp_path, SEGMENT_WRITING_LOCK), "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._reservations[tmp_path] = lock_file
+            return name, tmp_path
+
+    def _release(self, tmp_path: str, path: Optional[str] = None) -> None:
+        """
+        Libera o lock de um diretório temporário reservado por ``_new_segment_path``.
+
+        Args:
+            tmp_path: Caminho temporário reservado
+            path: Caminho atual do diretório (após a publicação), se mudou
+        """
+        lock_file = self._reservations.pop(tmp_path, None)
+        if lock_file is None:
+            return
+        try:
+            os.remove(os.path.join(path or tmp_path, SEGMENT_WRITING_LOCK))
+        except FileNotFoundError:
+            pass
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    def _discard(self, tmp_path: str) -> None:
+        """Apaga um diretório temporário reservado, liberando seu lock."""
+        self._release(tmp_path)
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _commit(
+        self,
+        segments: Sequence[Segment],
+        tombstones: np.ndarray,
+        content_changed: bool = True
+    ) -> IndexSnapshot:
+        """
+        Grava o manifesto da próxima geração e a publica para as buscas.
+
+        O chamador está em ``_writing``. O mapa de fontes da geração referencia
+        os mapas imutáveis dos segmentos, sem copiá-los.
+
+        Args:
+            segments: Segmentos ativos da nova geração
+            tombstones: IDs globais removidos da nova geração
+            content_changed: Se vetores foram adicionados ou removidos (False na compactação)
+
+        Retorna:
+            Nova geração publicada
+        """
+        snapshot = IndexSnapshot(
+            self.generation + 1,
+            _with_tombstones(segments, tombstones),
+            SourceIndex.from_segments(segments, tombstones),
+            tombstones,
+            self.generation + 1 if content_changed else self.snapshot.content_generation
+        )
+        write_manifest(self.folder_path, {
+            "generation": snapshot.generation,
+            "content_generation": snapshot.content_generation,
+            "next_id": self.next_id,
+            "next_segment": self.next_segment,
+            "segments": [segment.name for segment in snapshot.segments],
+            "tombstones": tombstones.tolist()
+        })
+        # Troca atômica da referência: buscas em andamento seguem na geração anterior
+        self.snapshot = snapshot
+
+        if self.on_commit is not None:
+            try:
+                self.on_commit(snapshot.generation)
+            except Exception as e:
+                logger.warning(f"Erro ao anunciar a geração {snapshot.generation} do índice: {str(e)}")
+        return snapshot
+
+    def _publish(self, name: str, tmp_path: str) -> Segment:
+        """Torna visível um segmento escrito em diretório temporário."""
+        path = os.path.join(self.segments_path, name)
+        os.rename(tmp_path, path)
+        # Remover o lock também renova o mtime do diretório até o manifesto ser gravado
+        self._release(tmp_path, path)
+        return Segment.load(path, mmap=FAISS_INDEX_MMAP)
+
+    def add(self, documents: List[Document], embeddings: List[List[float]]) -> Segment:
+        """
+        Grava um lote de documentos como um novo segmento.
+
+        O custo é proporcional ao lote: nenhum segmento existente é reescrito.
+
+        Args:
+            documents: Documentos do lote
+            embeddings: Embeddings dos documentos, na mesma ordem
+
+        Retorna:
+            Segmento criado
+        """
+        vectors = np.array(embeddings, dtype=np.float32)
+        index = build_index(vectors)
+        index.add(vectors)
+
+        with self._writing():
+            name, tmp_path = self._new_segment_path()
+            ids = np.arange(self.next_id, self.next_id + len(documents), dtype=np.int64)
+            try:
+                if needs_vector_file():
+                    VectorFile.create(tmp_path, vectors.shape[1]).append(vectors)
+                Segment.write(tmp_path, index, ids, ((str(uuid.uuid4()), doc) for doc in documents))
+                segment = self._publish(name, tmp_path)
+            except Exception:
+                self._discard(tmp_path)
+                raise
+
+            self.next_id += len(documents)
+            self._commit(self.segments + (segment,), self.tombstones)
+
+        logger.info(f"Segmento {name} criado com {len(documents)} vetores ({len(self.segments)} segmentos ativos)")
+        return segment
+
+    def delete_ids(self, ids: np.ndarray) -> int:
+        """
+        Remove vetores pelos IDs globais, sem reescrever os segmentos.
+
+        Os IDs viram tombstones no manifesto e são ignorados nas buscas até a
+        compactação do segmento descartá-los.
+
+        Args:
+            ids: IDs globais a remover
+
+        Retorna:
+            Número de vetores removidos
+        """
+        with self._writing():
+            ids = np.setdiff1d(np.asarray(ids, dtype=np.int64), self.tombstones)
+            present = [segment.ids[segment.positions_for(ids)] for segment in self.segments]
+            ids = np.concatenate(present) if present else np.empty(0, dtype=np.int64)
+            if len(ids) == 0:
+                return 0
+            # Os mapas de fontes dos segmentos não mudam: os tombstones são descontados na consulta
+            self._commit(self.segments, np.union1d(self.tombstones, ids))
+
+        logger.info(f"{len(ids)} vetores removidos ({len(self.tombstones)} aguardando compactação)")
+        return len(ids)
+
+    def delete_sources(self, sources: List[str]) -> int:
+        """
+        Remove todos os vetores das fontes informadas (correspondência exata).
+
+        Args:
+            sources: Valores de ``metadata["source"]``
+
+        Retorna:
+            Número de vetores removidos
+        """
+        return self.delete_ids(self.sources.ids_for_sources(sources))
+
+    def merge(
+        self,
+        segments: Sequence[Segment],
+        index_type: str = FAISS_INDEX_TYPE,
+        storage: str = FAISS_VECTOR_STORAGE,
+        block_size: int = 65536
+    ) -> Optional[Segment]:
+        """
+        Une segmentos em um novo segmento e troca o manifesto de forma atômica.
+
+        O trabalho pesado acontece fora do lock; segmentos criados enquanto isso
+        continuam no manifesto. Os IDs globais são preservados e os vetores
+        removidos são descartados.
+
+        Args:
+            segments: Segmentos a unir
+            index_type: Tipo do índice do novo segmento
+            storage: Formato de armazenamento dos vetores do novo segmento
+            block_size: Número de vetores copiados por bloco
+
+        Retorna:
+            Segmento resultante ou None se todos os vetores tinham sido removidos
+
+        Levanta:
+            RuntimeError: Se algum segmento deixou de estar ativo durante a união
+                (por exemplo, unido por outro worker)
+        """
+        start = time.perf_counter()
+        with self._writing():
+            # Vetores removidos até aqui são descartados; remoções durante a união continuam como tombstones
+            active = {segment.name: segment for segment in self.segments}
+            if not all(segment.name in active for segment in segments):
+                raise RuntimeError("Segmentos alterados antes da compactação")
+            segments = [active[segment.name] for segment in segments]
+            name, tmp_path = self._new_segment_path()
+
+        if sum(segment.live for segment in segments) == 0:
+            self._discard(tmp_path)
+            self._drop(segments)
+            return None
+
+        try:
+            dim = segments[0].index.d
+            staging = VectorFile.create(tmp_path, dim)
+            kept, ids = [], []
+            for segment in segments:
+                keep = np.ones(segment.ntotal, dtype=bool)
+                keep[segment.deleted] = False
+                offset = 0
+                for block in segment.iter_vectors(block_size):
+                    staging.append(block[keep[offset:offset + len(block)]])
+                    offset += len(block)
+                kept.append(np.flatnonzero(keep))
+                ids.append(segment.ids[keep])
+
+            index = index_from_vectors(staging.matrix(), index_type, storage, block_size=block_size)
+            if not needs_vector_file(index_type, storage):
+                os.remove(staging.path)
+
+            # Os registros são copiados em fluxo, sem carregar os textos na memória
+            records = (
+                segment.chunks.record(int(position))
+                for segment, positions in zip(segments, kept)
+                for position in positions
+            )
+            Segment.write(tmp_path, index, np.concatenate(ids), records)
+        except Exception:
+            self._discard(tmp_path)
+            raise
+
+        with self._writing():
+            active = {segment.name for segment in self.segments}
+            if not all(segment.name in active for segment in segments):
+                self._discard(tmp_path)
+                raise RuntimeError("Segmentos alterados durante a compactação")
+
+            merged = self._publish(name, tmp_path)
+            purged = np.concatenate([segment.ids[segment.deleted] for segment in segments])
+            retired = {segment.name for segment in segments}
+            # O segmento unido ocupa a posição do primeiro segmento aposentado
+            remaining = []
+            for segment in self.segments:
+                if segment.name not in retired:
+                    remaining.append(segment)
+                elif segment.name == segments[0].name:
+                    remaining.append(merged)
+            self._commit(remaining, np.setdiff1d(self.tombstones, purged), content_changed=False)
+
+        self._retire(segments)
+        logger.info(
+            f"Compactação: {len(segments)} segmentos unidos em {name} ({merged.ntotal} vetores, "
+            f"{describe_index(merged.index)}) em {time.perf_counter() - start:.2f}s"
+        )
+        return merged
+
+    def compact(self) -> bool:
+        """
+        Executa uma rodada de compactação, se a política indicar.
+
+        Retorna:
+            True se algum segmento foi compactado
+        """
+        # Outro worker pode ter compactado os mesmos segmentos
+        self.refresh()
+        segments = self.segments
+        positions = select_segments_to_merge([segment.live for segment in segments])
+        if positions:
+            self.merge([segments[position] for position in positions])
+            return True
+
+        # Segmentos com muitos vetores removidos são reescritos sozinhos
+        for segment in segments:
+            if len(segment.deleted) > FAISS_SEGMENT_MAX_DELETED_RATIO * segment.ntotal:
+                self.merge([segment])
+                return True
+        return False
+
+    def _drop(self, segments: Sequence[Segment]) -> None:
+        """Remove do manifesto segmentos cujos vetores foram todos removidos."""
+        with self._writing():
+            retired = {segment.name for segment in segments}
+            purged = np.concatenate([segment.ids for segment in segments])
+            self._commit(
+                [segment for segment in self.segments if segment.name not in retired],
+                np.setdiff1d(self.tombstones, purged),
+                content_changed=False
+            )
+        self._retire(segments)
+        logger.info(f"Compactação: {len(segments)} segmentos sem vetores ativos removidos")
+
+    def _retire(self, segments: Sequence[Segment]) -> None:
+        """Marca segmentos fora do manifesto para remoção após o prazo de carência."""
+        now = time.time()
+        for segment in segments:
+            path = os.path.join(self.segments_path, segment.name)
+            if os.path.exists(path):
+                os.utime(path, (now, now))
+        self.collect_garbage()
+
+    def collect_garbage(self, grace_seconds: float = SEGMENT_GC_GRACE_SECONDS) -> None:
+        """
+        Remove diretórios de segmentos que não estão no manifesto.
+
+        Diretórios temporários com o lock de escrita ocupado pertencem a uma
+        compactação ou ingestão em andamento e nunca são removidos.
+
+        Args:
+            grace_seconds: Idade mínima (desde a aposentadoria) para remover um segmento
+        """
+        if not os.path.isdir(self.segments_path):
+            return
+        active = {segment.name for segment in self.segments}
+        now = time.time()
+        for name in os.listdir(self.segments_path):
+            path = os.path.join(self.segments_path, name)
+            if name in active or _is_being_written(path):
+                continue
+            # Diretórios .tmp recentes sem lock podem ter acabado de ser reservados
+            if now - os.path.getmtime(path) >= grace_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+
+def _is_being_written(path: str) -> bool:
+    """
+    Indica se um diretório de segmento está sendo escrito por algum processo.
+
+    Args:
+        path: Diretório do segmento
+
+    Retorna:
+        True se o lock de escrita do diretório está ocupado
+    """
+    try:
+        lock_file = open(os.path.join(path, SEGMENT_WRITING_LOCK), "r")
+    except OSError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+
+def migrate_legacy_index(folder_path: str) -> None:
+    """
+    Converte um índice no formato antigo (arquivos na raiz) em um segmento.
+
+    Os IDs globais são as posições do índice antigo; o mapa de fontes do
+    segmento é reconstruído a partir dos chunks na carga.
+
+    Args:
+        folder_path: Diretório do índice vetorial
+    """
+    index_path = os.path.join(folder_path, INDEX_FILE)
+    if os.path.exists(os.path.join(folder_path, MANIFEST_FILE)) or not os.path.exists(index_path):
+        return
+
+    _, _, ntotal = _read_index_header(index_path)
+    name = "seg_000000"
+    path = os.path.join(folder_path, SEGMENTS_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    for file_name in (INDEX_FILE, DOCSTORE_FILE, "vectors.f32"):
+        if os.path.exists(os.path.join(folder_path, file_name)):
+            os.replace(os.path.join(folder_path, file_name), os.path.join(path, file_name))
+    np.save(os.path.join(path, IDS_FILE), np.arange(ntotal, dtype=np.int64))
+
+    write_manifest(folder_path, {"generation": 1, "next_id": ntotal, "next_segment": 1, "segments": [name]})
+    logger.info(f"Índice antigo convertido em segmento ({ntotal} vetores)")
+
+class SegmentCompactor:
+    """Executa a compactação de segmentos em uma thread de segundo plano."""
+
+    def __init__(self, enabled: bool = FAISS_COMPACTION_ENABLED):
+        """
+        Inicializa o compactador.
+
+        Args:
+            enabled: Se a compactação automática está ativa
+        """
+        self.enabled = enabled
+        self.thread: Optional[threading.Thread] = None
+        self.pending = threading.Event()
+
+    def schedule(self, store: SegmentedIndex) -> None:
+        """
+        Agenda uma rodada de compactação sem bloquear quem chamou.
+
+        Args:
+            store: Índice segmentado a compactar
+        """
+        if not self.enabled:
+            return
+        self.pending.set()
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, args=(store,), name="faiss-compactor", daemon=True)
+            self.thread.start()
+
+    def _run(self, store: SegmentedIndex) -> None:
+        """Compacta enquanto a política indicar e houver pedidos pendentes."""
+        while self.pending.is_set():
+            self.pending.clear()
+            try:
+                while store.compact():
+                    self.pending.clear()
+            except Exception as e:
+                logger.error(f"Erro na compactação de segmentos: {str(e)}", exc_info=True)
+                return
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Aguarda a rodada de compactação em andamento (usado em testes e ferramentas)."""
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+# Instância global do compactador de segmentos
+segment_compactor = SegmentCompactor()
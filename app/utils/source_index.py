@@ -0,0 +1,152 @@
+"""
+Índice de fontes: mapeia ``metadata["source"]`` para os IDs globais dos vetores.
+
+Cada segmento guarda o mapa das suas fontes (``sources.json``, ao lado de
+``ids.npy``), escrito uma única vez junto com o segmento. O índice de uma
+geração apenas referencia os mapas dos seus segmentos e desconta os
+tombstones na consulta: uma escrita não copia nem regrava o mapa do corpus.
+
+Permite buscas restritas a um conjunto de arquivos (os IDs são traduzidos
+em posições de cada segmento e aplicados como seletor na busca), em vez de
+buscar vizinhos a mais e descartar o que não pertence ao filtro, e a remoção
+ou substituição de todos os chunks de um arquivo.
+"""
+import os
+import json
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+SOURCE_MAP_FILE = "sources.json"
+
+def source_map(documents: Iterable[Any], ids: Iterable[int]) -> Dict[str, np.ndarray]:
+    """
+    Agrupa os IDs de vetores de uma lista de documentos por fonte.
+
+    Args:
+        documents: Documentos, na ordem dos vetores
+        ids: ID global de cada documento
+
+    Retorna:
+        Mapa de fonte para array int64 com os IDs
+    """
+    grouped: Dict[str, List[int]] = {}
+    for doc, vector_id in zip(documents, ids):
+        grouped.setdefault(doc.metadata.get("source", ""), []).append(int(vector_id))
+    return {source: np.array(source_ids, dtype=np.int64) for source, source_ids in grouped.items()}
+
+def write_source_map(folder_path: str, sources: Dict[str, Sequence[int]]) -> None:
+    """
+    Grava o mapa de fontes de um segmento (arquivo temporário + ``os.replace``).
+
+    Args:
+        folder_path: Diretório do segmento
+        sources: Mapa de fonte para IDs globais
+    """
+    path = os.path.join(folder_path, SOURCE_MAP_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({source: [int(vector_id) for vector_id in ids] for source, ids in sources.items()}, f)
+    os.replace(tmp_path, path)
+
+def read_source_map(folder_path: str) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Lê o mapa de fontes de um segmento.
+
+    Args:
+        folder_path: Diretório do segmento
+
+    Retorna:
+        Mapa de fonte para array int64 com os IDs, ou None se o arquivo não existir
+    """
+    path = os.path.join(folder_path, SOURCE_MAP_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {source: np.array(ids, dtype=np.int64) for source, ids in data.items()}
+
+class SourceIndex:
+    """Visão imutável das fontes de uma geração: mapas dos segmentos menos os tombstones."""
+
+    def __init__(self, source_maps: Sequence[Dict[str, np.ndarray]] = (), tombstones: Optional[np.ndarray] = None):
+        """
+        Inicializa o índice de fontes.
+
+        Os mapas são apenas referenciados, nunca copiados ou alterados.
+
+        Args:
+            source_maps: Mapa de fonte para IDs de cada segmento
+            tombstones: IDs globais removidos, ignorados nas consultas
+        """
+        self.source_maps = tuple(source_maps)
+        self.tombstones = np.asarray(tombstones if tombstones is not None else [], dtype=np.int64)
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Any], tombstones: Optional[np.ndarray] = None) -> "SourceIndex":
+        """
+        Monta o índice de fontes a partir dos mapas dos segmentos.
+
+        Args:
+            segments: Segmentos do índice vetorial (com o atributo ``sources``)
+            tombstones: IDs globais removidos
+
+        Retorna:
+            SourceIndex da geração
+        """
+        return cls([segment.sources for segment in segments], tombstones)
+
+    def _live(self, id_arrays: List[np.ndarray]) -> np.ndarray:
+        """Une os arrays de IDs e descarta os removidos."""
+        if not id_arrays:
+            return np.empty(0, dtype=np.int64)
+        ids = np.unique(np.concatenate(id_arrays))
+        if len(self.tombstones):
+            ids = np.setdiff1d(ids, self.tombstones, assume_unique=True)
+        return ids
+
+    def ids_for_sources(self, sources: Iterable[str]) -> np.ndarray:
+        """
+        Retorna os IDs de vetores das fontes informadas (correspondência exata).
+
+        Args:
+            sources: Caminhos de arquivo
+
+        Retorna:
+            Array int64 ordenado com os IDs encontrados
+        """
+        sources = list(sources)
+        return self._live([
+            source_ids[source]
+            for source_ids in self.source_maps
+            for source in sources
+            if source in source_ids
+        ])
+
+    def ids_for_prefixes(self, prefixes: Iterable[str]) -> np.ndarray:
+        """
+        Retorna os IDs de vetores cujas fontes começam com algum dos prefixos.
+
+        Args:
+            prefixes: Caminhos (ou prefixos de caminho) de arquivo
+
+        Retorna:
+            Array int64 ordenado com os IDs encontrados
+        """
+        prefixes = tuple(prefixes)
+        return self._live([
+            ids
+            for source_ids in self.source_maps
+            for source, ids in source_ids.items()
+            if source.startswith(prefixes)
+        ])
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        """
+        Materializa o mapa completo de fonte para IDs não removidos (inspeção e testes).
+
+        Retorna:
+            Mapa de fonte para lista ordenada de IDs; fontes sem vetores são omitidas
+        """
+        sources = sorted({source for source_ids in self.source_maps for source in source_ids})
+        result = {source: self.ids_for_sources([source]).tolist() for source in sources}
+        return {source: ids for source, ids in result.items() if ids}
@@ -1,26 +1,36 @@
 """
 Utilitários de processamento de texto para a aplicação do Assistente AgiFinance.
 """
-import pdfplumber
 import tiktoken
-from typing import List
+import bisect
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
+from app.utils.pdf_extractor import pdf_extractor
+from app.utils.token_splitter import TokenSplitter
 from app.config.settings import logger
 
 # Inicializa o tokenizador para divisão de texto
 tokenizer = tiktoken.get_encoding("cl100k_base")
 
-def extract_text(file_path: str) -> str:
+# Tamanho dos blocos lidos de arquivos de texto puro, em caracteres
+TEXT_BLOCK_CHARS = 64 * 1024
+
+def iter_pages(file_path: str, on_page: Optional[Callable[[int, int], None]] = None) -> Iterator[Tuple[Optional[int], str]]:
     """
-    Extrai texto de um arquivo com base em sua extensão.
+    Lê o texto de um arquivo em partes, sem carregar o documento inteiro.
+    
+    PDFs são entregues página a página (cada página termina com "\n");
+    arquivos de texto, em blocos de ``TEXT_BLOCK_CHARS`` caracteres, sem
+    número de página. As posições de caracteres dos chunks (``start_index``)
+    se referem à concatenação das partes.
     
     Args:
         file_path: Caminho para o arquivo
+        on_page: Função chamada após cada página de PDF com (páginas extraídas, total)
         
     Retorna:
-        Conteúdo de texto extraído
+        Gerador de tuplas (número da página ou None, texto)
     
     Levanta:
         ValueError: Se o formato do arquivo não for suportado
@@ -28,35 +38,83 @@ def extract_text(file_path: str) -> str:
     file_extension = os.path.splitext(file_path)[1].lower()
     
     if file_extension == '.pdf':
-        with pdfplumber.open(file_path) as pdf:
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-            return text
-    elif file_extension == '.txt':
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    elif file_extension == '.md':
+        for number, total, page_text in pdf_extractor.iter_pages(file_path):
+            yield number, page_text + "\n"
+            if on_page:
+                on_page(number, total)
+    elif file_extension in ('.txt', '.md'):
         with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+            while True:
+                block = file.read(TEXT_BLOCK_CHARS)
+                if not block:
+                    break
+                yield None, block
     else:
         raise ValueError(f"Formato de arquivo não suportado: {file_extension}")
 
-def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
+def iter_chunks(
+    parts: Iterable[Tuple[Optional[int], str]],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> Iterator[Document]:
     """
-    Divide o texto em pedaços (chunks) com uma contagem máxima de tokens.
+    Divide um documento em pedaços (chunks) à medida que as páginas chegam.
+    
+    Cada página é codificada uma única vez. Só a janela de texto ainda não
+    emitida fica em memória: após cada página, todos os pedaços completos são
+    entregues e a janela passa a começar no primeiro token ainda não emitido.
+    Cada chunk leva nos metadados a página em que começa (``page``), a posição
+    do seu primeiro caractere no documento (``start_index``) e o número de
+    tokens da janela (``token_count``).
     
     Args:
-        text: Texto a ser dividido
+        parts: Partes do documento como (número da página ou None, texto), ver ``iter_pages``
         chunk_size: Número máximo de tokens por pedaço
         chunk_overlap: Número de tokens sobrepostos entre pedaços
         
     Retorna:
-        Lista de objetos Document
+        Gerador de objetos Document
     """
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    chunks = text_splitter.create_documents([text])
-    return chunks
+    splitter = TokenSplitter(chunk_size, chunk_overlap, tokenizer)
+    window = ""
+    window_start = 0
+    # Posição (em caracteres, na janela) em que começa cada token da janela
+    offsets: List[int] = []
+    # Posição inicial (no documento) e número de cada página presente na janela
+    page_starts: List[int] = []
+    page_numbers: List[Optional[int]] = []
+    
+    def make_chunks(windows: List[Tuple[int, int]]) -> Iterator[Document]:
+        for first, last in windows:
+            piece = splitter.slice(window, offsets, first, last)
+            if piece is None:
+                continue
+            start, content, token_count = piece
+            start += window_start
+            metadata = {"start_index": start, "token_count": token_count}
+            page = page_numbers[bisect.bisect_right(page_starts, start) - 1]
+            if page is not None:
+                metadata["page"] = page
+            yield Document(page_content=content, metadata=metadata)
+    
+    for page, text in parts:
+        page_starts.append(window_start + len(window))
+        page_numbers.append(page)
+        offsets.extend(len(window) + offset for offset in splitter.offsets(text))
+        window += text
+        
+        windows, keep = splitter.spans(window, offsets, final=False)
+        yield from make_chunks(windows)
+        if keep == 0:
+            continue
+        
+        cut = offsets[keep]
+        window = window[cut:]
+        window_start += cut
+        offsets = [offset - cut for offset in offsets[keep:]]
+        while len(page_starts) > 1 and page_starts[1] <= window_start:
+            page_starts.pop(0)
+            page_numbers.pop(0)
+    
+    windows, _ = splitter.spans(window, offsets, final=True)
+    yield from make_chunks(windows)
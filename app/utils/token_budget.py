@@ -0,0 +1,118 @@
+"""
+Agrupamento de documentos em lotes limitados por tokens.
+
+Usado tanto para as requisições de embeddings quanto para o contexto enviado
+ao modelo de chat. Cada documento é contado uma única vez: chunks criados pela
+ingestão já trazem ``token_count`` nos metadados e os demais são codificados
+em paralelo com ``encode_ordinary_batch``.
+"""
+import os
+import tiktoken
+from typing import List, NamedTuple, Optional
+from langchain.docstore.document import Document
+from app.utils.token_splitter import TokenSplitter
+from app.config.settings import logger
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+
+# Threads usadas pelo tiktoken para codificar vários textos de uma vez
+ENCODE_THREADS = min(8, os.cpu_count() or 1)
+
+class TokenBatch(NamedTuple):
+    """Lote de documentos e o total de tokens do lote."""
+    documents: List[Document]
+    tokens: int
+
+def count_tokens(text: str) -> int:
+    """
+    Conta o número de tokens em um texto.
+
+    Args:
+        text: Texto para contar tokens
+
+    Retorna:
+        Número de tokens
+    """
+    return len(tokenizer.encode_ordinary(text))
+
+def count_document_tokens(documents: List[Document]) -> List[int]:
+    """
+    Conta os tokens de cada documento, codificando apenas os que não trazem a contagem.
+
+    Args:
+        documents: Lista de objetos Document
+
+    Retorna:
+        Número de tokens de cada documento, na mesma ordem
+    """
+    counts = [doc.metadata.get("token_count") for doc in documents]
+    missing = [i for i, count in enumerate(counts) if not isinstance(count, int)]
+    if missing:
+        encoded = tokenizer.encode_ordinary_batch([documents[i].page_content for i in missing], num_threads=ENCODE_THREADS)
+        for i, ids in zip(missing, encoded):
+            counts[i] = len(ids)
+    return counts
+
+def split_document(doc: Document, max_tokens: int) -> List[TokenBatch]:
+    """
+    Divide um documento maior que o limite em pedaços de até ``max_tokens`` tokens.
+
+    O texto é codificado uma vez e cortado pelas posições dos tokens, de
+    preferência em quebras de parágrafo, linha ou frase.
+
+    Args:
+        doc: Documento a dividir
+        max_tokens: Número máximo de tokens por pedaço
+
+    Retorna:
+        Um lote por pedaço
+    """
+    splitter = TokenSplitter(chunk_size=max_tokens, chunk_overlap=0, encoding=tokenizer)
+    base = doc.metadata.get("start_index")
+    pieces = []
+    for start, content, tokens in splitter.split(doc.page_content):
+        metadata = doc.metadata.copy()
+        metadata["token_count"] = tokens
+        if isinstance(base, int):
+            metadata["start_index"] = base + start
+        pieces.append(TokenBatch([Document(page_content=content, metadata=metadata)], tokens))
+    return pieces
+
+def pack_by_tokens(documents: List[Document], max_tokens: int, max_documents: Optional[int] = None) -> List[TokenBatch]:
+    """
+    Agrupa documentos, na ordem, em lotes que não excedam o limite de tokens.
+
+    Documentos maiores que o limite são divididos e cada pedaço vira um lote.
+
+    Args:
+        documents: Lista de objetos Document
+        max_tokens: Número máximo de tokens por lote
+        max_documents: Número máximo de documentos por lote (sem limite se None)
+
+    Retorna:
+        Lista de lotes com o total de tokens de cada um
+    """
+    batches = []
+    current_batch = []
+    current_tokens = 0
+
+    for doc, doc_tokens in zip(documents, count_document_tokens(documents)):
+        if doc_tokens > max_tokens:
+            if current_batch:
+                batches.append(TokenBatch(current_batch, current_tokens))
+                current_batch = []
+                current_tokens = 0
+            logger.warning(f"Documento muito grande ({doc_tokens} tokens). Dividindo em chunks menores.")
+            batches.extend(split_document(doc, max_tokens))
+        elif current_tokens + doc_tokens > max_tokens or (max_documents and len(current_batch) >= max_documents):
+            batches.append(TokenBatch(current_batch, current_tokens))
+            current_batch = [doc]
+            current_tokens = doc_tokens
+        else:
+            current_batch.append(doc)
+            current_tokens += doc_tokens
+
+    if current_batch:
+        batches.append(TokenBatch(current_batch, current_tokens))
+
+    return batches
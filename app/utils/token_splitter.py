@@ -0,0 +1,189 @@
+"""
+Divisão de texto em pedaços medidos em tokens.
+
+O texto é codificado uma única vez; as janelas de ``chunk_size`` tokens
+deslizam sobre as posições dos tokens e os limites são ajustados para quebras
+de parágrafo, linha ou frase. Só o texto dos pedaços finais é recortado.
+"""
+import re
+import bisect
+import threading
+import tiktoken
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# Quebras em que um pedaço pode terminar, da mais forte para a mais fraca
+BREAK_PATTERNS = (
+    (3, re.compile(r"\n[ \t]*\n")),
+    (2, re.compile(r"\n")),
+    (1, re.compile(r"[.!?;:…][\"'”»)\]]*(?=\s)")),
+)
+
+# Tamanho em bytes de cada token do vocabulário, por tokenizador
+_token_lengths: Dict[str, np.ndarray] = {}
+_token_lengths_lock = threading.Lock()
+
+def token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """
+    Retorna o tamanho em bytes de cada token do vocabulário (calculado uma vez por tokenizador).
+
+    Args:
+        encoding: Tokenizador
+
+    Retorna:
+        Vetor indexado pelo ID do token
+    """
+    with _token_lengths_lock:
+        lengths = _token_lengths.get(encoding.name)
+        if lengths is None:
+            lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+            for token in range(encoding.n_vocab):
+                try:
+                    lengths[token] = len(encoding.decode_single_token_bytes(token))
+                except KeyError:
+                    pass
+            _token_lengths[encoding.name] = lengths
+        return lengths
+
+class TokenSplitter:
+    """Divide texto em janelas de tokens com sobreposição, preferindo quebras naturais."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, encoding: Optional[tiktoken.Encoding] = None):
+        """
+        Inicializa o divisor.
+
+        Args:
+            chunk_size: Número máximo de tokens por pedaço
+            chunk_overlap: Número de tokens repetidos no início do pedaço seguinte
+            encoding: Tokenizador (padrão ``cl100k_base``)
+
+        Levanta:
+            ValueError: Se a sobreposição não for menor que o tamanho do pedaço
+        """
+        if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap deve ser menor que chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = encoding or tiktoken.get_encoding("cl100k_base")
+
+    def offsets(self, text: str) -> List[int]:
+        """
+        Codifica o texto e retorna a posição (em caracteres) em que cada token começa.
+
+        Args:
+            text: Texto a codificar
+
+        Retorna:
+            Lista com um deslocamento por token
+        """
+        ids = self.encoding.encode_ordinary(text)
+        if not ids:
+            return []
+        # Posição em bytes de cada token, convertida para caracteres descontando
+        # os bytes de continuação UTF-8 (um token no meio de um caractere aponta para ele)
+        byte_offsets = np.zeros(len(ids), dtype=np.int64)
+        np.cumsum(token_byte_lengths(self.encoding)[ids[:-1]], out=byte_offsets[1:])
+        data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        continuation = np.cumsum((data & 0xC0) == 0x80)
+        return (byte_offsets - continuation[byte_offsets]).tolist()
+
+    def _levels(self, text: str, offsets: List[int]) -> List[int]:
+        """Calcula a força da quebra antes de cada token (0 = sem quebra)."""
+        levels = [0] * (len(offsets) + 1)
+        for level, pattern in BREAK_PATTERNS:
+            for match in pattern.finditer(text):
+                position = bisect.bisect_left(offsets, match.end())
+                if levels[position] < level:
+                    levels[position] = level
+        return levels
+
+    def _end(self, levels: List[int], start: int) -> int:
+        """Escolhe o fim de um pedaço: a quebra mais forte e mais tardia da segunda metade da janela."""
+        limit = start + self.chunk_size
+        best, best_level = limit, 0
+        for position in range(limit, start + max(self.chunk_size // 2, 1), -1):
+            if levels[position] > best_level:
+                best, best_level = position, levels[position]
+                if best_level == BREAK_PATTERNS[0][0]:
+                    break
+        return best
+
+    def _next_start(self, levels: List[int], start: int, end: int) -> int:
+        """Escolhe o início do próximo pedaço: a quebra mais forte e mais cedo da sobreposição."""
+        if self.chunk_overlap == 0:
+            return end
+        first = max(end - self.chunk_overlap, start + 1)
+        best, best_level = first, 0
+        for position in range(first, end):
+            if levels[position] > best_level:
+                best, best_level = position, levels[position]
+        return best
+
+    def spans(self, text: str, offsets: List[int], final: bool = True) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Calcula as janelas de tokens de um texto já codificado.
+
+        Args:
+            text: Texto codificado
+            offsets: Deslocamentos dos tokens, como retornados por ``offsets``
+            final: Se o texto termina aqui; senão, a última janela incompleta
+                fica para quando chegar mais texto
+
+        Retorna:
+            Tupla (lista de janelas (token inicial, token final exclusivo),
+            primeiro token ainda não emitido)
+        """
+        total = len(offsets)
+        levels = self._levels(text, offsets)
+        windows = []
+        start = 0
+        while start < total:
+            if start + self.chunk_size >= total:
+                if not final:
+                    break
+                windows.append((start, total))
+                start = total
+                break
+            end = self._end(levels, start)
+            windows.append((start, end))
+            start = self._next_start(levels, start, end)
+        return windows, start
+
+    def split(self, text: str) -> List[Tuple[int, str, int]]:
+        """
+        Divide um texto completo.
+
+        Args:
+            text: Texto a dividir
+
+        Retorna:
+            Lista de tuplas (posição do primeiro caractere, texto do pedaço, número de tokens)
+        """
+        offsets = self.offsets(text)
+        windows, _ = self.spans(text, offsets)
+        pieces = []
+        for start, end in windows:
+            piece = self.slice(text, offsets, start, end)
+            if piece is not None:
+                pieces.append(piece)
+        return pieces
+
+    @staticmethod
+    def slice(text: str, offsets: List[int], start: int, end: int) -> Optional[Tuple[int, str, int]]:
+        """
+        Recorta o texto de uma janela de tokens, sem espaços nas pontas.
+
+        Args:
+            text: Texto codificado
+            offsets: Deslocamentos dos tokens
+            start: Primeiro token da janela
+            end: Token final (exclusivo)
+
+        Retorna:
+            Tupla (posição do primeiro caractere, texto, número de tokens) ou None se a janela só tiver espaços
+        """
+        raw = text[offsets[start]:offsets[end] if end < len(offsets) else len(text)]
+        content = raw.strip()
+        if not content:
+            return None
+        return offsets[start] + len(raw) - len(raw.lstrip()), content, end - start
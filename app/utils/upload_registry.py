@@ -0,0 +1,104 @@
+"""
+Registro dos arquivos indexados pelo hash SHA-256 do conteúdo, persistido em SQLite.
+
+Permite reconhecer um arquivo já indexado (com qualquer nome) antes de
+extrair o texto ou calcular embeddings.
+"""
+import os
+import time
+import sqlite3
+import threading
+from typing import Optional
+from app.config.settings import UPLOAD_REGISTRY_PATH, logger
+
+class UploadRegistry:
+    """Mapa de nome de arquivo para o hash do conteúdo indexado."""
+
+    def __init__(self, path: str):
+        """
+        Inicializa o registro.
+
+        Args:
+            path: Caminho do arquivo SQLite
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre (e cria, se necessário) o banco SQLite na primeira utilização."""
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "filename TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, indexed_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS uploads_sha256 ON uploads (sha256)")
+        return self.connection
+
+    def find(self, sha256: str) -> Optional[str]:
+        """
+        Procura um arquivo indexado com o mesmo conteúdo.
+
+        Args:
+            sha256: Hash SHA-256 do conteúdo (hexadecimal)
+
+        Retorna:
+            Nome do arquivo ou None se o conteúdo ainda não foi indexado
+        """
+        try:
+            with self.lock:
+                row = self._connect().execute(
+                    "SELECT filename FROM uploads WHERE sha256 = ? ORDER BY indexed_at DESC LIMIT 1", (sha256,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Registro de uploads indisponível: {str(e)}")
+            return None
+        return row[0] if row else None
+
+    def record(self, filename: str, sha256: str, size: int) -> None:
+        """
+        Registra o conteúdo indexado de um arquivo, substituindo o registro anterior do mesmo nome.
+
+        Args:
+            filename: Nome do arquivo
+            sha256: Hash SHA-256 do conteúdo (hexadecimal)
+            size: Tamanho em bytes
+        """
+        try:
+            with self.lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO uploads (filename, sha256, size, indexed_at) VALUES (?, ?, ?, ?)",
+                        (filename, sha256, size, time.time())
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Erro ao registrar upload {filename}: {str(e)}")
+
+    def remove(self, filename: str) -> None:
+        """
+        Remove o registro de um arquivo.
+
+        Args:
+            filename: Nome do arquivo
+        """
+        try:
+            with self.lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute("DELETE FROM uploads WHERE filename = ?", (filename,))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Erro ao remover registro do upload {filename}: {str(e)}")
+
+    def close(self) -> None:
+        """Fecha a conexão com o banco SQLite."""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+# Instância global do registro de uploads
+upload_registry = UploadRegistry(UPLOAD_REGISTRY_PATH)
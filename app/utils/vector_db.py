@@ -2,148 +2,154 @@
 Utilitários de banco de dados vetorial para a aplicação do Assistente AgiFinance.
 """
 import os
+import time
+import heapq
+import asyncio
+import resource
+import threading
 import numpy as np
-import tiktoken
-from typing import List, Optional, Any
+from itertools import chain
+from typing import Callable, List, Optional, Any, Tuple
 from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
-from app.config.settings import OPENAI_API_KEY, FAISS_INDEX_PATH, EMBEDDINGS_MODEL, logger
+from app.config.settings import (
+    OPENAI_API_KEY,
+    OPENAI_API_BASE,
+    FAISS_INDEX_PATH,
+    EMBEDDINGS_MODEL,
+    FAISS_RERANK_FACTOR,
+    FAISS_INDEX_MMAP,
+    EMBEDDING_REQUEST_MAX_TOKENS,
+    logger
+)
+from app.utils.retrieval_executor import retrieval_executor
+from app.utils.embedding_cache import query_embedding_cache
+from app.utils.index_factory import search_params, describe_index
+from app.utils.index_reload import index_reloader
+from app.utils.index_writer import index_writer
+from app.utils.token_budget import TokenBatch, pack_by_tokens
+from app.utils.embedding_pipeline import embedding_pipeline
+from app.utils.segments import MANIFEST_FILE, IndexSnapshot, Segment, SegmentedIndex, segment_compactor
 
 embeddings_model = OpenAIEmbeddings(
     model=EMBEDDINGS_MODEL,
-    openai_api_key=OPENAI_API_KEY
+    openai_api_key=OPENAI_API_KEY,
+    openai_api_base=OPENAI_API_BASE
 )
 
-tokenizer = tiktoken.get_encoding("cl100k_base")
+# Cliente da ingestão sem novas tentativas internas: o pipeline de embeddings
+# controla limites, 429 e backoff
+document_embeddings_model = OpenAIEmbeddings(
+    model=EMBEDDINGS_MODEL,
+    openai_api_key=OPENAI_API_KEY,
+    openai_api_base=OPENAI_API_BASE,
+    max_retries=0
+)
 
-vector_db = None
+# Índice segmentado global (None até o primeiro documento ser adicionado)
+vector_db: Optional[SegmentedIndex] = None
+# Protege a atribuição do índice global (primeira carga, recarga e primeira ingestão)
+_vector_db_lock = threading.Lock()
 
-def count_tokens(text: str) -> int:
-    """
-    Conta o número de tokens em um texto.
-    
-    Args:
-        text: Texto para contar tokens
-        
-    Retorna:
-        Número de tokens
-    """
-    tokens = tokenizer.encode(text)
-    return len(tokens)
+def _resident_memory_mb() -> float:
+    """Retorna a memória residente do processo em MB (pico, fora do Linux)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-def batch_documents_by_tokens(documents: List[Document], max_tokens_per_batch: int = 250000) -> List[List[Document]]:
+def load_vector_db() -> Optional[SegmentedIndex]:
     """
-    Divide documentos em lotes com base na contagem de tokens.
+    Carrega o banco de dados vetorial (segmentos e manifesto) do disco.
+    
+    Com FAISS_INDEX_MMAP ativo, os segmentos são mapeados em memória (somente leitura).
+    O tempo de carga e a memória residente são registrados no log.
     
-    Args:
-        documents: Lista de objetos Document
-        max_tokens_per_batch: Máximo de tokens por lote
-        
     Retorna:
-        Lista de lotes de documentos
+        Índice segmentado ou None se não for encontrado
     """
-    batches = []
-    current_batch = []
-    current_batch_tokens = 0
+    if not os.path.exists(FAISS_INDEX_PATH):
+        logger.info(f"Diretório {FAISS_INDEX_PATH} não encontrado. Criando...")
+        os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
+        return None
     
-    for doc in documents:
-        doc_tokens = count_tokens(doc.page_content)
+    try:
+        start = time.perf_counter()
+        rss_before = _resident_memory_mb()
         
-        if doc_tokens > max_tokens_per_batch:
-            if current_batch:
-                batches.append(current_batch)
-                current_batch = []
-                current_batch_tokens = 0
-            
-            logger.warning(f"Documento muito grande ({doc_tokens} tokens). Dividindo em chunks menores.")
-            text = doc.page_content
-            chunks = []
-            start = 0
-            
-            while start < len(text):
-                end = start + 1000
-                if end > len(text):
-                    end = len(text)
-                
-                chunk = text[start:end]
-                chunk_tokens = count_tokens(chunk)
-                
-                while chunk_tokens > max_tokens_per_batch and end > start + 100:
-                    end = start + int((end - start) * 0.8)  # Reduz por 20%
-                    chunk = text[start:end]
-                    chunk_tokens = count_tokens(chunk)
-                
-                chunk_doc = Document(
-                    page_content=chunk,
-                    metadata=doc.metadata.copy()
-                )
-                chunks.append(chunk_doc)
-                
-                start = end
-            
-            for chunk_doc in chunks:
-                batches.append([chunk_doc])
+        store = SegmentedIndex.load(FAISS_INDEX_PATH, mmap=FAISS_INDEX_MMAP)
+        if store is None:
+            logger.info(f"Nenhum índice encontrado em {FAISS_INDEX_PATH}")
+            return None
         
-        elif current_batch_tokens + doc_tokens > max_tokens_per_batch:
-            batches.append(current_batch)
-            current_batch = [doc]
-            current_batch_tokens = doc_tokens
+        store.on_commit = index_reloader.publish
+        rss_after = _resident_memory_mb()
+        kinds = ", ".join(describe_index(segment.index) for segment in store.segments)
+        logger.info(
+            f"Banco de dados de vetores carregado de {FAISS_INDEX_PATH} em {time.perf_counter() - start:.2f}s "
+            f"({'mapeado em memória' if FAISS_INDEX_MMAP else 'em memória'}): {len(store.segments)} segmentos [{kinds}], "
+            f"memória residente +{rss_after - rss_before:.1f} MB (total {rss_after:.1f} MB)"
+        )
         
-        else:
-            current_batch.append(doc)
-            current_batch_tokens += doc_tokens
-    
-    if current_batch:
-        batches.append(current_batch)
-    
-    return batches
+        segment_compactor.schedule(store)
+        return store
+    except Exception as e:
+        logger.error(f"Erro ao carregar banco de dados de vetores: {str(e)}")
+        return None
 
-def create_vector_db(documents: List[Document]) -> FAISS:
+def get_vector_db() -> Optional[SegmentedIndex]:
     """
-    Cria um banco de dados vetorial FAISS a partir de documentos.
+    Retorna o banco de dados vetorial global, carregando-o do disco na primeira chamada.
     
-    Args:
-        documents: Lista de objetos Document
-        
     Retorna:
-        Banco de dados vetorial FAISS
-    """
-    db = FAISS.from_documents(documents, embeddings_model)
-    return db
-
-def save_vector_db(db: FAISS) -> None:
+        Índice segmentado ou None se ainda não houver índice
     """
-    Salva o banco de dados vetorial no disco.
+    global vector_db
     
-    Args:
-        db: Banco de dados vetorial FAISS
-    """
-    os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
-    db.save_local(FAISS_INDEX_PATH)
-    logger.info(f"Banco de dados de vetores salvo em {FAISS_INDEX_PATH}")
+    if vector_db is None:
+        with _vector_db_lock:
+            if vector_db is None:
+                vector_db = load_vector_db()
+    return vector_db
 
-def load_vector_db() -> Optional[FAISS]:
+def reload_vector_db() -> bool:
     """
-    Carrega o banco de dados vetorial do disco.
-    
+    Passa a servir a geração mais nova do índice gravada por qualquer worker.
+
+    Chamado pela thread de recarga a cada geração anunciada no Redis (ou a cada
+    verificação periódica). Os segmentos já carregados são reaproveitados e as
+    buscas em andamento continuam na geração anterior.
+
     Retorna:
-        Banco de dados vetorial FAISS ou None se não for encontrado
+        True se o índice servido por este processo mudou
     """
     global vector_db
     
-    if not os.path.exists(FAISS_INDEX_PATH):
-        logger.info(f"Diretório {FAISS_INDEX_PATH} não encontrado. Criando...")
-        os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
-        return None
+    if vector_db is None:
+        if not os.path.exists(os.path.join(FAISS_INDEX_PATH, MANIFEST_FILE)):
+            return False
+        with _vector_db_lock:
+            if vector_db is None:
+                vector_db = load_vector_db()
+                return vector_db is not None
     
-    try:
-        db = FAISS.load_local(FAISS_INDEX_PATH, embeddings_model)
-        logger.info(f"Banco de dados de vetores carregado de {FAISS_INDEX_PATH}")
-        return db
-    except Exception as e:
-        logger.error(f"Erro ao carregar banco de dados de vetores: {str(e)}")
-        return None
+    return vector_db.refresh(mmap=FAISS_INDEX_MMAP)
+
+async def embed_question(question: str) -> np.ndarray:
+    """
+    Retorna o embedding de uma pergunta, passando pelo cache de embeddings de perguntas.
+    
+    Args:
+        question: Pergunta do usuário
+        
+    Retorna:
+        Embedding da pergunta como array float32
+    """
+    return await query_embedding_cache.get_or_embed(question, embeddings_model.aembed_query)
 
 async def query_vector_db(question: str, top_k: int = 5, file_paths: List[str] = []) -> List[Document]:
     """
@@ -160,71 +166,210 @@ async def query_vector_db(question: str, top_k: int = 5, file_paths: List[str] =
     Levanta:
         ValueError: Se o banco de dados vetorial não estiver carregado
     """
-    global vector_db
+    store = get_vector_db()
+    if store is None:
+        raise ValueError("Banco de dados de vetores não carregado. Adicione documentos primeiro.")
     
-    if vector_db is None:
-        vector_db = load_vector_db()
-        if vector_db is None:
-            raise ValueError("Banco de dados de vetores não carregado. Adicione documentos primeiro.")
+    query_embedding = await embed_question(question)
+    
+    # Toda a consulta usa a mesma geração, mesmo que uma escrita publique outra no meio
+    snapshot = store.snapshot
     
     # Consulta simples se não houver filtro de arquivos
     if not file_paths:
-        docs = vector_db.similarity_search(question, k=top_k)
-        return docs
+        return await search_by_vector(snapshot, query_embedding, top_k, group="all")
+    
+    # Busca restrita aos vetores das fontes solicitadas, sem descartar resultados depois
+    ids = snapshot.sources.ids_for_prefixes(file_paths)
+    if len(ids) == 0:
+        logger.info(f"Nenhum vetor encontrado para os arquivos: {file_paths}")
+        return []
+    
+    return await search_by_vector(snapshot, query_embedding, top_k, ids=ids, group=tuple(sorted(file_paths)))
+
+async def _search_segment(segment: Segment, vector: np.ndarray, k: int, ids: Optional[np.ndarray], group: Any) -> List[Tuple[float, Segment, int]]:
+    """Busca os k vizinhos em um segmento, retornando (distância, segmento, posição)."""
+    if segment.live == 0:
+        return []
+    
+    positions = None
+    if ids is not None:
+        positions = np.setdiff1d(segment.positions_for(ids), segment.deleted, assume_unique=True)
+        if len(positions) == 0:
+            return []
+    
+    # Índices comprimidos buscam mais candidatos, reordenados com as distâncias exatas
+    rerank_file = segment.rerank_file
+    search_k = k * FAISS_RERANK_FACTOR if rerank_file is not None else k
+    params = search_params(segment.index, positions, segment.deleted)
+    distances, labels = await retrieval_executor.search(segment.index, vector, search_k, params=params, group=group)
+    if rerank_file is not None:
+        distances, labels = await retrieval_executor.run(rerank_file.rerank, vector, labels, k)
+    
+    # Rótulo -1 acontece quando o segmento tem menos de k vetores
+    return [(float(distance), segment, int(label)) for distance, label in zip(distances, labels) if label != -1]
+
+async def search_by_vector(snapshot: IndexSnapshot, embedding: np.ndarray, k: int, ids: Optional[np.ndarray] = None, group: Any = None) -> List[Document]:
+    """
+    Busca os documentos mais próximos de um embedding sem bloquear o event loop.
+    
+    Cada segmento é consultado pelo executor de recuperação (que agrupa consultas
+    concorrentes em uma única chamada ao índice) e os resultados são unidos
+    pela distância.
+    
+    Args:
+        snapshot: Geração do índice a consultar (``SegmentedIndex.snapshot``)
+        embedding: Embedding da consulta
+        k: Número de documentos a retornar
+        ids: IDs globais permitidos (busca restrita) ou None para buscar em tudo
+        group: Chave para agrupar consultas com parâmetros equivalentes
+        
+    Retorna:
+        Lista de objetos Document ordenados por similaridade, com o ID global
+        do chunk em ``metadata["chunk_id"]`` e a geração do conteúdo do índice
+        consultado em ``metadata["index_generation"]``
+    """
+    vector = np.array(embedding, dtype=np.float32)
+    results = await asyncio.gather(*(_search_segment(segment, vector, k, ids, group) for segment in snapshot.segments))
+    
+    docs = []
+    for _, segment, position in heapq.nsmallest(k, chain.from_iterable(results), key=lambda hit: hit[0]):
+        doc = segment.document(position)
+        if doc is not None:
+            # IDs globais nunca são reutilizados: identificam o chunk entre gerações
+            doc.metadata["chunk_id"] = int(segment.ids[position])
+            doc.metadata["index_generation"] = snapshot.content_generation
+            docs.append(doc)
+    
+    return docs
+
+def _get_or_create_store() -> SegmentedIndex:
+    """Retorna o índice global, criando um vazio na primeira ingestão."""
+    global vector_db
     
-    filter_function = lambda doc: any(doc.metadata.get("source", "").startswith(file_path) for file_path in file_paths)
+    store = get_vector_db()
+    if store is None:
+        with _vector_db_lock:
+            if vector_db is None:
+                vector_db = SegmentedIndex(FAISS_INDEX_PATH, [])
+                vector_db.on_commit = index_reloader.publish
+                logger.info("Novo banco de dados de vetores criado")
+            store = vector_db
+    return store
+
+def _write_batch(documents: List[Document], embeddings: List[List[float]]) -> np.ndarray:
+    """Grava um lote como segmento novo e retorna seus IDs; executado apenas pelo escritor do índice."""
+    return _get_or_create_store().add(documents, embeddings).ids
+
+def _finish_write(sources: List[str], keep_ids: np.ndarray) -> None:
+    """
+    Remove a versão anterior das fontes e agenda a compactação; executado apenas pelo escritor do índice.
     
-    search_k = top_k * 4  # Buscar mais documentos para ter margem após o filtro
-    docs = vector_db.similarity_search(question, k=search_k)
+    Args:
+        sources: Fontes substituídas (vazio se nada deve ser removido)
+        keep_ids: IDs gravados por esta ingestão, que não são removidos
+    """
+    store = get_vector_db()
+    if store is None:
+        return
     
-    filtered_docs = [doc for doc in docs if filter_function(doc)]
+    if sources:
+        stale_ids = np.setdiff1d(store.sources.ids_for_sources(sources), keep_ids)
+        if len(stale_ids) > 0:
+            removed = store.delete_ids(stale_ids)
+            logger.info(f"Versão anterior substituída: {removed} vetores removidos de {sources}")
     
-    return filtered_docs[:top_k]
+    segment_compactor.schedule(store)
+
+def _discard_ids(ids: np.ndarray) -> None:
+    """Remove os vetores de uma ingestão que falhou; executado apenas pelo escritor do índice."""
+    store = get_vector_db()
+    if store is not None and len(ids) > 0:
+        store.delete_ids(ids)
+        segment_compactor.schedule(store)
 
-def add_documents_to_vector_db(documents: List[Document]) -> None:
+async def add_documents_to_vector_db(
+    documents: List[Document],
+    replace: bool = False,
+    on_progress: Optional[Callable[..., None]] = None
+) -> None:
     """
     Adiciona documentos ao banco de dados vetorial.
     
+    Os embeddings são calculados pelo pipeline de embeddings, com várias
+    requisições em andamento dentro dos limites da API. Cada lote pronto vira
+    um segmento novo, gravado pelo escritor único do índice enquanto os
+    lotes seguintes ainda estão sendo calculados. A versão anterior das
+    fontes só é removida depois que todos os lotes foram gravados; se a
+    ingestão falhar, os lotes já gravados são removidos.
+    
     Args:
         documents: Lista de objetos Document
+        replace: Se os vetores anteriores das mesmas fontes devem ser removidos
+            depois que os novos estiverem gravados
+        on_progress: Função chamada com os campos de progresso (status, chunks_embedded...)
     """
-    global vector_db
+    progress = on_progress or (lambda **fields: None)
+    # Gravações enviadas ao escritor; concluem mesmo se a ingestão for cancelada
+    writes: List[asyncio.Future] = []
+    chunks_embedded = 0
+    
+    async def write_batch(batch: TokenBatch, embeddings: List[List[float]]) -> None:
+        nonlocal chunks_embedded
+        chunks_embedded += len(batch.documents)
+        progress(chunks_embedded=chunks_embedded)
+        write = asyncio.ensure_future(index_writer.submit(_write_batch, batch.documents, embeddings))
+        writes.append(write)
+        await asyncio.shield(write)
+    
+    async def written_ids() -> np.ndarray:
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        ids = [result for result in results if isinstance(result, np.ndarray)]
+        return np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
     
     try:
-        if vector_db is None:
-            vector_db = load_vector_db()
-        
-        total_tokens = sum(count_tokens(doc.page_content) for doc in documents)
-        logger.info(f"Total de tokens em todos os documentos: {total_tokens}")
-        
-        MAX_TOKENS_PER_BATCH = 250000  # Limite seguro abaixo do máximo de 300.000
-        
-        if total_tokens > MAX_TOKENS_PER_BATCH:
-            batches = batch_documents_by_tokens(documents, MAX_TOKENS_PER_BATCH)
-            logger.info(f"Documentos divididos em {len(batches)} lotes devido ao tamanho")
-            
-            for i, batch in enumerate(batches):
-                batch_tokens = sum(count_tokens(doc.page_content) for doc in batch)
-                logger.info(f"Processando lote {i+1}/{len(batches)} com {len(batch)} documentos ({batch_tokens} tokens)")
-                
-                if vector_db is None:
-                    vector_db = create_vector_db(batch)
-                    logger.info(f"Novo banco de dados de vetores criado com {len(batch)} documentos")
-                else:
-                    vector_db.add_documents(batch)
-                    logger.info(f"{len(batch)} documentos adicionados ao banco de dados de vetores existente")
-                
-                save_vector_db(vector_db)
-        else:
-            if vector_db is None:
-                vector_db = create_vector_db(documents)
-                logger.info(f"Novo banco de dados de vetores criado com {len(documents)} documentos")
-            else:
-                vector_db.add_documents(documents)
-                logger.info(f"{len(documents)} documentos adicionados ao banco de dados de vetores existente")
-            
-            save_vector_db(vector_db)
+        progress(status="embedding", chunks_total=len(documents), chunks_embedded=0)
+        # Mesmo tamanho das requisições do cliente de embeddings: cada lote é uma requisição
+        request_size = getattr(document_embeddings_model, "chunk_size", 1000)
+        batches = pack_by_tokens(documents, EMBEDDING_REQUEST_MAX_TOKENS, request_size)
+        logger.info(
+            f"Total de tokens em todos os documentos: {sum(batch.tokens for batch in batches)} "
+            f"({len(batches)} requisições de embeddings)"
+        )
+        await embedding_pipeline.run(batches, document_embeddings_model.embed_documents, write_batch)
         
+        progress(status="indexing")
+        sources = sorted({doc.metadata.get("source", "") for doc in documents}) if replace else []
+        await index_writer.submit(_finish_write, sources, await written_ids())
     except Exception as e:
         logger.error(f"Erro ao adicionar documentos ao banco de dados de vetores: {str(e)}")
+        try:
+            await index_writer.submit(_discard_ids, await written_ids())
+        except Exception as cleanup_error:
+            logger.error(f"Erro ao remover os lotes já gravados: {str(cleanup_error)}")
         raise
+
+def _delete_source(source: str) -> int:
+    """Remove os vetores de uma fonte; executado apenas pelo escritor do índice."""
+    store = get_vector_db()
+    if store is None:
+        return 0
+    
+    removed = store.delete_sources([source])
+    if removed:
+        segment_compactor.schedule(store)
+    return removed
+
+async def delete_documents_from_vector_db(source: str) -> int:
+    """
+    Remove todos os vetores de uma fonte, sem reconstruir o índice.
+    
+    A remoção passa pelo escritor único do índice, depois das escritas já enfileiradas.
+    
+    Args:
+        source: Valor de ``metadata["source"]`` (caminho do arquivo enviado)
+        
+    Retorna:
+        Número de vetores removidos
+    """
+    return await index_writer.submit(_delete_source, source)
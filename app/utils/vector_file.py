@@ -0,0 +1,230 @@
+"""
+Arquivo lateral com os vetores em precisão total (float32), mapeado em memória.
+
+Quando o índice FAISS armazena vetores comprimidos (float16, int8 ou PQ),
+os melhores candidatos são reordenados com as distâncias exatas calculadas
+a partir deste arquivo. A linha ``i`` do arquivo corresponde ao vetor ``i`` do índice.
+
+Também serve de armazenamento para buscas planas (L2) feitas diretamente
+sobre o arquivo mapeado, sem copiar os vetores para a memória do processo.
+"""
+import os
+import faiss
+import hashlib
+import numpy as np
+from typing import NamedTuple, Optional, Tuple
+
+VECTOR_FILE = "vectors.f32"
+
+# Linhas por bloco na busca plana que ignora posições removidas
+SEARCH_BLOCK_ROWS = 65536
+
+class VectorFile:
+    """Matriz float32 persistida em disco e lida via ``np.memmap``."""
+
+    def __init__(self, folder_path: str, dim: int):
+        """
+        Inicializa o arquivo de vetores.
+
+        Args:
+            folder_path: Diretório do índice vetorial
+            dim: Dimensão dos vetores
+        """
+        self.path = os.path.join(folder_path, VECTOR_FILE)
+        self.dim = dim
+        self._matrix: Optional[np.memmap] = None
+
+    @classmethod
+    def open(cls, folder_path: str, dim: int) -> Optional["VectorFile"]:
+        """
+        Abre um arquivo de vetores existente.
+
+        Args:
+            folder_path: Diretório do índice vetorial
+            dim: Dimensão dos vetores
+
+        Retorna:
+            VectorFile ou None se o arquivo não existir
+        """
+        if not os.path.exists(os.path.join(folder_path, VECTOR_FILE)):
+            return None
+        return cls(folder_path, dim)
+
+    @classmethod
+    def create(cls, folder_path: str, dim: int) -> "VectorFile":
+        """
+        Cria um arquivo de vetores vazio, descartando um arquivo anterior.
+
+        Args:
+            folder_path: Diretório do índice vetorial
+            dim: Dimensão dos vetores
+
+        Retorna:
+            VectorFile vazio
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        vector_file = cls(folder_path, dim)
+        open(vector_file.path, "wb").close()
+        return vector_file
+
+    def __len__(self) -> int:
+        return os.path.getsize(self.path) // (self.dim * 4)
+
+    def append(self, vectors: np.ndarray) -> None:
+        """
+        Acrescenta vetores ao final do arquivo.
+
+        Args:
+            vectors: Matriz (n, dim) de vetores na ordem em que entraram no índice
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with open(self.path, "ab") as f:
+            f.write(vectors.tobytes())
+        self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        """
+        Retorna a matriz de vetores mapeada em memória (somente leitura).
+
+        Retorna:
+            np.memmap com shape (n, dim)
+        """
+        rows = len(self)
+        if rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def rerank(self, query: np.ndarray, labels: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reordena candidatos pela distância L2 exata em relação à consulta.
+
+        Args:
+            query: Vetor de consulta
+            labels: IDs dos candidatos retornados pelo índice comprimido (-1 é ignorado)
+            k: Número de resultados a manter
+
+        Retorna:
+            Tupla (distâncias exatas, rótulos) com até k posições
+        """
+        matrix = self.matrix()
+        # Linhas ordenadas tornam a leitura do memmap sequencial
+        labels = np.sort(labels[(labels >= 0) & (labels < matrix.shape[0])])
+        if len(labels) == 0:
+            return np.empty(0, dtype=np.float32), labels
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        candidates = np.asarray(matrix[labels])
+
+        # ||x - q||² = ||x||² - 2·x·q + ||q||², calculado de uma vez para todos os candidatos
+        distances = np.einsum("ij,ij->i", candidates, candidates) - 2 * candidates @ query + query @ query
+        order = np.argsort(distances, kind="stable")[:k]
+        return distances[order], labels[order]
+
+def array_key(values: Optional[np.ndarray]) -> Optional[bytes]:
+    """Resumo do conteúdo de um array de IDs, para comparar parâmetros de busca por valor."""
+    if values is None:
+        return None
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.int64).tobytes(), digest_size=16).digest()
+
+class FlatSearchParams(NamedTuple):
+    """Parâmetros de busca do MmapFlatIndex (equivalente ao IDSelector do FAISS)."""
+    ids: Optional[np.ndarray] = None  # Únicas posições permitidas
+    excluded: Optional[np.ndarray] = None  # Posições removidas (ignoradas na busca)
+
+    @property
+    def key(self) -> Tuple[str, Optional[bytes], Optional[bytes]]:
+        """Identidade por valor: parâmetros com as mesmas posições podem ser usados na mesma busca em lote."""
+        return ("flat", array_key(self.ids), array_key(self.excluded))
+
+class MmapFlatIndex:
+    """
+    Índice plano L2 somente leitura sobre um VectorFile mapeado em memória.
+
+    Expõe a parte da interface de ``faiss.Index`` usada pela aplicação
+    (``d``, ``ntotal`` e ``search``). As páginas do arquivo ficam no page cache
+    e são compartilhadas entre os processos workers. O arquivo não deve crescer
+    depois de criado o índice (os segmentos são imutáveis).
+    """
+
+    def __init__(self, vector_file: VectorFile):
+        """
+        Inicializa o índice.
+
+        Args:
+            vector_file: Arquivo de vetores em precisão total
+        """
+        self.vector_file = vector_file
+        self.d = vector_file.dim
+        self.matrix = vector_file.matrix()
+        self.block_rows = SEARCH_BLOCK_ROWS
+
+    @property
+    def ntotal(self) -> int:
+        return self.matrix.shape[0]
+
+    def search(self, x: np.ndarray, k: int, params: Optional[FlatSearchParams] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca os k vizinhos mais próximos de cada consulta.
+
+        Args:
+            x: Matriz (n, d) de consultas
+            k: Número de vizinhos
+            params: Posições permitidas ou removidas, ou None para buscar em todos os vetores
+
+        Retorna:
+            Tupla (distâncias, rótulos) com shape (n, k); posições vazias têm rótulo -1
+        """
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        matrix = self.matrix
+        if params is None or (params.ids is None and params.excluded is None):
+            return faiss.knn(x, matrix, k)
+
+        if params.ids is not None:
+            # Busca restrita: copia apenas as linhas permitidas
+            ids = np.asarray(params.ids, dtype=np.int64)
+            ids = ids[ids < matrix.shape[0]]
+            distances, labels = faiss.knn(x, np.ascontiguousarray(matrix[ids]), k)
+            return distances, np.where(labels >= 0, ids[np.clip(labels, 0, None)], -1)
+
+        return self._search_excluding(x, k, np.asarray(params.excluded, dtype=np.int64))
+
+    def _search_excluding(self, x: np.ndarray, k: int, excluded: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca exata ignorando posições removidas, bloco a bloco.
+
+        Blocos sem remoções são buscados direto no arquivo mapeado; apenas as
+        linhas vivas dos blocos com remoções são copiadas. Os k melhores de
+        cada bloco são unidos no final, então o resultado só fica com menos de
+        k vizinhos quando o índice tem menos de k vetores vivos.
+        """
+        matrix = self.matrix
+        ntotal = matrix.shape[0]
+        excluded = np.unique(excluded[(excluded >= 0) & (excluded < ntotal)])
+        block_distances, block_labels = [], []
+        for start in range(0, ntotal, self.block_rows):
+            end = min(start + self.block_rows, ntotal)
+            low, high = np.searchsorted(excluded, [start, end])
+            if low == high:
+                rows = None
+                block = matrix[start:end]
+            else:
+                rows = np.setdiff1d(np.arange(start, end, dtype=np.int64), excluded[low:high], assume_unique=True)
+                if len(rows) == 0:
+                    continue
+                block = matrix[rows]
+            distances, labels = faiss.knn(x, np.ascontiguousarray(block), min(k, block.shape[0]))
+            block_distances.append(distances)
+            block_labels.append(labels + start if rows is None else rows[labels])
+
+        out_distances = np.full((x.shape[0], k), np.inf, dtype=np.float32)
+        out_labels = np.full((x.shape[0], k), -1, dtype=np.int64)
+        if block_distances:
+            distances = np.hstack(block_distances)
+            labels = np.hstack(block_labels)
+            order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+            count = order.shape[1]
+            out_distances[:, :count] = np.take_along_axis(distances, order, axis=1)
+            out_labels[:, :count] = np.take_along_axis(labels, order, axis=1)
+        return out_distances, out_labels
@@ -54,7 +54,14 @@ function addUserMessage(text, chatMessages) {
 function addAssistantMessage(text, chatMessages) {
     const messageDiv = document.createElement('div');
     messageDiv.className = 'message assistant-message';
-    
+    renderAssistantMessage(messageDiv, text);
+    chatMessages.appendChild(messageDiv);
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
+}
+
+// Renderizar (ou atualizar, durante o streaming) o texto de uma mensagem do assistente
+function renderAssistantMessage(messageDiv, text) {
     // Configurar marked.js para abrir links em nova aba
     marked.setOptions({
         breaks: true, // Quebras de linha são respeitadas
@@ -71,9 +78,6 @@ function addAssistantMessage(text, chatMessages) {
         link.setAttribute('target', '_blank');
         link.setAttribute('rel', 'noopener noreferrer');
     });
-    
-    chatMessages.appendChild(messageDiv);
-    chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
 // Adicionar mensagem do sistema ao chat
@@ -95,9 +99,10 @@ function showSources(sources, sourcesList, sourcesContainer) {
         
         const metadata = source.metadata || {};
         const filename = metadata.filename || 'Documento desconhecido';
+        const page = metadata.page ? `, página ${metadata.page}` : '';
         
         sourceDiv.innerHTML = `
-            <h5>Fonte ${index + 1}: ${filename}</h5>
+            <h5>Fonte ${index + 1}: ${filename}${page}</h5>
             <p>${source.content}</p>
         `;
         
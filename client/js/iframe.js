@@ -22,6 +22,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const messageInput = document.getElementById('message-input');
     const sendButton = document.getElementById('send-button');
     
+    // Mensagem do assistente sendo recebida em trechos
+    let streamingMessage = null;
+    let streamingText = '';
+
     // Conectar ao WebSocket
     function initWebSocket() {
         socket = connectWebSocket(WS_BASE_URL, sessionId, {
@@ -32,6 +36,11 @@ document.addEventListener('DOMContentLoaded', function() {
             onMessage: function(event) {
                 const message = JSON.parse(event.data);
                 
+                // Respostas parciais de contextos grandes: o indicador de digitação continua até a síntese
+                if (message.type === 'partial') {
+                    return;
+                }
+
                 // Remover indicador de digitação se existir
                 const typingIndicator = document.querySelector('.typing-indicator');
                 if (typingIndicator) {
@@ -45,12 +54,29 @@ document.addEventListener('DOMContentLoaded', function() {
                     typingDiv.innerHTML = '<span></span><span></span><span></span>';
                     chatMessages.appendChild(typingDiv);
                     chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (message.role === 'assistant' && message.delta !== undefined) {
+                    // Trecho da resposta em streaming: acrescentar à mensagem em andamento
+                    streamingText += message.delta;
+                    if (streamingMessage) {
+                        renderAssistantMessage(streamingMessage, streamingText);
+                        chatMessages.scrollTop = chatMessages.scrollHeight;
+                    } else {
+                        streamingMessage = addAssistantMessage(streamingText, chatMessages);
+                    }
                 } else if (message.role === 'assistant') {
-                    // Adicionar mensagem do assistente
-                    addAssistantMessage(message.content, chatMessages);
+                    // Resposta completa: substituir a mensagem em andamento ou adicionar uma nova
+                    if (streamingMessage) {
+                        renderAssistantMessage(streamingMessage, message.content);
+                    } else {
+                        addAssistantMessage(message.content, chatMessages);
+                    }
+                    streamingMessage = null;
+                    streamingText = '';
                 } else if (message.role === 'user') {
                     // Não adicionar mensagem do usuário aqui, pois já foi adicionada ao enviar
                 } else if (message.role === 'system' || message.error) {
+                    streamingMessage = null;
+                    streamingText = '';
                     // Adicionar mensagem do sistema ou erro
                     addSystemMessage(message.content || message.error, chatMessages);
                 }
@@ -36,6 +36,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const uploadStatus = document.getElementById('upload-status');
     const documentsList = document.getElementById('documents-list');
 
+    // Mensagem do assistente sendo recebida em trechos
+    let streamingMessage = null;
+    let streamingText = '';
+
     // Conectar ao WebSocket
     function initWebSocket() {
         socket = connectWebSocket(WS_BASE_URL, sessionId, {
@@ -49,6 +53,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 const message = JSON.parse(event.data);
                 console.log('Mensagem recebida:', message);
 
+                // Progresso de upload não interfere no chat
+                if (message.type === 'job') {
+                    showJobProgress(message.job);
+                    return;
+                }
+
+                // Respostas parciais de contextos grandes: o indicador de digitação continua até a síntese
+                if (message.type === 'partial') {
+                    return;
+                }
+
                 // Remover indicador de digitação se existir
                 const typingIndicator = document.querySelector('.typing-indicator');
                 if (typingIndicator) {
@@ -62,9 +77,24 @@ document.addEventListener('DOMContentLoaded', function() {
                     typingDiv.innerHTML = '<span></span><span></span><span></span>';
                     chatMessages.appendChild(typingDiv);
                     chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (message.role === 'assistant' && message.delta !== undefined) {
+                    // Trecho da resposta em streaming: acrescentar à mensagem em andamento
+                    streamingText += message.delta;
+                    if (streamingMessage) {
+                        renderAssistantMessage(streamingMessage, streamingText);
+                        chatMessages.scrollTop = chatMessages.scrollHeight;
+                    } else {
+                        streamingMessage = addAssistantMessage(streamingText, chatMessages);
+                    }
                 } else if (message.role === 'assistant') {
-                    // Adicionar mensagem do assistente
-                    addAssistantMessage(message.content, chatMessages);
+                    // Resposta completa: substituir a mensagem em andamento ou adicionar uma nova
+                    if (streamingMessage) {
+                        renderAssistantMessage(streamingMessage, message.content);
+                    } else {
+                        addAssistantMessage(message.content, chatMessages);
+                    }
+                    streamingMessage = null;
+                    streamingText = '';
 
                     // Mostrar fontes se disponíveis
                     if (message.sources && message.sources.length > 0) {
@@ -77,6 +107,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     // Apenas registrar no console para depuração
                     console.log('Mensagem do usuário recebida via WebSocket:', message.content);
                 } else if (message.role === 'system' || message.error) {
+                    streamingMessage = null;
+                    streamingText = '';
                     // Adicionar mensagem do sistema ou erro
                     addSystemMessage(message.content || message.error, chatMessages);
                 }
@@ -165,6 +197,41 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Mostrar andamento do processamento de um upload
+    function showJobProgress(job) {
+        const labels = {
+            queued: 'Na fila',
+            extracting: 'Extraindo e dividindo o texto',
+            embedding: 'Gerando embeddings',
+            indexing: 'Indexando'
+        };
+
+        if (job.status === 'completed') {
+            uploadStatus.innerHTML = `<p class="text-success">Documento "${job.filename}" processado (${job.chunks_total} trechos)</p>`;
+            loadDocuments();
+            return;
+        }
+        if (job.status === 'duplicate') {
+            uploadStatus.innerHTML = `<p>"${job.filename}" tem o mesmo conteúdo de "${job.duplicate_of}", que já está indexado</p>`;
+            return;
+        }
+        if (job.status === 'failed') {
+            uploadStatus.innerHTML = `<p class="text-danger">Erro ao processar "${job.filename}": ${job.error}</p>`;
+            return;
+        }
+
+        let details = '';
+        if (job.status === 'extracting' && job.pages_total) {
+            details = ` - página ${job.pages_extracted} de ${job.pages_total}`;
+        } else if (job.status === 'embedding' && job.chunks_total) {
+            details = ` - ${job.chunks_embedded} de ${job.chunks_total} trechos`;
+        }
+        if (job.eta_seconds !== null && job.eta_seconds !== undefined) {
+            details += ` (cerca de ${Math.ceil(job.eta_seconds)}s)`;
+        }
+        uploadStatus.innerHTML = `<p>${labels[job.status] || job.status}: "${job.filename}"${details}</p>`;
+    }
+
     // Fazer upload de documento
     async function uploadDocument() {
         const file = fileUpload.files[0];
@@ -176,6 +243,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         const formData = new FormData();
         formData.append('file', file);
+        formData.append('session_id', sessionId);
 
         uploadStatus.innerHTML = '<p>Enviando documento...</p>';
         
@@ -190,9 +258,9 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (response.ok) {
-                uploadStatus.innerHTML = `<p class="text-success">Documento "${result.filename}" enviado com sucesso!</p>`;
+                // O processamento continua em segundo plano; o andamento chega pelo WebSocket
+                showJobProgress(result);
                 fileUpload.value = '';
-                loadDocuments();
             } else {
                 uploadStatus.innerHTML = `<p class="text-danger">Erro ao enviar documento: ${result.detail}</p>`;
             }
@@ -14,7 +14,17 @@ from app.controllers.question_controller import router as question_router
 from app.controllers.websocket_controller import router as websocket_router
 from app.controllers.auth_controller import router as auth_router
 
-from app.utils.vector_db import load_vector_db
+from app.utils.vector_db import get_vector_db, reload_vector_db
+from app.utils.index_reload import index_reloader
+from app.utils.index_writer import index_writer
+from app.utils.pdf_extractor import pdf_extractor
+from app.utils.embedding_pipeline import embedding_pipeline
+from app.utils.chat_limiter import chat_limiter
+from app.utils.answer_cache import answer_cache
+from app.services.ingestion_service import ingestion_queue
+from app.utils.retrieval_executor import retrieval_executor
+from app.utils.embedding_cache import query_embedding_cache
+from app.utils.chunk_embedding_cache import chunk_embedding_cache
 from app.config.settings import logger
 from app.middleware.auth_middleware import IframeAuthMiddleware
 
@@ -86,14 +96,21 @@ async def startup_db_client():
     """Carrega o banco de dados de vetores na inicialização."""
     try:
         logger.info("Carregando banco de dados de vetores...")
-        vector_db = load_vector_db()
+        vector_db = get_vector_db()
         if vector_db:
             logger.info("Banco de dados de vetores carregado com sucesso")
         else:
             logger.info("Nenhum banco de dados de vetores existente encontrado. Será criado quando documentos forem carregados.")
+        # Acompanha as gerações gravadas por outros workers
+        index_reloader.start(reload_vector_db)
     except Exception as e:
         logger.error(f"Erro ao carregar banco de dados de vetores: {str(e)}", exc_info=True)
 
+@app.on_event("startup")
+async def startup_ingestion_queue():
+    """Inicia os workers da fila de ingestão de documentos."""
+    ingestion_queue.start()
+
 @app.on_event("startup")
 async def startup_redis_check():
     """Verifica conexão Redis na inicialização."""
@@ -107,6 +124,31 @@ async def startup_redis_check():
     except Exception as e:
         logger.error(f"❌ Erro ao verificar Redis: {str(e)}")
 
+@app.on_event("shutdown")
+async def shutdown_retrieval_executor():
+    """Encerra o pool de threads de busca vetorial."""
+    retrieval_executor.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_index_reloader():
+    """Encerra a thread de recarga do índice vetorial."""
+    index_reloader.stop(timeout=5)
+
+@app.on_event("shutdown")
+async def shutdown_ingestion_queue():
+    """Cancela os workers da fila de ingestão."""
+    await ingestion_queue.stop()
+
+@app.on_event("shutdown")
+async def shutdown_pdf_extractor():
+    """Encerra o pool de processos de extração de PDF."""
+    pdf_extractor.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_index_writer():
+    """Conclui as escritas enfileiradas no índice vetorial."""
+    index_writer.shutdown()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint para Railway."""
@@ -118,6 +160,15 @@ async def health_check():
         return {
             "status": "healthy",
             "redis": "connected" if redis_healthy else "disconnected",
+            "query_embedding_cache": query_embedding_cache.get_stats(),
+            "chunk_embedding_cache": chunk_embedding_cache.get_stats(),
+            "embedding_pipeline": embedding_pipeline.get_stats(),
+            "chat_completions": chat_limiter.get_stats(),
+            "answer_cache": answer_cache.get_stats(),
+            "index_reload": index_reloader.get_stats(),
+            "index_writer": index_writer.get_stats(),
+            "ingestion_queue": ingestion_queue.get_stats(),
+            "pdf_extraction": pdf_extractor.get_stats(),
             "version": "1.1.0",
             "environment": os.getenv('NODE_ENV', 'development')
         }
@@ -0,0 +1,110 @@
+"""
+Benchmark de busca filtrada por arquivos (``file_paths``).
+
+Compara a abordagem antiga (buscar ``top_k * 4`` vizinhos e filtrar em Python)
+com a busca restrita por ``IDSelector`` alimentada pelo índice de fontes.
+
+Uso:
+    python scripts/benchmark_filtered_search.py --vectors 100000 --sources 500 --filter-sources 2
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+# Adiciona o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.source_index import SourceIndex, source_map
+
+class _Chunk:
+    """Documento mínimo com metadados de fonte."""
+
+    def __init__(self, source: str):
+        self.metadata = {"source": source}
+
+def build_corpus(n_vectors: int, dim: int, n_sources: int, seed: int):
+    """Gera vetores aleatórios distribuídos entre fontes."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_vectors, dim), dtype=np.float32)
+    sources = rng.integers(0, n_sources, size=n_vectors)
+    source_names = [f"uploads/manual_{i:04d}.pdf" for i in range(n_sources)]
+
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+
+    source_index = SourceIndex([source_map([_Chunk(source_names[s]) for s in sources], range(n_vectors))])
+    return vectors, index, source_index, source_names
+
+def ground_truth(vectors: np.ndarray, allowed_ids: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    """Calcula os vizinhos exatos restritos aos IDs permitidos."""
+    subset = faiss.IndexFlatL2(vectors.shape[1])
+    subset.add(vectors[allowed_ids])
+    _, labels = subset.search(queries, top_k)
+    return np.where(labels >= 0, allowed_ids[np.clip(labels, 0, None)], -1)
+
+def recall(found: list, expected: np.ndarray, top_k: int) -> float:
+    """Fração dos vizinhos exatos recuperados."""
+    hits = [len(set(f) & set(e[e >= 0])) / top_k for f, e in zip(found, expected)]
+    return float(np.mean(hits))
+
+def timed(fn):
+    """Executa uma função e retorna (resultado, segundos)."""
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de busca filtrada por arquivos")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--sources", type=int, default=500)
+    parser.add_argument("--filter-sources", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    vectors, index, source_index, source_names = build_corpus(args.vectors, args.dim, args.sources, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    file_paths = source_names[:args.filter_sources]
+    allowed_ids = source_index.ids_for_prefixes(file_paths)
+    allowed = set(allowed_ids.tolist())
+    expected = ground_truth(vectors, allowed_ids, queries, args.top_k)
+
+    # Abordagem antiga: busca top_k * 4 e filtra em Python
+    def overfetch():
+        results = []
+        for query in queries:
+            _, labels = index.search(query.reshape(1, -1), args.top_k * 4)
+            results.append([label for label in labels[0] if label in allowed][:args.top_k])
+        return results
+
+    # Nova abordagem: busca restrita com IDSelector
+    def restricted():
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(source_index.ids_for_prefixes(file_paths)))
+        results = []
+        for query in queries:
+            _, labels = index.search(query.reshape(1, -1), args.top_k, params=params)
+            results.append([label for label in labels[0] if label >= 0])
+        return results
+
+    # Sem filtro, como referência de custo
+    def unfiltered():
+        return [index.search(query.reshape(1, -1), args.top_k)[1][0].tolist() for query in queries]
+
+    print(f"Vetores: {args.vectors} | Fontes: {args.sources} | Filtro: {args.filter_sources} fontes "
+          f"({len(allowed_ids)} vetores, {len(allowed_ids) / args.vectors:.2%} do corpus)")
+    print(f"{'abordagem':<14}{'recall@k':>10}{'média de resultados':>22}{'ms/consulta':>14}")
+
+    for name, fn in (("sem filtro", unfiltered), ("overfetch x4", overfetch), ("IDSelector", restricted)):
+        results, seconds = timed(fn)
+        recall_value = recall(results, expected, args.top_k) if name != "sem filtro" else float("nan")
+        mean_results = np.mean([len(r) for r in results])
+        print(f"{name:<14}{recall_value:>10.3f}{mean_results:>22.2f}{seconds * 1000 / args.queries:>14.3f}")
+
+if __name__ == "__main__":
+    main()
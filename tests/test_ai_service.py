@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import asyncio
+import socket
+import threading
+import openai
+import pytest
+import uvicorn
+from unittest.mock import patch
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from langchain_openai import ChatOpenAI
+    from app.services import ai_service
+
+ANSWER_TOKENS = ["Guarde ", "de três ", "a seis ", "meses ", "de despesas."]
+
+def fake_chat_app(delay: float = 0.05) -> FastAPI:
+    """API de chat local: transmite a resposta em trechos (SSE) ou responde de uma vez, medindo a concorrência."""
+    app = FastAPI()
+    app.state.requests = []
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        app.state.requests.append(body)
+
+        if not body.get("stream"):
+            app.state.in_flight += 1
+            app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+            await asyncio.sleep(delay)
+            app.state.in_flight -= 1
+            message = {"role": "assistant", "content": f"parcial {len(app.state.requests)}"}
+            return {
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            }
+
+        async def events():
+            for token in ANSWER_TOKENS:
+                chunk = {
+                    "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+@pytest.fixture
+def fake_chat_model(monkeypatch):
+    """Aponta o modelo de chat do serviço para a API local."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    app = fake_chat_app()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    model = ChatOpenAI(model_name="gpt-4o-mini", api_key="fake", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0)
+    monkeypatch.setattr(ai_service, "chat_model", model)
+    monkeypatch.setattr(ai_service, "chat_client", openai.AsyncOpenAI(api_key="fake", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0))
+    yield app
+    server.should_exit = True
+    thread.join(timeout=5)
+
+@pytest.mark.asyncio
+async def test_stream_answer_yields_deltas(fake_chat_model):
+    """Testa se a resposta chega em trechos, na ordem, com o contexto no prompt."""
+    docs = [Document(page_content="Reserva de emergência: de três a seis meses.", metadata={"source": "uploads/guia.pdf", "page": 2})]
+
+    deltas = [delta async for delta in ai_service.stream_answer("Quanto guardar?", docs)]
+
+    assert deltas == ANSWER_TOKENS
+    request = fake_chat_model.state.requests[0]
+    assert request["stream"] is True
+    assert "Fonte: uploads/guia.pdf, Página: 2" in request["messages"][0]["content"]
+
+@pytest.mark.asyncio
+async def test_stream_answer_fixed_replies_skip_model(fake_chat_model):
+    """Testa se pedidos de atendimento humano e perguntas sem contexto não chamam o modelo."""
+    assert [delta async for delta in ai_service.stream_answer("Quero falar com atendente", [])] == [ai_service.HUMAN_SUPPORT_ANSWER]
+    assert [delta async for delta in ai_service.stream_answer("Quanto guardar?", [])] == [ai_service.NO_CONTEXT_ANSWER]
+    assert fake_chat_model.state.requests == []
+
+@pytest.mark.asyncio
+async def test_map_reduce_runs_batches_concurrently(fake_chat_model, monkeypatch):
+    """Testa o mapa concorrente limitado, as parciais entregues e a redução em níveis."""
+    monkeypatch.setattr(ai_service, "MAX_TOKENS_PER_REQUEST", 100)
+    monkeypatch.setattr(ai_service, "ANSWER_MAP_CONCURRENCY", 3)
+    monkeypatch.setattr(ai_service, "ANSWER_REDUCE_FANIN", 2)
+    docs = [Document(page_content=f"Trecho {i}", metadata={"source": "uploads/guia.pdf", "token_count": 100}) for i in range(6)]
+
+    events = [event async for event in ai_service.stream_answer_events("Quanto guardar?", docs)]
+
+    partials = [event for event in events if event.kind == "partial"]
+    assert sorted(event.batch for event in partials) == [1, 2, 3, 4, 5, 6]
+    assert all(event.batches == 6 for event in partials)
+    assert [event.text for event in events if event.kind == "delta"] == ANSWER_TOKENS
+    # 6 lotes, 3 sínteses no primeiro nível e 1 no segundo (2 respostas cabem na síntese final transmitida)
+    requests = fake_chat_model.state.requests
+    assert sum(not request.get("stream") for request in requests) == 10
+    assert fake_chat_model.state.max_in_flight == 3
+
+@pytest.mark.asyncio
+async def test_generate_answer_shares_the_streaming_path(fake_chat_model, monkeypatch):
+    """Testa se a resposta completa passa pelos mesmos lotes e mapa/redução, sem streaming."""
+    monkeypatch.setattr(ai_service, "MAX_TOKENS_PER_REQUEST", 100)
+    monkeypatch.setattr(ai_service, "ANSWER_REDUCE_FANIN", 2)
+    docs = [Document(page_content=f"Trecho {i}", metadata={"source": "uploads/guia.pdf", "token_count": 100}) for i in range(3)]
+
+    answer = await ai_service.generate_answer("Quanto guardar?", docs)
+
+    requests = fake_chat_model.state.requests
+    # 3 lotes, 1 síntese intermediária e a síntese final, todas sem streaming
+    assert len(requests) == 5 and not any(request.get("stream") for request in requests)
+    assert answer == "parcial 5"
+    assert await ai_service.generate_answer("Quero falar com atendente", docs) == ai_service.HUMAN_SUPPORT_ANSWER
@@ -0,0 +1,104 @@
+import os
+import pytest
+import numpy as np
+from unittest.mock import patch
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.services import ai_service
+    from app.utils import answer_cache as answer_cache_module
+    from app.utils import vector_db
+    from app.utils.answer_cache import AnswerCache, depends_on_history
+
+def make_cache(max_entries: int = 100) -> AnswerCache:
+    """Cache só com a camada em memória (sem Redis)."""
+    cache = AnswerCache(True, 0.95, 3600, max_entries, 4, "gpt-4o:text-embedding-3-small")
+    cache._redis_client = lambda: None
+    return cache
+
+def chunks(*chunk_ids: int, generation: int = 1):
+    return [
+        Document(page_content=f"chunk {chunk_id}", metadata={"chunk_id": chunk_id, "index_generation": generation})
+        for chunk_id in chunk_ids
+    ]
+
+@pytest.mark.asyncio
+async def test_lookup_matches_paraphrase_only_in_same_context():
+    """Testa o acerto por similaridade e o escopo pela geração do índice e pelos chunks recuperados."""
+    cache = make_cache()
+    question = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    paraphrase = np.array([0.98, 0.1, 0.0], dtype=np.float32)
+    unrelated = np.array([0.5, 0.8, 0.0], dtype=np.float32)
+
+    miss = await cache.lookup(question, chunks(3, 1, generation=7))
+    assert miss.answer is None
+    await cache.store(miss, "Quanto guardar na reserva de emergência?", "De três a seis meses de despesas.")
+
+    hit = await cache.lookup(paraphrase, chunks(1, 3, generation=7))
+    assert hit.answer == "De três a seis meses de despesas." and hit.similarity >= 0.95
+    assert (await cache.lookup(unrelated, chunks(1, 3, generation=7))).answer is None
+    assert (await cache.lookup(paraphrase, chunks(1, 3, generation=8))).answer is None
+    assert (await cache.lookup(paraphrase, chunks(1, 4, generation=7))).answer is None
+    assert await cache.lookup(paraphrase, [Document(page_content="sem id")]) is None
+    assert cache.get_stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_least_recently_used_contexts_are_evicted():
+    """Testa o limite de contextos: o usado há mais tempo sai primeiro."""
+    cache = make_cache(max_entries=2)
+    vector = np.array([0.0, 1.0], dtype=np.float32)
+    for chunk_id in (1, 2):
+        await cache.store(await cache.lookup(vector, chunks(chunk_id)), "pergunta", f"resposta {chunk_id}")
+
+    assert (await cache.lookup(vector, chunks(1))).answer == "resposta 1"
+    await cache.store(await cache.lookup(vector, chunks(3)), "pergunta", "resposta 3")
+
+    assert (await cache.lookup(vector, chunks(2))).answer is None
+    assert (await cache.lookup(vector, chunks(1))).answer == "resposta 1"
+    assert cache.get_stats()["evictions"] == 1
+
+def test_follow_up_questions_depend_on_history():
+    """Testa quando o histórico muda o sentido da pergunta."""
+    history = [
+        {"role": "user", "content": "O que é CDB?"},
+        {"role": "assistant", "content": "CDB é um título emitido por bancos."}
+    ]
+    assert depends_on_history("E sobre o LCI?", history)
+    assert depends_on_history("Explique melhor isso, por favor", history)
+    assert depends_on_history("E o prazo?", history)
+    assert not depends_on_history("Como funciona o imposto de renda sobre a poupança?", history)
+    assert not depends_on_history("Qual a diferença entre o Tesouro Selic e a poupança?", history)
+    assert not depends_on_history("E sobre o LCI?", [{"role": "user", "content": "E sobre o LCI?"}])
+
+@pytest.mark.asyncio
+async def test_generate_answer_reuses_cached_answer(monkeypatch):
+    """Testa se perguntas parecidas com os mesmos chunks chamam o modelo uma única vez."""
+    cache = make_cache()
+    monkeypatch.setattr(ai_service, "answer_cache", cache)
+    monkeypatch.setattr(answer_cache_module, "answer_cache", cache)
+    embeddings = {
+        "Quanto devo guardar na reserva de emergência?": [1.0, 0.0],
+        "Quanto guardar para a reserva de emergência?": [0.99, 0.05],
+        "O que é CDB?": [0.0, 1.0]
+    }
+
+    async def fake_embed(question):
+        return np.array(embeddings[question], dtype=np.float32)
+
+    monkeypatch.setattr(vector_db, "embed_question", fake_embed)
+    calls = []
+
+    async def fake_complete_chat(messages):
+        calls.append(messages)
+        return f"resposta {len(calls)}"
+
+    monkeypatch.setattr(ai_service, "complete_chat", fake_complete_chat)
+    docs = chunks(10, 11)
+
+    first = await ai_service.generate_answer("Quanto devo guardar na reserva de emergência?", docs)
+    second = await ai_service.generate_answer("Quanto guardar para a reserva de emergência?", docs)
+    other = await ai_service.generate_answer("O que é CDB?", docs)
+
+    assert first == second == "resposta 1"
+    assert other == "resposta 2"
+    assert len(calls) == 2
@@ -0,0 +1,29 @@
+import os
+import hashlib
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.tools.build_index import find_documents, hash_file, read_build_manifest, write_build_manifest
+
+def test_find_documents_walks_tree(tmp_path):
+    """Testa se a busca percorre subdiretórios em ordem e ignora ocultos e formatos não suportados."""
+    for name in ("b.pdf", "a.txt", "sub/c.md", "sub/d.csv", ".oculto.txt", ".cache/e.txt"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"conteudo")
+
+    found = [os.path.relpath(path, tmp_path) for path in find_documents(str(tmp_path))]
+
+    assert found == ["a.txt", "b.pdf", os.path.join("sub", "c.md")]
+
+def test_hash_and_manifest_round_trip(tmp_path):
+    """Testa o hash em blocos e a gravação atômica do manifesto de construção."""
+    content = os.urandom(10_000)
+    (tmp_path / "a.pdf").write_bytes(content)
+    assert hash_file(str(tmp_path / "a.pdf"), chunk_bytes=1024) == (hashlib.sha256(content).hexdigest(), len(content))
+
+    assert read_build_manifest(str(tmp_path / "faiss_index")) is None
+    manifest = {"embeddings_model": "m", "complete": False, "documents": {"a.pdf": {"sha256": "h", "chunks": 3}}}
+    write_build_manifest(str(tmp_path / "faiss_index"), manifest)
+    assert read_build_manifest(str(tmp_path / "faiss_index")) == manifest
+    assert os.listdir(tmp_path / "faiss_index") == ["build_manifest.json"]
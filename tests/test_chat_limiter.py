@@ -0,0 +1,37 @@
+import asyncio
+import pytest
+from app.utils.chat_limiter import ChatLimiter, ChatTimeoutError
+
+@pytest.mark.asyncio
+async def test_limiter_caps_in_flight_completions():
+    """Testa se no máximo ``concurrency`` chamadas ficam em andamento e todas concluem."""
+    limiter = ChatLimiter(concurrency=3, timeout=5)
+    running = 0
+    peak = 0
+
+    async def completion(i: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return i
+
+    results = await asyncio.gather(*(limiter.run(completion, i) for i in range(10)))
+
+    assert results == list(range(10))
+    assert peak == 3
+    stats = limiter.get_stats()
+    assert stats["completed"] == 10 and stats["max_in_flight"] == 3 and stats["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_limiter_times_out_and_frees_slot():
+    """Testa se uma chamada lenta estoura o prazo sem prender a vaga."""
+    limiter = ChatLimiter(concurrency=1, timeout=0.05)
+
+    with pytest.raises(ChatTimeoutError):
+        await limiter.run(asyncio.sleep, 1)
+
+    assert await limiter.run(asyncio.sleep, 0, "ok") == "ok"
+    stats = limiter.get_stats()
+    assert stats["timeouts"] == 1 and stats["failed"] == 1 and stats["completed"] == 1
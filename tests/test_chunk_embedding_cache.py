@@ -0,0 +1,59 @@
+import os
+import pytest
+from unittest.mock import patch
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.chunk_embedding_cache import ChunkEmbeddingCache
+    from app.utils.embedding_pipeline import EmbeddingPipeline
+    from app.utils.token_budget import pack_by_tokens
+
+def make_embedder(calls):
+    """Cria uma função de embedding falsa que registra os textos enviados."""
+    def embed(texts):
+        calls.extend(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+    return embed
+
+async def embed_with_cache(cache, texts, calls):
+    """Calcula os embeddings de um lote pelo pipeline da ingestão, com o cache informado."""
+    pipeline = EmbeddingPipeline(
+        concurrency=1, tokens_per_minute=0, requests_per_minute=0,
+        max_retries=0, backoff_base=0.01, backoff_max=0.01, cache=cache
+    )
+    [batch] = pack_by_tokens([Document(page_content=text) for text in texts], max_tokens=1000, max_documents=100)
+    return await pipeline.embed(batch, make_embedder(calls))
+
+@pytest.mark.asyncio
+async def test_only_changed_chunks_are_embedded(tmp_path):
+    """Testa se apenas chunks novos vão para a API, inclusive após reabrir o cache."""
+    path = str(tmp_path / "chunks.sqlite3")
+    calls = []
+    cache = ChunkEmbeddingCache(path, model_name="m")
+
+    first = await embed_with_cache(cache, ["a", "bb", "a"], calls)
+    assert calls == ["a", "bb"]
+    assert first == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5]]
+    cache.close()
+
+    reopened = ChunkEmbeddingCache(path, model_name="m")
+    second = await embed_with_cache(reopened, ["a", "bb", "ccc"], calls)
+    assert calls == ["a", "bb", "ccc"]
+    assert second[:2] == first[:2]
+    assert reopened.get_stats()["hit_ratio"] == round(2 / 3, 4)
+
+    # Outro modelo não reaproveita embeddings
+    other_model = ChunkEmbeddingCache(path, model_name="outro")
+    await embed_with_cache(other_model, ["a"], calls)
+    assert calls[-1] == "a"
+
+@pytest.mark.asyncio
+async def test_disabled_cache_sends_every_distinct_text(tmp_path):
+    """Testa se, sem cache, os textos repetidos do lote ainda vão uma única vez à API."""
+    calls = []
+    cache = ChunkEmbeddingCache(str(tmp_path / "chunks.sqlite3"), model_name="m", enabled=False)
+
+    assert await embed_with_cache(cache, ["a", "a", "bb"], calls) == [[1.0, 0.5], [1.0, 0.5], [2.0, 0.5]]
+    assert await embed_with_cache(cache, ["a"], calls) == [[1.0, 0.5]]
+    assert calls == ["a", "bb", "a"]
+    assert not os.path.exists(tmp_path / "chunks.sqlite3")
@@ -0,0 +1,26 @@
+import pickle
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from app.utils.chunk_store import ChunkStore
+
+def test_write_and_read_records(tmp_path):
+    """Testa a gravação e a leitura de chunks por posição."""
+    documents = [Document(page_content=f"texto ç {i}", metadata={"source": "uploads/a.pdf", "page": i}) for i in range(3)]
+    assert ChunkStore.write(str(tmp_path), zip(["x", "y", "z"], documents)) == 3
+
+    store = ChunkStore.open(str(tmp_path))
+    assert len(store) == 3
+    assert store.get(1).page_content == "texto ç 1"
+    assert store.record(2)[0] == "z"
+    assert store.get(2).metadata == {"source": "uploads/a.pdf", "page": 2}
+    assert ChunkStore.open(str(tmp_path / "vazio")) is None
+
+def test_convert_langchain_pickle(tmp_path):
+    """Testa a conversão de um index.pkl do LangChain para o armazenamento em disco."""
+    docstore = InMemoryDocstore({"a": Document(page_content="um"), "b": Document(page_content="dois")})
+    with open(tmp_path / "index.pkl", "wb") as f:
+        pickle.dump((docstore, {0: "b", 1: "a"}), f)
+
+    store = ChunkStore.from_pickle(str(tmp_path), str(tmp_path / "index.pkl"))
+    assert [store.record(i)[0] for i in range(len(store))] == ["b", "a"]
+    assert store.get(1).page_content == "um"
@@ -0,0 +1,130 @@
+import io
+import os
+import hashlib
+import pytest
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.services import document_service
+    from app.utils.upload_registry import UploadRegistry
+
+class FakeUpload:
+    """Upload em memória com a mesma interface de leitura do ``UploadFile``."""
+
+    def __init__(self, content: bytes):
+        self.buffer = io.BytesIO(content)
+        self.reads = []
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk = self.buffer.read(size)
+        self.reads.append(len(chunk))
+        return chunk
+
+@pytest.mark.asyncio
+async def test_stream_upload_hashes_in_chunks(tmp_path, monkeypatch):
+    """Testa se o upload é gravado em blocos com o SHA-256 do conteúdo completo."""
+    monkeypatch.setattr(document_service, "INCOMING_DIR", str(tmp_path))
+    content = os.urandom(10_000)
+    upload = FakeUpload(content)
+
+    tmp_file, content_hash, size = await document_service.stream_upload(upload, max_bytes=20_000, chunk_bytes=4096)
+
+    assert size == len(content)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+    assert max(upload.reads) == 4096
+    with open(tmp_file, "rb") as f:
+        assert f.read() == content
+
+@pytest.mark.asyncio
+async def test_stream_upload_rejects_large_file(tmp_path, monkeypatch):
+    """Testa se um upload acima do limite é interrompido e o arquivo temporário removido."""
+    monkeypatch.setattr(document_service, "INCOMING_DIR", str(tmp_path))
+    upload = FakeUpload(b"x" * 10_000)
+
+    with pytest.raises(document_service.UploadTooLargeError):
+        await document_service.stream_upload(upload, max_bytes=5_000, chunk_bytes=1024)
+
+    assert os.listdir(tmp_path) == []
+    assert sum(upload.reads) <= 6 * 1024
+
+def test_upload_registry(tmp_path):
+    """Testa a busca de documentos pelo hash do conteúdo."""
+    registry = UploadRegistry(str(tmp_path / "uploads.sqlite3"))
+    registry.record("a.pdf", "h1", 10)
+    registry.record("b.pdf", "h2", 20)
+    assert registry.find("h1") == "a.pdf"
+
+    # Reenviar um arquivo com o mesmo nome substitui o hash anterior
+    registry.record("a.pdf", "h3", 30)
+    assert registry.find("h1") is None
+    assert registry.find("h3") == "a.pdf"
+
+    registry.remove("b.pdf")
+    assert registry.find("h2") is None
+    registry.close()
+
+@pytest.mark.asyncio
+async def test_upload_limit_is_enforced_before_the_form_is_read(monkeypatch):
+    """Testa se uploads acima do limite são recusados sem o formulário ser gravado."""
+    import httpx
+    from fastapi import FastAPI
+    from app.controllers import document_controller
+
+    monkeypatch.setattr(document_controller, "UPLOAD_REQUEST_MAX_BYTES", 10_000)
+    calls = []
+
+    async def fake_stream_upload(file):
+        calls.append(file)
+        raise AssertionError("o endpoint não deveria receber o arquivo")
+
+    monkeypatch.setattr(document_controller, "stream_upload", fake_stream_upload)
+    app = FastAPI()
+    app.include_router(document_controller.router)
+    sent = []
+
+    async def chunked_body():
+        yield b'--limite\r\nContent-Disposition: form-data; name="file"; filename="grande.pdf"\r\n\r\n'
+        for _ in range(100):
+            sent.append(1024)
+            yield b"x" * 1024
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/upload", files={"file": ("grande.pdf", b"x" * 20_000)})
+        assert response.status_code == 413
+
+        # Sem Content-Length: o corpo é interrompido ao passar do limite
+        response = await client.post(
+            "/upload",
+            content=chunked_body(),
+            headers={"content-type": "multipart/form-data; boundary=limite"}
+        )
+        assert response.status_code == 413
+        assert sum(sent) <= 12 * 1024
+
+    assert calls == []
+
+@pytest.mark.asyncio
+async def test_upload_with_name_of_active_job_is_rejected(tmp_path, monkeypatch):
+    """Testa se um novo conteúdo com o nome de um documento em processamento não substitui o arquivo."""
+    import httpx
+    from fastapi import FastAPI
+    from app.controllers import document_controller
+    from app.services.ingestion_service import IngestionJob, IngestionQueue
+
+    queue = IngestionQueue(workers=1, queue_size=10, job_ttl=60, progress_interval=0)
+    running = IngestionJob(str(tmp_path / "a.pdf"), "a.pdf", "2024-01-01T00:00:00")
+    queue.jobs[running.id] = running
+    monkeypatch.setattr(document_controller, "ingestion_queue", queue)
+    monkeypatch.setattr(document_controller, "find_duplicate", lambda content_hash: None)
+    monkeypatch.setattr(document_controller, "commit_upload", lambda *args: pytest.fail("arquivo não deveria ser substituído"))
+    monkeypatch.setattr(document_service, "INCOMING_DIR", str(tmp_path / "incoming"))
+    app = FastAPI()
+    app.include_router(document_controller.router)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/upload", files={"file": ("a.pdf", b"nova versao")})
+
+    assert response.status_code == 409
+    assert running.id in response.json()["detail"]
+    assert os.listdir(tmp_path / "incoming") == []
+    assert queue.find_active_job("b.pdf") is None
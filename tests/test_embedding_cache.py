@@ -0,0 +1,55 @@
+import os
+import pytest
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.embedding_cache import QueryEmbeddingCache, normalize_question
+
+def make_embedder(calls):
+    """Cria uma função de embedding falsa que registra as chamadas."""
+    async def embed(question):
+        calls.append(question)
+        return [float(len(question)), 1.0, 2.0]
+    return embed
+
+def test_normalize_question():
+    """Testa se variações de caixa e espaços geram a mesma chave."""
+    assert normalize_question("  Como   criar\numa CATEGORIA? ") == "como criar uma categoria?"
+
+@pytest.mark.asyncio
+async def test_local_hits_and_misses():
+    """Testa se perguntas equivalentes usam o cache local."""
+    cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60, redis_ttl_seconds=60, use_redis=False, model_name="m")
+    calls = []
+    embed = make_embedder(calls)
+
+    first = await cache.get_or_embed("Como criar uma categoria?", embed)
+    second = await cache.get_or_embed("  como criar  uma categoria? ", embed)
+
+    assert len(calls) == 1
+    assert list(first) == list(second)
+    stats = cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["local_hits"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl():
+    """Testa a remoção por LRU e a expiração por TTL."""
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=60, redis_ttl_seconds=60, use_redis=False, model_name="m")
+    calls = []
+    embed = make_embedder(calls)
+
+    await cache.get_or_embed("a", embed)
+    await cache.get_or_embed("b", embed)
+    await cache.get_or_embed("a", embed)
+    await cache.get_or_embed("c", embed)  # Remove "b", o menos usado recentemente
+
+    assert cache.get_stats()["evictions"] == 1
+    await cache.get_or_embed("b", embed)
+    assert calls == ["a", "b", "c", "b"]
+
+    cache.ttl = -1
+    await cache.get_or_embed("d", embed)
+    await cache.get_or_embed("d", embed)
+    assert calls[-2:] == ["d", "d"]
@@ -0,0 +1,110 @@
+import os
+import time
+import socket
+import asyncio
+import threading
+import pytest
+import uvicorn
+from unittest.mock import patch
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from langchain_openai import OpenAIEmbeddings
+    from app.utils.embedding_pipeline import EmbeddingPipeline, RateLimiter
+    from app.utils.token_budget import pack_by_tokens
+
+def fake_embeddings_app(rate_limited: int, delay: float) -> FastAPI:
+    """API de embeddings local: responde 429 às primeiras requisições e mede a concorrência."""
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        if app.state.calls <= rate_limited:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "0"}
+            )
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        await asyncio.sleep(delay)
+        app.state.in_flight -= 1
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(str(item))), 1.0, 0.0]} for i, item in enumerate(body["input"])]
+        return {"object": "list", "data": data, "model": body["model"], "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    return app
+
+@pytest.fixture
+def fake_server():
+    """Sobe a API de embeddings local em uma porta livre."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    app = fake_embeddings_app(rate_limited=2, delay=0.05)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield app, f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+@pytest.mark.asyncio
+async def test_pipeline_retries_rate_limits_against_fake_server(fake_server):
+    """Testa o pipeline contra a API local: 429 repetidos, concorrência limitada e todos os lotes entregues."""
+    app, base_url = fake_server
+    model = OpenAIEmbeddings(model="text-embedding-3-small", openai_api_key="fake", openai_api_base=base_url, max_retries=0)
+    pipeline = EmbeddingPipeline(
+        concurrency=3, tokens_per_minute=0, requests_per_minute=0,
+        max_retries=5, backoff_base=0.01, backoff_max=0.05
+    )
+    documents = [Document(page_content=f"chunk {i}") for i in range(12)]
+    results = {}
+
+    async def on_result(batch, embeddings):
+        for doc, embedding in zip(batch.documents, embeddings):
+            results[doc.page_content] = embedding
+
+    await pipeline.run(pack_by_tokens(documents, max_tokens=1000, max_documents=2), model.embed_documents, on_result)
+
+    assert set(results) == {doc.page_content for doc in documents}
+    assert pipeline.stats["rate_limited"] == 2 and pipeline.stats["requests"] == 6
+    assert 1 < app.state.max_in_flight <= 3
+
+@pytest.mark.asyncio
+async def test_rate_limiter_waits_for_token_budget():
+    """Testa se o limitador espera o balde de tokens reabastecer."""
+    limiter = RateLimiter(tokens_per_minute=6000, requests_per_minute=0)
+    assert await limiter.acquire(6000) == 0
+
+    start = time.monotonic()
+    waited = await limiter.acquire(30)
+    assert 0.25 <= time.monotonic() - start < 1
+    assert waited > 0
+
+@pytest.mark.asyncio
+async def test_failed_batch_cancels_pipeline():
+    """Testa se um erro definitivo interrompe o pipeline sem novas tentativas."""
+    pipeline = EmbeddingPipeline(
+        concurrency=2, tokens_per_minute=0, requests_per_minute=0,
+        max_retries=5, backoff_base=0.01, backoff_max=0.05
+    )
+
+    def embed(texts):
+        raise ValueError("entrada inválida")
+
+    async def on_result(batch, embeddings):
+        raise AssertionError("nenhum lote deveria ser entregue")
+
+    batches = pack_by_tokens([Document(page_content=f"chunk {i}") for i in range(4)], max_tokens=1000, max_documents=1)
+    with pytest.raises(ValueError):
+        await pipeline.run(batches, embed, on_result)
+    assert pipeline.stats["retries"] == 0
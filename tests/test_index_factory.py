@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import faiss
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils import index_factory
+    from app.utils.index_factory import factory_string, search_params, index_from_vectors, min_training_vectors
+    from app.utils.vector_file import VectorFile, MmapFlatIndex, FlatSearchParams
+
+def test_factory_string_uses_flat_below_training_threshold(monkeypatch):
+    """Testa se lotes pequenos viram índices planos e os grandes usam o tipo configurado."""
+    monkeypatch.setattr(index_factory, "FAISS_IVF_NLIST", 16)
+    threshold = min_training_vectors("ivf_flat", "float32")
+    assert threshold == 16 * 39
+
+    assert factory_string("ivf_flat", 64, threshold - 1, "float32") == "Flat"
+    assert factory_string("ivf_flat", 64, threshold, "float32") == "IVF16,Flat"
+    assert factory_string("ivf_pq", 64, 100, "float32") == "Flat"
+    assert factory_string("ivf_pq", 64, min_training_vectors("ivf_pq"), "float32") == "IVF16,PQ64x8"
+    assert factory_string("hnsw", 64, 10, "float32") == "HNSW32"
+    assert factory_string("hnsw", 64, 10, "pq") == "Flat"
+    assert min_training_vectors("flat", "fp16") == 0
+
+def test_search_params_by_index_type(tmp_path):
+    """Testa os parâmetros de busca e a chave de agrupamento para cada tipo de índice."""
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype(np.float32)
+    flat = faiss.IndexFlatL2(8)
+    flat.add(vectors)
+    ivf = faiss.index_factory(8, "IVF4,Flat")
+    ivf.train(vectors)
+    ivf.add(vectors)
+
+    assert search_params(flat) is None
+    assert search_params(flat, excluded=np.empty(0, dtype=np.int64)) is None
+
+    excluded = np.array([0, 1], dtype=np.int64)
+    params = search_params(flat, excluded=excluded)
+    _, labels = flat.search(vectors[:1], 3, params=params)
+    assert 0 not in labels[0] and 1 not in labels[0]
+
+    ivf_params = search_params(ivf, ids=np.array([5, 6], dtype=np.int64))
+    assert isinstance(ivf_params, faiss.SearchParametersIVF)
+    assert ivf_params.nprobe == index_factory.FAISS_NPROBE
+    assert ivf_params.key == search_params(ivf, ids=np.array([5, 6], dtype=np.int64)).key
+    assert ivf_params.key != search_params(ivf, ids=np.array([5, 7], dtype=np.int64)).key
+
+    vector_file = VectorFile.create(str(tmp_path), 8)
+    vector_file.append(vectors)
+    mmap_params = search_params(MmapFlatIndex(vector_file), ids=np.array([3]), excluded=excluded)
+    assert isinstance(mmap_params, FlatSearchParams)
+    assert mmap_params.excluded is None
+
+def test_index_from_vectors_keeps_order(monkeypatch):
+    """Testa se o índice construído em blocos preserva a ordem dos vetores e treina o IVF."""
+    monkeypatch.setattr(index_factory, "FAISS_IVF_NLIST", 4)
+    vectors = np.random.default_rng(1).standard_normal((400, 8)).astype(np.float32)
+
+    index = index_from_vectors(vectors, "ivf_flat", "float32", block_size=128)
+    assert faiss.extract_index_ivf(index).nlist == 4
+    assert index.ntotal == 400
+
+    index.nprobe = 4
+    _, labels = index.search(vectors[[0, 150, 399]], 1)
+    assert list(labels[:, 0]) == [0, 150, 399]
+
+    small = index_from_vectors(vectors[:50], "ivf_flat", "float32")
+    assert isinstance(small, faiss.IndexFlat)
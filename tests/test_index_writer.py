@@ -0,0 +1,49 @@
+import os
+import time
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.index_writer import IndexWriter
+
+@pytest.mark.asyncio
+async def test_writes_run_one_at_a_time_in_order():
+    """Testa se escritas concorrentes são executadas uma de cada vez, na ordem de chegada."""
+    writer = IndexWriter()
+    running, order = [], []
+    lock = threading.Lock()
+
+    def write(value):
+        with lock:
+            running.append(value)
+            assert len(running) == 1
+        time.sleep(0.01)
+        order.append(value)
+        with lock:
+            running.remove(value)
+        return value * 2
+
+    results = await asyncio.gather(*(writer.submit(write, value) for value in range(5)))
+    writer.shutdown()
+
+    assert results == [0, 2, 4, 6, 8]
+    assert order == [0, 1, 2, 3, 4]
+    assert writer.get_stats()["completed"] == 5
+    assert writer.get_stats()["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_write_errors_reach_the_caller():
+    """Testa se o erro de uma escrita chega a quem a enfileirou sem parar o escritor."""
+    writer = IndexWriter()
+
+    def fail():
+        raise ValueError("falhou")
+
+    with pytest.raises(ValueError):
+        await writer.submit(fail)
+    assert await writer.submit(lambda: "ok") == "ok"
+    writer.shutdown()
+
+    assert writer.get_stats()["failed"] == 1
@@ -0,0 +1,76 @@
+import os
+import asyncio
+import pytest
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.services.ingestion_service import IngestionQueue
+
+def make_queue(workers=1, queue_size=10):
+    """Cria uma fila sem Redis e sem limite entre eventos de progresso."""
+    queue = IngestionQueue(workers=workers, queue_size=queue_size, job_ttl=60, progress_interval=0)
+    queue._redis_client = lambda: None
+    return queue
+
+async def wait_finished(queue, job_id):
+    """Aguarda um job terminar e retorna seu estado."""
+    for _ in range(100):
+        state = await queue.get(job_id)
+        if state["status"] in ("completed", "failed"):
+            return state
+        await asyncio.sleep(0.01)
+    raise AssertionError("Job não terminou")
+
+@pytest.mark.asyncio
+async def test_job_reports_progress_and_completion():
+    """Testa se o job passa pelas etapas, publica o progresso e termina com o total de chunks."""
+    events = []
+    queue = make_queue()
+
+    async def notify(session_id, job):
+        events.append((session_id, job["status"], job["chunks_embedded"]))
+
+    async def fake_index_document(file_path, file_name, upload_time, on_progress=None):
+        on_progress(status="extracting")
+        await asyncio.to_thread(on_progress, pages_extracted=1, pages_total=2)
+        on_progress(status="embedding", chunks_total=4, chunks_embedded=0)
+        on_progress(chunks_embedded=2)
+        return 4
+
+    queue.notify = notify
+    with patch("app.services.ingestion_service.index_document", fake_index_document):
+        job = await queue.submit("uploads/a.pdf", "a.pdf", "2024-01-01T00:00:00", session_id="s1")
+        state = await wait_finished(queue, job.id)
+    await asyncio.sleep(0.05)
+    await queue.stop()
+
+    assert state["status"] == "completed"
+    assert state["chunks_total"] == 4
+    assert state["pages_extracted"] == 1
+    assert events[0] == ("s1", "queued", 0)
+    assert events[-1] == ("s1", "completed", 4)
+    assert len(events) == len(set(events))
+
+@pytest.mark.asyncio
+async def test_failed_job_and_full_queue():
+    """Testa se erros ficam registrados no job e se a fila cheia recusa novos uploads."""
+    queue = make_queue(queue_size=1)
+    release = asyncio.Event()
+
+    async def failing_index_document(file_path, file_name, upload_time, on_progress=None):
+        await release.wait()
+        raise ValueError("PDF corrompido")
+
+    with patch("app.services.ingestion_service.index_document", failing_index_document):
+        first = await queue.submit("uploads/a.pdf", "a.pdf", "t")
+        await asyncio.sleep(0.01)
+        await queue.submit("uploads/b.pdf", "b.pdf", "t")
+        with pytest.raises(asyncio.QueueFull):
+            await queue.submit("uploads/c.pdf", "c.pdf", "t")
+        release.set()
+        state = await wait_finished(queue, first.id)
+    await queue.stop()
+
+    assert state["status"] == "failed"
+    assert "PDF corrompido" in state["error"]
+    assert await queue.get("inexistente") is None
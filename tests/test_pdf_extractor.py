@@ -0,0 +1,46 @@
+import os
+import pytest
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.pdf_extractor import PdfExtractor
+
+def write_pdf(path, pages):
+    """Gera um PDF simples com uma linha de texto por página."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    content += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(content)
+
+@pytest.mark.parametrize("pool_size", [1, 2])
+def test_pages_are_yielded_in_order(tmp_path, pool_size):
+    """Testa se as páginas saem na ordem, no próprio processo e no pool."""
+    pdf_path = tmp_path / "guia.pdf"
+    write_pdf(pdf_path, [f"Pagina {i}" for i in range(1, 8)])
+    extractor = PdfExtractor(pool_size=pool_size, pages_per_task=2, min_parallel_pages=2)
+
+    try:
+        pages = list(extractor.iter_pages(str(pdf_path)))
+    finally:
+        extractor.shutdown()
+
+    assert [(number, total) for number, total, _ in pages] == [(i, 7) for i in range(1, 8)]
+    assert [text for _, _, text in pages] == [f"Pagina {i}" for i in range(1, 8)]
+    stats = extractor.get_stats()
+    assert stats["documents"] == 1 and stats["pages"] == 7
+    assert stats["pages_per_second"] > 0
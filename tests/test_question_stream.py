@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import threading
+import httpx
+import openai
+import pytest
+import uvicorn
+import websockets
+from unittest.mock import patch
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from langchain_openai import ChatOpenAI
+    from app.services import ai_service
+    from app.controllers import question_controller, websocket_controller
+
+def serve(app: FastAPI) -> uvicorn.Server:
+    """Sobe uma aplicação em uma porta livre, em uma thread."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+def base_url(server: uvicorn.Server) -> str:
+    return f"http://127.0.0.1:{server.config.port}"
+
+@pytest.fixture
+def fake_apis(monkeypatch):
+    """API de chat lenta (um trecho a cada 50 ms) e aplicação com as rotas de perguntas."""
+    chat = FastAPI()
+    chat.state.sent = 0
+
+    @chat.post("/v1/chat/completions")
+    async def completions(request: Request):
+        async def events():
+            for i in range(40):
+                chat.state.sent += 1
+                chunk = {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": "m",
+                         "choices": [{"index": 0, "delta": {"content": f"t{i} "}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.05)
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def fake_query(question, top_k, file_paths):
+        return [Document(page_content="Reserva de emergência", metadata={"source": "uploads/guia.pdf"})]
+
+    chat_server = serve(chat)
+    monkeypatch.setattr(ai_service, "chat_model", ChatOpenAI(model_name="m", api_key="fake", base_url=f"{base_url(chat_server)}/v1", max_retries=0))
+    monkeypatch.setattr(ai_service, "chat_client", openai.AsyncOpenAI(api_key="fake", base_url=f"{base_url(chat_server)}/v1", max_retries=0))
+    monkeypatch.setattr(question_controller, "query_vector_db", fake_query)
+    monkeypatch.setattr(websocket_controller, "query_vector_db", fake_query)
+    app = FastAPI()
+    app.include_router(question_controller.router)
+    app.include_router(websocket_controller.router)
+    app_server = serve(app)
+    yield chat, base_url(app_server)
+    for server in (chat_server, app_server):
+        server.should_exit = True
+
+async def read_events(response: httpx.Response, limit: int = 0):
+    """Lê os eventos SSE de uma resposta (no máximo ``limit``, se informado)."""
+    events, event = [], None
+    async for line in response.aiter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+            if limit and len(events) >= limit:
+                break
+    return events
+
+@pytest.mark.asyncio
+async def test_stream_emits_sources_deltas_and_summary(fake_apis):
+    """Testa a ordem dos eventos e se o resumo final traz a resposta montada."""
+    _, url = fake_apis
+    async with httpx.AsyncClient(timeout=30) as client:
+        async with client.stream("POST", f"{url}/ask/stream", json={"question": "Quanto guardar?", "session_id": "s1"}) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = await read_events(response)
+
+    names = [name for name, _ in events]
+    assert names[0] == "sources" and names[-1] == "done" and set(names[1:-1]) == {"delta"}
+    assert events[0][1]["sources"][0]["metadata"]["source"] == "uploads/guia.pdf"
+    summary = events[-1][1]
+    assert summary["answer"] == "".join(data["delta"] for name, data in events if name == "delta")
+    assert summary["session_id"] == "s1" and summary["first_token_seconds"] <= summary["total_seconds"]
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_generation(fake_apis):
+    """Testa se a desconexão do cliente encerra a requisição ao modelo."""
+    chat, url = fake_apis
+    async with httpx.AsyncClient(timeout=30) as client:
+        async with client.stream("POST", f"{url}/ask/stream", json={"question": "Quanto guardar?", "session_id": "s1"}) as response:
+            await read_events(response, limit=3)
+
+    await asyncio.sleep(0.5)
+    assert chat.state.sent < 10
+
+@pytest.mark.asyncio
+async def test_websocket_disconnect_cancels_generation(fake_apis):
+    """Testa se fechar o WebSocket no meio da resposta encerra a requisição ao modelo."""
+    chat, url = fake_apis
+    async with websockets.connect(f"{url.replace('http', 'ws')}/ws/s2") as ws:
+        await ws.send(json.dumps({"question": "Quanto guardar?"}))
+        deltas = 0
+        while deltas < 3:
+            deltas += "delta" in json.loads(await ws.recv())
+
+    await asyncio.sleep(0.5)
+    assert chat.state.sent < 10
@@ -0,0 +1,76 @@
+import os
+import asyncio
+import pytest
+import numpy as np
+import faiss
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.retrieval_executor import RetrievalExecutor
+    from app.utils.index_factory import search_params
+
+def build_index(n: int = 200, dim: int = 16) -> faiss.IndexFlatL2:
+    """Cria um índice plano com vetores aleatórios."""
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.random((n, dim), dtype=np.float32))
+    return index
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_batched():
+    """Testa se consultas concorrentes viram uma única chamada ao índice com os mesmos resultados."""
+    index = build_index()
+    executor = RetrievalExecutor(window_ms=20, pool_size=2, max_batch_size=64)
+    queries = np.random.default_rng(1).random((8, 16), dtype=np.float32)
+
+    calls = []
+    original_search = index.search
+
+    def counting_search(matrix, k):
+        calls.append(matrix.shape[0])
+        return original_search(matrix, k)
+
+    index.search = counting_search
+    results = await asyncio.gather(*[
+        executor.search(index, query, k) for k, query in zip(range(1, 9), queries)
+    ])
+    executor.shutdown()
+
+    assert calls == [8]
+    for k, query, (distances, labels) in zip(range(1, 9), queries, results):
+        expected_distances, expected_labels = original_search(query.reshape(1, -1), k)
+        assert len(labels) == k
+        assert np.array_equal(labels, expected_labels[0])
+        assert np.allclose(distances, expected_distances[0])
+
+@pytest.mark.asyncio
+async def test_max_batch_size_splits_batches():
+    """Testa se o tamanho máximo do lote é respeitado."""
+    index = build_index()
+    executor = RetrievalExecutor(window_ms=20, pool_size=2, max_batch_size=3)
+    queries = np.random.default_rng(2).random((7, 16), dtype=np.float32)
+
+    results = await asyncio.gather(*[executor.search(index, query, 5) for query in queries])
+    executor.shutdown()
+
+    assert len(results) == 7
+    assert all(len(labels) == 5 for _, labels in results)
+
+@pytest.mark.asyncio
+async def test_queries_with_different_params_are_not_batched_together():
+    """Testa se consultas do mesmo grupo com seletores diferentes usam cada uma os seus parâmetros."""
+    index = build_index()
+    executor = RetrievalExecutor(window_ms=20, pool_size=2, max_batch_size=64)
+    query = np.random.default_rng(3).random(16, dtype=np.float32)
+    allowed = [np.arange(0, 50, dtype=np.int64), np.arange(100, 150, dtype=np.int64)]
+
+    results = await asyncio.gather(*[
+        executor.search(index, query, 5, params=search_params(index, ids), group="filtro") for ids in allowed
+    ] + [
+        executor.search(index, query, 5, params=search_params(index, allowed[0]), group="filtro")
+    ])
+    executor.shutdown()
+
+    assert all(0 <= label < 50 for label in results[0][1])
+    assert all(100 <= label < 150 for label in results[1][1])
+    assert np.array_equal(results[0][1], results[2][1])
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+from unittest.mock import patch
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.segments import SegmentedIndex, select_segments_to_merge
+    from app.utils.index_factory import search_params
+
+def make_batch(start, count, source, dim=8):
+    """Gera documentos e embeddings determinísticos para um lote."""
+    rng = np.random.default_rng(start)
+    documents = [Document(page_content=f"chunk {start + i}", metadata={"source": source}) for i in range(count)]
+    return documents, rng.standard_normal((count, dim)).astype(np.float32).tolist()
+
+def test_select_segments_to_merge_policy():
+    """Testa a política de compactação por níveis de tamanho e quantidade máxima."""
+    assert select_segments_to_merge([10, 12, 9], merge_factor=4, max_segments=16) == []
+    assert select_segments_to_merge([1000, 10, 12, 9, 11], merge_factor=4, max_segments=16) == [1, 2, 3, 4]
+    assert select_segments_to_merge([5000, 300, 20, 2, 1], merge_factor=4, max_segments=3) == [1, 2, 3, 4]
+
+def test_segments_add_merge_and_reload(tmp_path):
+    """Testa se a união de segmentos preserva IDs e documentos e sobrevive a uma recarga."""
+    store = SegmentedIndex(str(tmp_path), [])
+    for i, source in enumerate(["uploads/a.pdf", "uploads/b.pdf", "uploads/a.pdf"]):
+        store.add(*make_batch(i * 5, 5, source))
+    assert [segment.ntotal for segment in store.segments] == [5, 5, 5]
+
+    ids_a = store.sources.ids_for_prefixes(["uploads/a"])
+    assert list(ids_a) == list(range(0, 5)) + list(range(10, 15))
+
+    content_generation = store.snapshot.content_generation
+    merged = store.merge(store.segments[1:])
+    assert len(store.segments) == 2
+    # A compactação troca a geração, mas não a do conteúdo
+    assert store.snapshot.content_generation == content_generation < store.generation
+    assert list(merged.ids) == list(range(5, 15))
+    assert list(merged.positions_for(ids_a)) == list(range(5, 10))
+    assert merged.document(0).page_content == "chunk 5"
+
+    loaded = SegmentedIndex.load(str(tmp_path))
+    assert [segment.name for segment in loaded.segments] == [segment.name for segment in store.segments]
+    assert loaded.next_id == 15
+    assert loaded.generation == store.generation
+    assert loaded.snapshot.content_generation == content_generation
+    assert loaded.sources.to_dict() == store.sources.to_dict()
+    assert os.path.exists(os.path.join(str(tmp_path), "segments", merged.name, "sources.json"))
+    assert not os.path.exists(os.path.join(str(tmp_path), "sources.json"))
+
+    # Segmentos sem mapa de fontes (versões anteriores) têm o mapa reconstruído na carga
+    os.remove(os.path.join(str(tmp_path), "segments", merged.name, "sources.json"))
+    assert SegmentedIndex.load(str(tmp_path)).sources.to_dict() == store.sources.to_dict()
+
+def test_delete_sources_masks_search_until_compaction(tmp_path):
+    """Testa se vetores removidos somem das buscas e são descartados na compactação."""
+    store = SegmentedIndex(str(tmp_path), [])
+    documents, embeddings = make_batch(0, 6, "uploads/a.pdf")
+    store.add(documents, embeddings)
+    store.add(*make_batch(6, 4, "uploads/b.pdf"))
+
+    assert store.delete_sources(["uploads/a.pdf"]) == 6
+    assert store.delete_sources(["uploads/a.pdf"]) == 0
+    assert store.ntotal == 4
+    assert "uploads/a.pdf" not in store.sources.to_dict()
+
+    first = store.segments[0]
+    params = search_params(first.index, excluded=first.deleted)
+    _, labels = first.index.search(np.array(embeddings[:1], dtype=np.float32), 3, params=params)
+    assert list(labels[0]) == [-1, -1, -1]
+
+    loaded = SegmentedIndex.load(str(tmp_path))
+    assert loaded.ntotal == 4
+    assert list(loaded.tombstones) == list(range(6))
+
+    assert loaded.merge(loaded.segments[:1]) is None
+    assert [segment.ntotal for segment in loaded.segments] == [4]
+    assert len(loaded.tombstones) == 0
+
+def test_refresh_and_writes_across_workers(tmp_path):
+    """Testa se um worker enxerga as gerações de outro sem sobrescrever suas escritas."""
+    writer = SegmentedIndex(str(tmp_path), [])
+    published = []
+    writer.on_commit = published.append
+    writer.add(*make_batch(0, 5, "uploads/a.pdf"))
+
+    reader = SegmentedIndex.load(str(tmp_path))
+    first = reader.segments[0]
+    writer.add(*make_batch(5, 3, "uploads/b.pdf"))
+    assert published == [1, 2]
+
+    assert reader.refresh()
+    assert not reader.refresh()
+    assert reader.generation == 2
+    assert reader.segments[0] is first
+    assert reader.ntotal == 8
+    assert list(reader.sources.ids_for_prefixes(["uploads/b"])) == [5, 6, 7]
+
+    # Escrita de um processo desatualizado relê o manifesto antes de gravar
+    writer.delete_sources(["uploads/a.pdf"])
+    reader.add(*make_batch(8, 2, "uploads/c.pdf"))
+    assert list(reader.tombstones) == list(range(5))
+    assert len({segment.name for segment in reader.segments}) == 3
+
+    loaded = SegmentedIndex.load(str(tmp_path))
+    assert loaded.ntotal == 5
+    assert loaded.next_id == 10
+
+def test_snapshot_is_not_changed_by_later_writes(tmp_path):
+    """Testa se uma geração já lida continua igual depois de novas escritas."""
+    store = SegmentedIndex(str(tmp_path), [])
+    store.add(*make_batch(0, 4, "uploads/a.pdf"))
+    snapshot = store.snapshot
+
+    store.add(*make_batch(4, 2, "uploads/b.pdf"))
+    store.delete_sources(["uploads/a.pdf"])
+
+    assert snapshot.generation == 1
+    assert len(snapshot.segments) == 1
+    assert len(snapshot.segments[0].deleted) == 0
+    assert snapshot.ntotal == 4
+    assert list(snapshot.sources.ids_for_prefixes(["uploads/a"])) == [0, 1, 2, 3]
+
+    assert store.generation == 3
+    assert store.ntotal == 2
+    assert len(store.segments[0].deleted) == 4
+    assert store.segments[0].index is snapshot.segments[0].index
+
+def test_collect_garbage_keeps_segments_being_written(tmp_path):
+    """Testa se a coleta de lixo preserva diretórios .tmp de escritas em andamento."""
+    store = SegmentedIndex(str(tmp_path), [])
+    store.add(*make_batch(0, 3, "uploads/a.pdf"))
+    _, tmp_dir = store._new_segment_path()
+    abandoned = os.path.join(store.segments_path, "seg_999999.tmp")
+    os.makedirs(abandoned)
+    for path in (tmp_dir, abandoned):
+        os.utime(path, (0, 0))
+
+    store.collect_garbage()
+    assert os.path.isdir(tmp_dir)
+    assert not os.path.exists(abandoned)
+    assert os.path.isdir(os.path.join(store.segments_path, store.segments[0].name))
+
+    store._discard(tmp_dir)
+    assert not os.path.exists(tmp_dir)
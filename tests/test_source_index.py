@@ -0,0 +1,48 @@
+import numpy as np
+import faiss
+from app.utils.source_index import SourceIndex, source_map, read_source_map, write_source_map
+
+class FakeDoc:
+    """Documento mínimo com metadados de fonte."""
+    def __init__(self, source):
+        self.metadata = {"source": source}
+
+def test_ids_for_prefixes_across_segment_maps(tmp_path):
+    """Testa a união dos mapas de fontes dos segmentos e a persistência de cada mapa."""
+    first = source_map([FakeDoc("uploads/a.pdf"), FakeDoc("uploads/b.pdf"), FakeDoc("uploads/a.pdf")], range(3))
+    second = source_map([FakeDoc("uploads/c.md"), FakeDoc("uploads/a.pdf")], [3, 4])
+    index = SourceIndex([first, second])
+
+    assert list(index.ids_for_prefixes(["uploads/a"])) == [0, 2, 4]
+    assert list(index.ids_for_prefixes(["uploads/b.pdf", "uploads/c"])) == [1, 3]
+    assert len(index.ids_for_prefixes(["uploads/inexistente"])) == 0
+
+    write_source_map(str(tmp_path), second)
+    loaded = read_source_map(str(tmp_path))
+    assert {source: ids.tolist() for source, ids in loaded.items()} == {"uploads/c.md": [3], "uploads/a.pdf": [4]}
+    assert read_source_map(str(tmp_path / "vazio")) is None
+
+def test_tombstones_are_excluded_without_changing_the_maps():
+    """Testa se IDs removidos somem das consultas sem alterar os mapas compartilhados."""
+    first = source_map([FakeDoc("uploads/a.pdf"), FakeDoc("uploads/b.pdf"), FakeDoc("uploads/a.pdf")], range(3))
+    index = SourceIndex([first], tombstones=np.array([0, 2]))
+
+    assert len(index.ids_for_sources(["uploads/a.pdf"])) == 0
+    assert index.to_dict() == {"uploads/b.pdf": [1]}
+    assert list(SourceIndex([first]).ids_for_sources(["uploads/a.pdf"])) == [0, 2]
+    assert list(first["uploads/a.pdf"]) == [0, 2]
+
+def test_restricted_search_returns_top_k_from_small_source():
+    """Testa se a busca restrita retorna top_k resultados mesmo para fontes raras."""
+    rng = np.random.default_rng(0)
+    vectors = rng.random((1000, 8), dtype=np.float32)
+    flat = faiss.IndexFlatL2(8)
+    flat.add(vectors)
+
+    sources = ["uploads/raro.pdf" if i % 100 == 0 else "uploads/comum.pdf" for i in range(1000)]
+    index = SourceIndex([source_map([FakeDoc(s) for s in sources], range(1000))])
+
+    params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(index.ids_for_prefixes(["uploads/raro.pdf"])))
+    _, labels = flat.search(vectors[:1], 5, params=params)
+    assert len(labels[0]) == 5
+    assert all(label % 100 == 0 for label in labels[0])
@@ -0,0 +1,53 @@
+import os
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils import text_processing
+    from app.utils.text_processing import iter_chunks, iter_pages, tokenizer
+    from app.utils.token_splitter import TokenSplitter
+
+def test_chunks_keep_page_and_offset():
+    """Testa se cada chunk aponta para a página e a posição em que começa no documento."""
+    pages = [(number, f"Página {number}: " + " ".join(f"juros{number}x{i}" for i in range(number * 40)) + "\n") for number in range(1, 7)]
+    document = "".join(text for _, text in pages)
+    page_starts = [sum(len(text) for _, text in pages[:i]) for i in range(len(pages))]
+
+    chunks = list(iter_chunks(pages, chunk_size=100, chunk_overlap=20))
+
+    assert len(chunks) > len(pages)
+    for chunk in chunks:
+        start = chunk.metadata["start_index"]
+        assert document[start:start + len(chunk.page_content)] == chunk.page_content
+        assert chunk.metadata["page"] == max(i for i, page_start in enumerate(page_starts, start=1) if page_start <= start)
+    assert chunks[-1].page_content.endswith("juros6x239")
+    assert all(0 < chunk.metadata["token_count"] <= 100 for chunk in chunks)
+
+def test_text_files_are_read_in_blocks(tmp_path, monkeypatch):
+    """Testa se arquivos de texto são lidos em blocos sem número de página."""
+    monkeypatch.setattr(text_processing, "TEXT_BLOCK_CHARS", 10)
+    path = tmp_path / "notas.txt"
+    path.write_text("orçamento mensal e reserva", encoding="utf-8")
+
+    parts = list(iter_pages(str(path)))
+
+    assert [page for page, _ in parts] == [None, None, None]
+    assert "".join(text for _, text in parts) == "orçamento mensal e reserva"
+    assert "page" not in next(iter_chunks(parts)).metadata
+
+def test_token_splitter_offsets_and_breaks():
+    """Testa se o divisor respeita o limite de tokens e termina os pedaços em quebras de frase."""
+    splitter = TokenSplitter(chunk_size=60, chunk_overlap=15)
+    text = "\n\n".join(
+        " ".join(f"Frase {p}.{s} sobre orçamento, juros e reserva de emergência." for s in range(6))
+        for p in range(20)
+    )
+
+    expected = tokenizer.decode_with_offsets(tokenizer.encode_ordinary(text))[1]
+    assert splitter.offsets(text) == expected
+
+    pieces = splitter.split(text)
+    assert len(pieces) > 10
+    for start, content, token_count in pieces:
+        assert text[start:start + len(content)] == content
+        assert len(tokenizer.encode_ordinary(content)) <= token_count <= 60
+        assert content.endswith(".")
@@ -0,0 +1,38 @@
+import os
+from unittest.mock import patch
+from langchain.docstore.document import Document
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.token_budget import count_document_tokens, count_tokens, pack_by_tokens
+
+def test_pack_respects_budget_and_reports_totals():
+    """Testa se os lotes respeitam o limite, mantêm a ordem e trazem o total de tokens."""
+    documents = [Document(page_content=f"Documento {i} sobre juros compostos e reserva. " * (i + 1)) for i in range(8)]
+
+    batches = pack_by_tokens(documents, max_tokens=120)
+
+    assert [doc for batch in batches for doc in batch.documents] == documents
+    for batch in batches:
+        assert batch.tokens == sum(count_tokens(doc.page_content) for doc in batch.documents)
+        assert batch.tokens <= 120
+
+def test_counts_come_from_metadata_when_available():
+    """Testa se a contagem dos metadados da ingestão é usada sem codificar o texto de novo."""
+    documents = [Document(page_content="texto qualquer", metadata={"token_count": 7}), Document(page_content="outro texto")]
+    assert count_document_tokens(documents) == [7, count_tokens("outro texto")]
+
+def test_oversize_document_is_split_by_tokens():
+    """Testa a divisão de um documento maior que o limite, preservando o texto e a posição."""
+    text = " ".join(f"Frase {i} sobre orçamento mensal." for i in range(200))
+    document = Document(page_content=text, metadata={"source": "uploads/a.pdf", "start_index": 100})
+
+    batches = pack_by_tokens([Document(page_content="curto"), document], max_tokens=50)
+
+    assert batches[0].documents[0].page_content == "curto"
+    pieces = [batch.documents[0] for batch in batches[1:]]
+    assert all(len(batch.documents) == 1 and batch.tokens <= 50 for batch in batches[1:])
+    assert " ".join(piece.page_content for piece in pieces) == text
+    for piece in pieces:
+        start = piece.metadata["start_index"] - 100
+        assert text[start:start + len(piece.page_content)] == piece.page_content
+        assert piece.metadata["source"] == "uploads/a.pdf"
@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import faiss
+from unittest.mock import patch
+
+with patch.dict(os.environ, {"OPENAI_API_KEY": "fake-api-key"}):
+    from app.utils.vector_file import VectorFile, MmapFlatIndex, FlatSearchParams
+    from app.utils.index_factory import factory_string
+
+def test_rerank_matches_exact_search(tmp_path):
+    """Testa se a reordenação de candidatos de um índice comprimido recupera os vizinhos exatos."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 32), dtype=np.float32)
+    queries = rng.standard_normal((20, 32), dtype=np.float32)
+
+    vector_file = VectorFile.create(str(tmp_path), 32)
+    vector_file.append(vectors[:1000])
+    vector_file.append(vectors[1000:])
+    assert len(vector_file) == 3000
+
+    compressed = faiss.index_factory(32, "SQ4")
+    compressed.train(vectors)
+    compressed.add(vectors)
+    exact = faiss.IndexFlatL2(32)
+    exact.add(vectors)
+
+    _, expected = exact.search(queries, 5)
+    _, candidates = compressed.search(queries, 5 * 4)
+
+    recalls = []
+    for query, labels, truth in zip(queries, candidates, expected):
+        distances, reranked = vector_file.rerank(query, labels, 5)
+        assert np.all(np.diff(distances) >= 0)
+        recalls.append(len(set(reranked) & set(truth)) / 5)
+    assert np.mean(recalls) > 0.9
+
+def test_factory_string_compression():
+    """Testa as strings de fábrica para os formatos de armazenamento."""
+    assert factory_string("flat", 64, 10000, "float32") == "Flat"
+    assert factory_string("flat", 64, 10000, "fp16") == "SQfp16"
+    assert factory_string("hnsw", 64, 10000, "sq8").endswith("_SQ8")
+    assert factory_string("flat", 64, 10000, "pq").startswith("IVF1,PQ")
+    assert factory_string("ivf_flat", 64, 100, "sq8") == "SQ8"
+
+
+def test_mmap_flat_index_matches_flat_search(tmp_path):
+    """Testa se o índice plano mapeado em memória retorna os mesmos vizinhos do IndexFlatL2."""
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((500, 16), dtype=np.float32)
+    queries = rng.standard_normal((5, 16), dtype=np.float32)
+
+    vector_file = VectorFile.create(str(tmp_path), 16)
+    vector_file.append(vectors)
+    index = MmapFlatIndex(vector_file)
+    exact = faiss.IndexFlatL2(16)
+    exact.add(vectors)
+
+    assert index.ntotal == 500
+    assert np.array_equal(index.search(queries, 5)[1], exact.search(queries, 5)[1])
+
+    allowed = np.arange(0, 500, 7, dtype=np.int64)
+    _, labels = index.search(queries, 5, params=FlatSearchParams(ids=allowed))
+    _, expected = exact.search(queries, 5, params=faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed)))
+    assert np.array_equal(labels, expected)
+
+    not_allowed = faiss.IDSelectorNot(faiss.IDSelectorBatch(allowed))
+    _, labels = index.search(queries, 5, params=FlatSearchParams(excluded=allowed))
+    _, expected = exact.search(queries, 5, params=faiss.SearchParameters(sel=not_allowed))
+    assert np.array_equal(labels, expected)
+
+def test_mmap_flat_index_skips_excluded_rows_inside_search(tmp_path):
+    """Testa a busca com muitas posições removidas: resultado exato, completo e bloco a bloco."""
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((1000, 16), dtype=np.float32)
+    queries = rng.standard_normal((4, 16), dtype=np.float32)
+
+    vector_file = VectorFile.create(str(tmp_path), 16)
+    vector_file.append(vectors)
+    index = MmapFlatIndex(vector_file)
+    index.block_rows = 128
+    exact = faiss.IndexFlatL2(16)
+    exact.add(vectors)
+
+    # Nove de cada dez vetores removidos, e um bloco inteiro
+    excluded = np.setdiff1d(np.arange(1000), np.arange(0, 1000, 10))
+    excluded = np.union1d(excluded, np.arange(256, 384))
+    distances, labels = index.search(queries, 10, params=FlatSearchParams(excluded=excluded))
+    not_excluded = faiss.IDSelectorNot(faiss.IDSelectorBatch(excluded))
+    expected_distances, expected = exact.search(queries, 10, params=faiss.SearchParameters(sel=not_excluded))
+    assert np.array_equal(labels, expected)
+    assert np.allclose(distances, expected_distances, rtol=1e-4)
+
+    # Menos vetores vivos do que k: as posições que faltam ficam com -1
+    _, labels = index.search(queries, 5, params=FlatSearchParams(excluded=np.arange(3, 1000)))
+    assert np.array_equal(np.sort(labels[:, :3], axis=1), np.tile(np.arange(3), (4, 1)))
+    assert np.all(labels[:, 3:] == -1)